@@ -23,6 +23,18 @@ contract MediatorCanonizerRegistry {
     mapping(bytes32 => CanonArtifact) public artifacts;
     bytes32[] public artifactIndex;
 
+    /// @notice A batch of canon hashes committed as one Merkle root.
+    /// Leaves are sha256(0x00 || canonHash); inner nodes are
+    /// sha256(0x01 || min(a, b) || max(a, b)), so proofs carry no direction bits.
+    struct AnchorBatch {
+        uint256 leafCount;
+        uint256 timestamp;
+        string batchId;
+    }
+
+    mapping(bytes32 => AnchorBatch) public anchors;
+    bytes32[] public anchorIndex;
+
     event ArtifactFrozen(
         bytes32 indexed hash,
         string domain,
@@ -31,6 +43,13 @@ contract MediatorCanonizerRegistry {
         string cite_as
     );
 
+    event RootAnchored(
+        bytes32 indexed root,
+        uint256 leafCount,
+        uint256 timestamp,
+        string batchId
+    );
+
     modifier onlyOperator() {
         require(msg.sender == operator, "Not operator");
         _;
@@ -70,4 +89,38 @@ contract MediatorCanonizerRegistry {
     function totalArtifacts() external view returns (uint256) {
         return artifactIndex.length;
     }
+
+    /// @notice Anchor a Merkle root covering leafCount canon hashes (one tx per batch).
+    function anchorRoot(bytes32 root, uint256 leafCount, string calldata batchId) external onlyOperator {
+        require(leafCount > 0, "Empty batch");
+        require(anchors[root].timestamp == 0, "Root already anchored");
+
+        anchors[root] = AnchorBatch({
+            leafCount: leafCount,
+            timestamp: block.timestamp,
+            batchId: batchId
+        });
+        anchorIndex.push(root);
+
+        emit RootAnchored(root, leafCount, block.timestamp, batchId);
+    }
+
+    /// @notice True if canonHash is included under an anchored root via proof.
+    function verifyInclusion(bytes32 canonHash, bytes32[] calldata proof, bytes32 root)
+        external view returns (bool anchored, uint256 timestamp)
+    {
+        bytes32 node = sha256(abi.encodePacked(bytes1(0x00), canonHash));
+        for (uint256 i = 0; i < proof.length; i++) {
+            bytes32 sibling = proof[i];
+            node = node < sibling
+                ? sha256(abi.encodePacked(bytes1(0x01), node, sibling))
+                : sha256(abi.encodePacked(bytes1(0x01), sibling, node));
+        }
+        AnchorBatch memory b = anchors[root];
+        return (node == root && b.timestamp > 0, b.timestamp);
+    }
+
+    function totalAnchors() external view returns (uint256) {
+        return anchorIndex.length;
+    }
 }
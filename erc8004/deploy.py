@@ -20,6 +20,11 @@ ABI = [
     {"inputs": [{"name": "hash", "type": "bytes32"}], "name": "verify", "outputs": [{"name": "exists", "type": "bool"}, {"name": "domain", "type": "string"}, {"name": "status", "type": "string"}, {"name": "timestamp", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "totalArtifacts", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "operator", "outputs": [{"name": "", "type": "address"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "root", "type": "bytes32"}, {"name": "leafCount", "type": "uint256"}, {"name": "batchId", "type": "string"}], "name": "anchorRoot", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
+    {"inputs": [{"name": "canonHash", "type": "bytes32"}, {"name": "proof", "type": "bytes32[]"}, {"name": "root", "type": "bytes32"}], "name": "verifyInclusion", "outputs": [{"name": "anchored", "type": "bool"}, {"name": "timestamp", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "totalAnchors", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "", "type": "bytes32"}], "name": "anchors", "outputs": [{"name": "leafCount", "type": "uint256"}, {"name": "timestamp", "type": "uint256"}, {"name": "batchId", "type": "string"}], "stateMutability": "view", "type": "function"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "root", "type": "bytes32"}, {"name": "leafCount", "type": "uint256"}, {"name": "timestamp", "type": "uint256"}, {"name": "batchId", "type": "string"}], "name": "RootAnchored", "type": "event"},
     {"anonymous": False, "inputs": [{"indexed": True, "name": "hash", "type": "bytes32"}, {"name": "domain", "type": "string"}, {"name": "status", "type": "string"}, {"name": "timestamp", "type": "uint256"}, {"name": "cite_as", "type": "string"}], "name": "ArtifactFrozen", "type": "event"}
 ]
 
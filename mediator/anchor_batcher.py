@@ -0,0 +1,319 @@
+"""
+anchor_batcher.py — Batched Merkle-root anchoring of canon hashes.
+
+The direct path (registration_queue) sends one registerArtifact transaction
+per canon: one gas payment and one nonce per mediation. In anchor mode
+(CHAIN_MODE=anchor) canons are collected instead, and every WINDOW seconds
+(or once MAX_LEAVES are waiting) the batcher:
+
+  1. seals the waiting canon hashes into a batch and builds a Merkle tree
+     (merkle.py), storing each canon's leaf index and inclusion proof;
+  2. sends a single anchorRoot(root, leafCount, batchId) transaction;
+  3. polls for the receipt and marks the batch anchored.
+
+A batch of thousands of canons costs the same as one registration. Each
+canon's proof can be checked offline with merkle.verify_proof, or on chain
+with MediatorCanonizerRegistry.verifyInclusion.
+
+Batch states: sealed → submitted → anchored | failed. Proofs are written
+when the batch is sealed, so they are final before the root is sent; a
+restart resumes sealed and submitted batches.
+
+Before (re)sending a root the batcher reads registry.anchors(root): a tx
+reported dropped, or not mined within RECEIPT_TIMEOUT, may still land, and
+the resend then reverts with "Root already anchored". An anchored root
+marks the batch anchored, also when it is found after a revert. A batch
+that really fails releases its canons back to the waiting pool, to be
+sealed into a later batch (a new root and proof), up to MAX_REQUEUES times
+per canon; after that they stay with the failed batch and proof_for
+reports its error.
+
+anchorRoot / anchors exist only in the current MediatorCanonizerRegistry
+source; the registry must be redeployed (and REGISTRY_ADDRESS updated)
+before CHAIN_MODE=anchor is used.
+"""
+
+import json, os, threading, time, uuid
+from storage import get_database
+from merkle import MerkleTree
+
+DB_PATH = os.environ.get("REGISTRATIONS_DB") or os.path.join(os.path.dirname(__file__), "registrations.db")
+
+WINDOW          = float(os.environ.get("ANCHOR_WINDOW", 60))
+MAX_LEAVES      = int(os.environ.get("ANCHOR_MAX_LEAVES", 10000))
+MAX_ATTEMPTS    = 5
+MAX_REQUEUES    = int(os.environ.get("ANCHOR_MAX_REQUEUES", 3))
+BACKOFF_BASE    = 2.0
+BACKOFF_MAX     = 300.0
+RECEIPT_TIMEOUT = 120
+IDLE_POLL       = 1.0
+
+_SQL_LEAF_INSERT = """
+    INSERT OR IGNORE INTO anchor_leaves (canon_hash, created, domain, canon_status, cite_as)
+    VALUES (?,?,?,?,?)
+"""
+_SQL_LEAF_GET = "SELECT * FROM anchor_leaves WHERE canon_hash=?"
+_SQL_WAITING = """
+    SELECT canon_hash, created FROM anchor_leaves
+    WHERE batch_id IS NULL ORDER BY created, canon_hash LIMIT ?
+"""
+_SQL_LEAF_SEAL = "UPDATE anchor_leaves SET batch_id=?, leaf_index=?, proof=? WHERE canon_hash=?"
+_SQL_LEAF_REQUEUE = """
+    UPDATE anchor_leaves SET batch_id=NULL, leaf_index=NULL, proof=NULL, requeues=requeues+1
+    WHERE batch_id=? AND requeues < ?
+"""
+_SQL_BATCH_INSERT = """
+    INSERT INTO anchor_batches (id, created, updated, root, leaf_count, state, attempts, next_attempt)
+    VALUES (?,?,?,?,?,'sealed',0,?)
+"""
+_SQL_BATCH_GET = "SELECT * FROM anchor_batches WHERE id=?"
+_SQL_BATCH_DUE = """
+    SELECT * FROM anchor_batches
+    WHERE state IN ('sealed', 'submitted') AND next_attempt <= ?
+    ORDER BY created LIMIT 1
+"""
+_SQL_COUNTS = "SELECT state, COUNT(*) AS n, SUM(leaf_count) AS leaves FROM anchor_batches GROUP BY state"
+_SQL_WAITING_COUNT = "SELECT COUNT(*) FROM anchor_leaves WHERE batch_id IS NULL"
+
+
+def _db():
+    return get_database(DB_PATH)
+
+
+def init_db():
+    with _db().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS anchor_leaves (
+                canon_hash    TEXT PRIMARY KEY,
+                created       REAL NOT NULL,
+                domain        TEXT NOT NULL,
+                canon_status  TEXT NOT NULL,
+                cite_as       TEXT NOT NULL,
+                batch_id      TEXT DEFAULT NULL,
+                leaf_index    INTEGER DEFAULT NULL,
+                proof         TEXT DEFAULT NULL,
+                requeues      INTEGER DEFAULT 0
+            )
+        """)
+        # Tables created before failed batches were re-queued lack the column
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(anchor_leaves)")}
+        if "requeues" not in columns:
+            conn.execute("ALTER TABLE anchor_leaves ADD COLUMN requeues INTEGER DEFAULT 0")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_anchor_leaves_waiting
+            ON anchor_leaves (batch_id, created)
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS anchor_batches (
+                id            TEXT PRIMARY KEY,
+                created       REAL NOT NULL,
+                updated       REAL NOT NULL,
+                root          TEXT NOT NULL,
+                leaf_count    INTEGER NOT NULL,
+                state         TEXT NOT NULL,
+                attempts      INTEGER DEFAULT 0,
+                next_attempt  REAL NOT NULL,
+                nonce         INTEGER DEFAULT NULL,
+                tx_hash       TEXT DEFAULT NULL,
+                block         INTEGER DEFAULT NULL,
+                error         TEXT DEFAULT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_anchor_batches_due
+            ON anchor_batches (state, next_attempt)
+        """)
+
+
+def enqueue(canon, citation):
+    """Add a canon hash to the next batch (idempotent per hash); returns its leaf row."""
+    with _db().transaction() as conn:
+        conn.execute(_SQL_LEAF_INSERT, (
+            canon["hash"], time.time(), canon["domain"], canon["status"], citation["cite_as"],
+        ))
+    return dict(_db().query_one(_SQL_LEAF_GET, (canon["hash"],)))
+
+
+def get_batch(batch_id):
+    row = _db().query_one(_SQL_BATCH_GET, (batch_id,))
+    return dict(row) if row else None
+
+
+def proof_for(canon_hash):
+    """Inclusion proof and batch status for a canon hash; None if never queued."""
+    leaf = _db().query_one(_SQL_LEAF_GET, (canon_hash,))
+    if leaf is None:
+        return None
+    out = {"canon_hash": canon_hash, "batch_id": leaf["batch_id"], "state": "waiting"}
+    if leaf["batch_id"] is None:
+        return out
+    batch = get_batch(leaf["batch_id"])
+    out.update({
+        "state":      batch["state"],
+        "root":       batch["root"],
+        "leaf_index": leaf["leaf_index"],
+        "leaf_count": batch["leaf_count"],
+        "proof":      json.loads(leaf["proof"]),
+        "tx":         batch["tx_hash"],
+        "block":      batch["block"],
+        "error":      batch["error"],
+    })
+    return out
+
+
+def seal_batch(max_leaves=None):
+    """Seal up to max_leaves waiting canons into a batch; returns its id or None."""
+    rows = _db().query_all(_SQL_WAITING, (max_leaves or MAX_LEAVES,))
+    if not rows:
+        return None
+    hashes = [r["canon_hash"] for r in rows]
+    tree = MerkleTree(hashes)
+    batch_id = "anchor-" + str(uuid.uuid4())[:12]
+    now = time.time()
+    with _db().transaction() as conn:
+        conn.execute(_SQL_BATCH_INSERT, (batch_id, now, now, tree.root_hex, len(hashes), now))
+        conn.executemany(_SQL_LEAF_SEAL, (
+            (batch_id, i, json.dumps(tree.proof_hex(i)), h) for i, h in enumerate(hashes)
+        ))
+    return batch_id
+
+
+def requeue_failed(batch_id):
+    """Return a failed batch's canons to the waiting pool; returns how many."""
+    with _db().transaction() as conn:
+        return conn.execute(_SQL_LEAF_REQUEUE, (batch_id, MAX_REQUEUES)).rowcount
+
+
+def counts():
+    out = {r["state"]: {"batches": r["n"], "canons": r["leaves"]} for r in _db().query_all(_SQL_COUNTS)}
+    out["waiting"] = _db().query_one(_SQL_WAITING_COUNT)[0]
+    return out
+
+
+def _update(batch_id, **fields):
+    fields["updated"] = time.time()
+    cols = ", ".join(f"{k}=?" for k in fields)
+    with _db().transaction() as conn:
+        conn.execute(f"UPDATE anchor_batches SET {cols} WHERE id=?", (*fields.values(), batch_id))
+
+
+class AnchorBatcher:
+    """Background thread that seals, anchors and confirms Merkle batches."""
+
+    def __init__(self, registrar, window=None, max_leaves=None, explorer_tx=None, contract=None):
+        self.registrar = registrar
+        self.window = WINDOW if window is None else window
+        self.max_leaves = max_leaves or MAX_LEAVES
+        self.explorer_tx = explorer_tx
+        self.contract = contract
+        self._halt = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="chain-anchor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._halt.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enqueue(self, canon, citation):
+        leaf = enqueue(canon, citation)
+        if _db().query_one(_SQL_WAITING_COUNT)[0] >= self.max_leaves:
+            self._wake.set()
+        return leaf
+
+    def describe(self, proof):
+        if proof.get("tx"):
+            proof["contract"] = self.contract
+            if self.explorer_tx:
+                proof["basescan"] = f"{self.explorer_tx}{proof['tx']}"
+        return proof
+
+    # ── Worker loop ─────────────────────────────────────────────────────────
+
+    def _seal_due(self):
+        oldest = _db().query_one(_SQL_WAITING, (1,))
+        if oldest is None:
+            return None
+        waiting = _db().query_one(_SQL_WAITING_COUNT)[0]
+        if waiting >= self.max_leaves or time.time() - oldest["created"] >= self.window:
+            return seal_batch(self.max_leaves)
+        return None
+
+    def run_once(self):
+        """Seal a due batch and advance one sealed/submitted batch; True if work was done."""
+        sealed = self._seal_due()
+        batch = _db().query_one(_SQL_BATCH_DUE, (time.time(),))
+        if batch is None:
+            return sealed is not None
+        batch = dict(batch)
+        try:
+            self._advance(batch)
+        except Exception as e:
+            self._retry(batch, f"anchor error: {e}")
+        return True
+
+    def _run(self):
+        while not self._halt.is_set():
+            if not self.run_once():
+                self._wake.wait(IDLE_POLL)
+                self._wake.clear()
+
+    def _advance(self, batch):
+        if batch["state"] == "sealed":
+            # An earlier send of this root (or of the same canons in a failed
+            # batch) may have been mined late; resending would only revert.
+            if self._anchored(batch):
+                return _update(batch["id"], state="anchored", error=None)
+            try:
+                tx_hash, nonce = self.registrar.anchor_root(batch["root"], batch["leaf_count"], batch["id"])
+            except Exception as e:
+                return self._retry(batch, f"submit failed: {e}")
+            _update(batch["id"], state="submitted", tx_hash=tx_hash, nonce=nonce,
+                    attempts=batch["attempts"] + 1, error=None, next_attempt=time.time())
+            batch = get_batch(batch["id"])
+
+        receipt = self.registrar.receipt(batch["tx_hash"], timeout=RECEIPT_TIMEOUT)
+        if receipt is None:
+            if not self.registrar.tx_known(batch["tx_hash"]):
+                return self._retry(batch, "transaction dropped")
+            return
+        if receipt["success"]:
+            _update(batch["id"], state="anchored", block=receipt["block"], error=None)
+        elif self._anchored(batch):
+            # "Root already anchored": an earlier submission got there first
+            _update(batch["id"], state="anchored", error=None)
+        else:
+            self._fail(batch, "transaction reverted", block=receipt["block"])
+
+    def _anchored(self, batch):
+        """Whether the batch root is already on chain; False if unknown."""
+        check = getattr(self.registrar, "anchored", None)
+        if check is None:
+            return False
+        try:
+            return bool(check(batch["root"]))
+        except Exception:
+            return False
+
+    def _fail(self, batch, error, **fields):
+        _update(batch["id"], state="failed", error=error, **fields)
+        if requeue_failed(batch["id"]):
+            self._wake.set()
+
+    def _retry(self, batch, error):
+        attempts = batch["attempts"] + (0 if batch["state"] == "submitted" else 1)
+        if attempts >= MAX_ATTEMPTS:
+            return self._fail(batch, error, attempts=attempts)
+        backoff = min(BACKOFF_BASE * (2 ** (max(attempts, 1) - 1)), BACKOFF_MAX)
+        _update(batch["id"], state="sealed", attempts=attempts, error=error,
+                next_attempt=time.time() + backoff)
+
+
+# Initialize on import
+init_db()
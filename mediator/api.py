@@ -1,32 +1,44 @@
 from flask import Flask, request, jsonify
 from canonizer import mediate
 from x402_gate import (
-    require_payment, x402_server,
+    require_payment, x402_server, payment_stats,
     PRICE_MEDIATE, PRICE_RESPOND, PRICE_CHALLENGE,
     NETWORK, OPERATOR
 )
+from json_provider import install as install_json_provider
+import cmp_log
 import os, sys, json, base64
 sys.path.insert(0, '/root/ttcd-pub/mediator')
 
 app = Flask(__name__)
+JSON_PROVIDER = install_json_provider(app)
+# CMP pipeline logging: "quiet" keeps per-mediation records off the request path
+CMP_LOG = cmp_log.configure(os.environ.get("CMP_LOG", "quiet"))
 
 CONTRACT = "0xf2325531264CA4Fc2cEC5D661E2200eA8013b091"
 
-def try_register_on_chain(result):
+def queue_registration(result, callback_url=None):
+    """Queue the canon for on-chain registration; returns the pending handle."""
+    if _anchorer is not None:
+        try:
+            leaf = _anchorer.enqueue(result['canon'], result['citation'])
+            return {
+                "mode":       "anchor",
+                "canon_hash": leaf["canon_hash"],
+                "status":     "pending",
+                "poll_url":   f"/chain/proof/{leaf['canon_hash']}",
+            }
+        except Exception as e:
+            return {"error": str(e)}
+    if _registrar is None:
+        return None
     try:
-        from chain import register_on_chain
-        private_key = os.environ.get('PRIVATE_KEY')
-        if not private_key:
-            return None
-        canon = result['canon']
-        citation = result['citation']
-        return register_on_chain(
-            domain=canon['domain'],
-            status=canon['status'],
-            hash_hex=canon['hash'],
-            cite_as=citation['cite_as'],
-            private_key=private_key
-        )
+        reg = _registrar.enqueue(result['canon'], result['citation'], callback_url)
+        return {
+            "registration_id": reg["id"],
+            "status":          "pending",
+            "poll_url":        f"/chain/registration/{reg['id']}",
+        }
     except Exception as e:
         return {"error": str(e)}
 
@@ -43,7 +55,15 @@ def index():
         "endpoints": {
             "POST /mediate": "Submit positions for canonization (requires x402 payment)",
             "POST /mediate/free": "Free mediation (no on-chain registration)",
+            "GET /metrics": "Prometheus metrics: per-step CMP timings, pool and cache counters",
+            "POST /mediate/batch": "Free mediation of many inputs (JSON array or NDJSON); streams NDJSON results",
             "GET /health": "Service health check",
+            "GET /x402/payment/{id}": "Settlement status of a paid request (payment_id from the receipt)",
+            "GET /chain/registration/{id}": "On-chain registration status for a /mediate canon",
+            "GET /chain/proof/{canon_hash}": "Merkle inclusion proof for a batch-anchored canon",
+            "POST /chain/verify": "Bulk registry verification of canon hashes (cached)",
+            "GET /chain/artifacts": "Registered canons from the local event index (domain, status, since, until)",
+            "GET /chain/artifacts/summary": "Registered canon counts by status and domain",
             "GET /recall": "Pre-flight citation check: surfaces prior frozen canons",
             "POST /a2a/dispute": "Open A2A dispute session",
             "POST /a2a/respond/{id}": "Peer agent responds; triggers mediation",
@@ -70,9 +90,45 @@ def index():
         ]
     })
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition: CMP step histograms plus pool / cache gauges."""
+    extra = {}
+    if mediate_pool is not None:
+        pool = mediate_pool.stats()
+        extra["cmp_pool_in_flight"] = ("gauge", "Mediations queued or running on the pool", pool["in_flight"])
+        extra["cmp_pool_rejected_total"] = ("counter", "Mediations refused with 429", pool["rejected"])
+        extra["cmp_pool_timed_out_total"] = ("counter", "Mediations abandoned with 504", pool["timed_out"])
+    cache = _results.get_cache()
+    if cache is not None:
+        c = cache.stats()
+        extra["cmp_result_cache_hits_total"] = ("counter", "Result cache hits (memory + persistent)",
+                                                c["hits_memory"] + c["hits_persistent"])
+        extra["cmp_result_cache_misses_total"] = ("counter", "Result cache misses", c["misses"])
+    return app.response_class(_metrics.render(extra), mimetype="text/plain; version=0.0.4")
+
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok", "service": "mediator-canonizer", "contract": CONTRACT})
+    resp = {"status": "ok", "service": "mediator-canonizer", "contract": CONTRACT,
+            "json_provider": JSON_PROVIDER, "cmp_log": CMP_LOG}
+    try:
+        from semantic_validator import ontology_stats
+        resp["ontology"] = ontology_stats()
+    except Exception as e:
+        resp["ontology"] = {"error": str(e)}
+    resp["recall"] = _recall.get_service().stats()
+    resp["dispute_reaper"] = _reaper.stats()
+    resp["x402"] = payment_stats()
+    resp["result_cache"] = _results.get_cache().stats() if _results.get_cache() else {"enabled": False}
+    resp["mediate_backend"] = mediate_pool.stats() if mediate_pool else {"mode": MEDIATE_BACKEND}
+    resp["chain_registrations"] = _rq.counts()
+    resp["chain_anchors"] = _ab.counts()
+    if _indexer:
+        resp["artifact_indexer"] = _indexer.stats()
+    if _registrar or _anchorer or _indexer:
+        from chain import chain_stats
+        resp["chain_rpc"] = chain_stats()
+    return jsonify(resp)
 
 
 
@@ -80,11 +136,90 @@ import uuid, time
 import dispute_store as _ds
 import challenge_store as _cs
 import prov_writer as _prov
+import citation_recall as _recall
 
 A2A_TTL = 3600   # disputes expire after 1 hour
 
-def _prune_disputes():
-    _ds.prune(A2A_TTL)
+# Expiry/archival runs in a background thread, not on the request path
+_reaper = _ds.start_reaper(
+    ttl=A2A_TTL,
+    interval=float(os.environ.get("A2A_REAPER_INTERVAL", 60)),
+    batch_size=int(os.environ.get("A2A_REAPER_BATCH", 500)),
+)
+
+import registration_queue as _rq
+import x402_settlement as _settlement
+import anchor_batcher as _ab
+
+# "direct": one registerArtifact tx per canon; "anchor": Merkle batches via anchorRoot
+CHAIN_MODE = os.environ.get("CHAIN_MODE", "direct")
+
+def _start_registrar():
+    """(direct queue, anchor batcher) background workers; both None without PRIVATE_KEY."""
+    private_key = os.environ.get('PRIVATE_KEY')
+    if not private_key:
+        return None, None
+    try:
+        from chain import Registrar, CONTRACT_ADDRESS, EXPLORER_TX
+        registrar = Registrar(private_key)
+    except Exception as e:
+        print(f"Chain registration disabled: {e}")
+        return None, None
+    if CHAIN_MODE == "anchor":
+        return None, _ab.AnchorBatcher(
+            registrar, explorer_tx=EXPLORER_TX, contract=CONTRACT_ADDRESS,
+        ).start()
+    return _rq.RegistrationQueue(
+        registrar,
+        workers=int(os.environ.get("CHAIN_WORKERS", 2)),
+        explorer_tx=EXPLORER_TX,
+        contract=CONTRACT_ADDRESS,
+    ).start(), None
+
+_registrar, _anchorer = _start_registrar()
+
+import event_indexer as _ei
+
+# Follows ArtifactFrozen logs into CHAIN_DB; needs an RPC endpoint, not a key
+_indexer = (_ei.start_indexer(interval=float(os.environ.get("CHAIN_INDEXER_INTERVAL", 30)))
+            if os.environ.get("CHAIN_INDEXER") == "1" else None)
+
+import mediate_pool as _mp
+import mediate_batch as _batch
+import result_cache as _results
+import cmp_metrics as _metrics
+
+# "thread": the CMP runs in the request thread; "process": on the pre-warmed worker pool
+MEDIATE_BACKEND = os.environ.get("MEDIATE_BACKEND", "thread")
+mediate_pool = _mp.start_pool() if MEDIATE_BACKEND == "process" else None
+
+def cmp_backend(input_data):
+    """Run the CMP on the configured backend; raises _mp.PoolError when the pool refuses the job."""
+    if mediate_pool is not None:
+        return mediate_pool.run(input_data)
+    return mediate(input_data)
+
+def run_steps(steps, run_cmp=cmp_backend):
+    """
+    Drive a *_steps generator: each value it yields is a CMP input, run with
+    run_cmp and sent back (an exception is thrown in instead); the generator's
+    return value is the handler's (body, status). asgi.py drives the same
+    generators, awaiting the CMP instead of blocking a thread on it.
+    """
+    try:
+        value = next(steps)
+        while True:
+            try:
+                result = run_cmp(value)
+            except Exception as e:
+                value = steps.throw(e)
+            else:
+                value = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+def _expired(dispute):
+    return time.time() - dispute["created"] > A2A_TTL
 
 def _disputes_get(did):
     return _ds.get(did)
@@ -92,8 +227,18 @@ def _disputes_get(did):
 def _disputes_put(did, dispute):
     _ds.put(did, dispute)
 
-def _disputes_list_open():
-    return _ds.list_open()
+def _disputes_list_open(limit, cursor):
+    return _ds.list_open_page(limit, cursor, min_created=time.time() - A2A_TTL)
+
+PAGE_DEFAULT = 50
+PAGE_MAX     = 500
+
+def _page_args():
+    """(limit, cursor) from ?limit=&cursor=; ValueError on bad input."""
+    limit = int(request.args.get("limit", PAGE_DEFAULT))
+    if not 1 <= limit <= PAGE_MAX:
+        raise ValueError(f"limit must be between 1 and {PAGE_MAX}")
+    return limit, request.args.get("cursor") or None
 
 # ─── A2A endpoints ────────────────────────────────────────────────────────────
 
@@ -121,14 +266,17 @@ def a2a_initiate():
       "respond_url": "/a2a/respond/{dispute_id}"
     }
     """
-    _prune_disputes()
-    data = request.get_json() or {}
+    return handle_a2a_initiate(request.get_json() or {})
+
+
+def handle_a2a_initiate(data):
+    """Body of POST /a2a/dispute; returns (body, status)."""
     agent_id = data.get("agent_id", "agent-unknown")
     domain = data.get("domain", "")
     claims = data.get("claims", [])
 
     if not domain or not claims:
-        return jsonify({"error": "domain and claims required"}), 400
+        return {"error": "domain and claims required"}, 400
 
     dispute_id = str(uuid.uuid4())[:8]
     _disputes_put(dispute_id, {
@@ -142,7 +290,7 @@ def a2a_initiate():
         "status": "open"
     })
 
-    return jsonify({
+    return {
         "schema": "A2A/1.0",
         "dispute_id": dispute_id,
         "status": "open",
@@ -151,7 +299,7 @@ def a2a_initiate():
         "respond_url": f"/a2a/respond/{dispute_id}",
         "expires_in": A2A_TTL,
         "cmp_doi": "10.5281/zenodo.18732820"
-    }), 201
+    }, 201
 
 
 @app.route("/a2a/respond/<dispute_id>", methods=["POST"])
@@ -168,22 +316,31 @@ def a2a_respond(dispute_id):
 
     Returns: full mediation result (same as /mediate/free) once processed.
     """
+    return handle_a2a_respond(dispute_id, request.get_json() or {})
+
+
+def handle_a2a_respond(dispute_id, data, run_cmp=cmp_backend):
+    """Body of POST /a2a/respond/<id>; run_cmp runs the CMP. Returns (body, status)."""
+    return run_steps(a2a_respond_steps(dispute_id, data), run_cmp)
+
+
+def a2a_respond_steps(dispute_id, data):
+    """POST /a2a/respond/<id> as run_steps() steps."""
     dispute = _disputes_get(dispute_id)
-    if dispute is None:
-        return jsonify({"error": "dispute not found or expired"}), 404
+    if dispute is None or (dispute["status"] == "open" and _expired(dispute)):
+        return {"error": "dispute not found or expired"}, 404
     if dispute["status"] != "open":
-        return jsonify({"error": "dispute already resolved", "status": dispute["status"]}), 409
+        return {"error": "dispute already resolved", "status": dispute["status"]}, 409
 
-    data = request.get_json() or {}
     agent_id = data.get("agent_id", "peer-agent")
     claims = data.get("claims", [])
 
     if not claims:
-        return jsonify({"error": "claims required"}), 400
+        return {"error": "claims required"}, 400
 
     # Check not same agent responding to own dispute
     if any(p["agent"] == agent_id for p in dispute["positions"]):
-        return jsonify({"error": "same agent cannot be both parties"}), 409
+        return {"error": "same agent cannot be both parties"}, 409
 
     dispute["positions"].append({"agent": agent_id, "claims": claims})
     dispute["status"] = "mediating"
@@ -201,7 +358,7 @@ def a2a_respond(dispute_id):
     }
 
     try:
-        result = mediate(input_data)
+        result = yield input_data
         dispute["status"] = "resolved"
         dispute["result"] = result["citation"]
         _disputes_put(dispute_id, dispute)
@@ -212,12 +369,18 @@ def a2a_respond(dispute_id):
             "parties": [p["agent"] for p in dispute["positions"]],
             "status": "resolved"
         }
-        return jsonify(result), 200
+        return result, 200
 
+    except _mp.PoolSaturated as e:
+        # Nothing ran: reopen the dispute so the peer can retry
+        dispute["positions"].pop()
+        dispute["status"] = "open"
+        _disputes_put(dispute_id, dispute)
+        return {"error": str(e)}, e.status
     except Exception as e:
         dispute["status"] = "error"
         _disputes_put(dispute_id, dispute)
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, getattr(e, "status", 500)
 
 
 @app.route("/a2a/dispute/<dispute_id>", methods=["GET"])
@@ -242,8 +405,15 @@ def a2a_status(dispute_id):
 
 @app.route("/a2a/disputes", methods=["GET"])
 def a2a_list():
-    """List open disputes (for peer agents to discover and respond)."""
-    _prune_disputes()
+    """
+    List open disputes (for peer agents to discover and respond), newest first.
+    Paginated: ?limit=N (default 50) and ?cursor=<next_cursor from the previous page>.
+    """
+    try:
+        limit, cursor = _page_args()
+        disputes, next_cursor = _disputes_list_open(limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     open_disputes = [
         {
             "dispute_id": d["id"],
@@ -254,9 +424,10 @@ def a2a_list():
             "respond_url": f"/a2a/respond/{d['id']}",
             "expires_in": max(0, A2A_TTL - (time.time() - d["created"]))
         }
-        for d in _disputes_list_open()
+        for d in disputes
     ]
-    return jsonify({"schema": "A2A/1.0", "open_disputes": open_disputes}), 200
+    return jsonify({"schema": "A2A/1.0", "open_disputes": open_disputes,
+                    "next_cursor": next_cursor}), 200
 
 
 @app.route("/recall", methods=["GET", "POST"])
@@ -268,44 +439,152 @@ def recall_endpoint():
         else:
             data = request.args.to_dict()
             data["claims"] = request.args.getlist("claims")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return handle_recall(data)
 
+
+def handle_recall(data):
+    """Body of /recall for a parsed {domain, claims} query; returns (body, status)."""
+    try:
         domain = data.get("domain", "")
         claims = data.get("claims", [])
         if isinstance(claims, str):
             claims = [claims]
-
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("citation_recall",
-            "/root/ttcd-pub/mediator/citation_recall.py")
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        result = mod.recall(domain, claims)
-        return jsonify(result), 200
+        return _recall.recall(domain, claims), 200
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
 
 @app.route("/mediate/free", methods=["POST"])
 def mediate_free():
+    return handle_mediate_free(request.get_json(silent=True))
+
+
+def handle_mediate_free(input_data, run_cmp=cmp_backend):
+    """Body of POST /mediate/free; returns (body, status)."""
+    return run_steps(mediate_free_steps(input_data), run_cmp)
+
+
+def mediate_free_steps(input_data):
+    """POST /mediate/free as run_steps() steps."""
     try:
-        input_data = request.get_json()
         if not input_data or len(input_data.get("positions", [])) < 2:
-            return jsonify({"error": "At least two positions required"}), 400
-        result = mediate(input_data)
-        return jsonify(result), 200
+            return {"error": "At least two positions required"}, 400
+        result = yield input_data
+        return result, 200
+    except _mp.PoolError as e:
+        return {"error": str(e)}, e.status
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+@app.route("/mediate/batch", methods=["POST"])
+def mediate_batch():
+    """Free mediation of many inputs; streams one NDJSON record per item, then a summary."""
+    items, error = _batch.parse_body(request.get_data(), request.content_type)
+    if error:
+        return error
+    return app.response_class(ndjson_lines(handle_mediate_batch(items)), mimetype="application/x-ndjson")
+
+
+def handle_mediate_batch(items):
+    """Body of POST /mediate/batch for parsed items; yields result records."""
+    return _batch.run_batch(items, pool=mediate_pool)
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield app.json.dumps(record) + "\n"
 
 @app.route("/mediate", methods=["POST"])
 @require_payment(PRICE_MEDIATE, "Canonical mediation via CMP v1.0")
 def mediate_route():
-    input_data = request.get_json()
+    return handle_mediate(request.get_json(silent=True))
+
+
+def handle_mediate(input_data, run_cmp=cmp_backend):
+    """Body of POST /mediate (after payment); returns (body, status)."""
+    return run_steps(mediate_steps(input_data), run_cmp)
+
+
+def mediate_steps(input_data):
+    """POST /mediate as run_steps() steps."""
     if not input_data or len(input_data.get("positions", [])) < 2:
-        return jsonify({"error": "At least two positions required"}), 400
-    result = mediate(input_data)
-    chain_result = try_register_on_chain(result)
+        return {"error": "At least two positions required"}, 400
+    callback_url = input_data.get("callback_url")
+    if callback_url:
+        refused = _rq.check_callback_url(callback_url)
+        if refused:
+            return {"error": refused}, 400
+    try:
+        result = yield input_data
+    except _mp.PoolError as e:
+        return {"error": str(e)}, e.status   # non-200: the payment is released for a retry
+    # Registration is queued; the receipt is reported via the poll_url (or callback_url)
+    chain_result = queue_registration(result, callback_url)
     if chain_result:
         result["chain"] = chain_result
-    return jsonify(result), 200
+    return result, 200
+
+@app.route("/x402/payment/<payment_id>", methods=["GET"])
+def x402_payment(payment_id):
+    payment = _settlement.get(payment_id)
+    if not payment:
+        return jsonify({"error": "Payment not found"}), 404
+    return jsonify(payment), 200
+
+@app.route("/chain/registration/<reg_id>", methods=["GET"])
+def chain_registration(reg_id):
+    reg = _rq.get(reg_id)
+    if not reg:
+        return jsonify({"error": "Registration not found"}), 404
+    view = _registrar.describe(reg) if _registrar else _rq.public_view(reg)
+    return jsonify(view), 200
+
+@app.route("/chain/proof/<canon_hash>", methods=["GET"])
+def chain_proof(canon_hash):
+    proof = _ab.proof_for(canon_hash)
+    if not proof:
+        return jsonify({"error": "Canon not queued for anchoring"}), 404
+    if _anchorer:
+        proof = _anchorer.describe(proof)
+    return jsonify(proof), 200
+
+@app.route("/chain/artifacts", methods=["GET"])
+def chain_artifacts():
+    try:
+        limit, cursor = _page_args()
+        since = request.args.get("since")
+        until = request.args.get("until")
+        items, next_cursor = _ei.query(
+            domain=request.args.get("domain") or None,
+            status=request.args.get("status") or None,
+            since=int(since) if since else None,
+            until=int(until) if until else None,
+            limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"artifacts": items, "count": len(items), "next_cursor": next_cursor}), 200
+
+@app.route("/chain/artifacts/summary", methods=["GET"])
+def chain_artifacts_summary():
+    return jsonify(_ei.summary()), 200
+
+VERIFY_MAX = 10000
+
+@app.route("/chain/verify", methods=["POST"])
+def chain_verify():
+    """Bulk registry lookup: {"hashes": [...]} -> {hash: verify result}."""
+    data = request.get_json() or {}
+    hashes = data.get("hashes", [])
+    if not isinstance(hashes, list) or not 1 <= len(hashes) <= VERIFY_MAX:
+        return jsonify({"error": f"hashes must be a list of 1..{VERIFY_MAX} canon hashes"}), 400
+    try:
+        from chain import verify_many
+        return jsonify({"results": verify_many(hashes)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 import uuid, time
 import challenge_store as _cs
@@ -342,7 +621,16 @@ def canon_challenge():
       "outcome":      "UPHELD" | "FAILED" | "BLOCKED"
     }
     """
-    data           = request.get_json() or {}
+    return handle_canon_challenge(request.get_json() or {})
+
+
+def handle_canon_challenge(data, run_cmp=cmp_backend):
+    """Body of POST /canon/challenge (after payment); returns (body, status)."""
+    return run_steps(canon_challenge_steps(data), run_cmp)
+
+
+def canon_challenge_steps(data):
+    """POST /canon/challenge as run_steps() steps."""
     challenger_id  = data.get("challenger_id", "agent-unknown")
     canon_hash     = data.get("canon_hash", "")
     canon_domain   = data.get("canon_domain", "")
@@ -352,7 +640,7 @@ def canon_challenge():
     claims         = data.get("challenger_claims", [])
 
     if not canon_hash or not grounds:
-        return jsonify({"error": "canon_hash and grounds are required"}), 400
+        return {"error": "canon_hash and grounds are required"}, 400
 
     challenge_id = str(uuid.uuid4())[:8]
     challenge = {
@@ -377,7 +665,7 @@ def canon_challenge():
         challenge["status"]  = "blocked"
         challenge["outcome"] = "BLOCKED"
         _cs.put(challenge_id, challenge)
-        return jsonify({
+        return {
             "schema":          "CanonChallenge/1.0",
             "challenge_id":    challenge_id,
             "validity":        "BLOCKED",
@@ -388,7 +676,7 @@ def canon_challenge():
                 "Positional Independence requires you engage the invariant "
                 "on its merits. Resubmit with factual grounds only."
             )
-        }), 400
+        }, 400
 
     # ── Step 2: Reconstruct canon defense from original invariants ────────────
     # The canon defends itself: its own invariants become Position 2.
@@ -444,7 +732,7 @@ def canon_challenge():
         challenge["status"] = "running_cmp"
         _cs.put(challenge_id, challenge)
 
-        result = mediate(challenge_input)
+        result = yield challenge_input
         canon  = result.get("canon", {})
 
         challenge["result_canon_hash"]   = canon.get("hash")
@@ -473,7 +761,7 @@ def canon_challenge():
 
         _cs.put(challenge_id, challenge)
 
-        return jsonify({
+        return {
             "schema":          "CanonChallenge/1.0",
             "challenge_id":    challenge_id,
             "validity":        "ACCEPTED",
@@ -483,13 +771,13 @@ def canon_challenge():
             "original_canon":  canon_hash,
             "cmp_result":      result,
             "prior_art":       result.get("prior_art", {})
-        }), 200
+        }, 200
 
     except Exception as e:
         challenge["status"]  = "error"
         challenge["outcome"] = "ERROR"
         _cs.put(challenge_id, challenge)
-        return jsonify({"error": str(e), "challenge_id": challenge_id}), 500
+        return {"error": str(e), "challenge_id": challenge_id}, getattr(e, "status", 500)
 
 
 @app.route("/canon/challenge/<challenge_id>", methods=["GET"])
@@ -503,18 +791,22 @@ def canon_challenge_status(challenge_id):
 
 @app.route("/canon/challenges", methods=["GET"])
 def canon_challenges_list():
-    """List all canon challenges — history, outcomes, blocked attempts."""
-    challenges = _cs.list_all()
-    summary = {
-        "total":   len(challenges),
-        "upheld":  sum(1 for c in challenges if c.get("outcome") == "UPHELD"),
-        "failed":  sum(1 for c in challenges if c.get("outcome") == "FAILED"),
-        "blocked": sum(1 for c in challenges if c.get("outcome") == "BLOCKED"),
-    }
+    """
+    List canon challenges — history, outcomes, blocked attempts — newest first.
+    Paginated: ?limit=N (default 50), ?cursor=<next_cursor>; ?canon_hash= filters
+    to one canon. The summary counts cover every matching challenge, not just the page.
+    """
+    canon_hash = request.args.get("canon_hash") or None
+    try:
+        limit, cursor = _page_args()
+        challenges, next_cursor = _cs.list_page(limit, cursor, canon_hash)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({
-        "schema":     "CanonChallenge/1.0",
-        "summary":    summary,
-        "challenges": challenges
+        "schema":      "CanonChallenge/1.0",
+        "summary":     _cs.summary(canon_hash),
+        "challenges":  challenges,
+        "next_cursor": next_cursor
     }), 200
 
 
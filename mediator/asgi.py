@@ -0,0 +1,313 @@
+"""
+asgi.py — ASGI entry point for the Mediator-Canonizer API.
+
+api.py is a synchronous Flask app: under app.run() or a WSGI server each
+request holds a worker for its whole life, including facilitator calls,
+SQLite writes and the CMP itself. This module serves the hot endpoints
+with async handlers instead:
+
+  POST /mediate            POST /mediate/free       POST /mediate/batch
+  GET|POST /recall         POST /a2a/dispute        POST /a2a/respond/<id>
+  POST /canon/challenge
+
+The handlers reuse api.py's *_steps generators and x402_gate.PaymentGate,
+so behaviour and payment semantics are identical. Blocking work is moved
+off the event loop:
+
+  CMP (mediate)                  CMP executor (CMP_WORKERS; see set_cmp_executor),
+                                 or mediate_pool with MEDIATE_BACKEND=process
+  x402 verify/reserve/settle,    I/O executor (IO_WORKERS)
+  SQLite, chain queue, recall
+
+A *_steps generator yields its CMP input. _drive() awaits the CMP future
+on the event loop: the whole handler is one CMP executor job on the thread
+backend; with mediate_pool the code between yields runs on the I/O executor
+and the pool future is awaited. No I/O thread waits on a mediation, so
+in-flight requests are bounded by the CMP backend (and the pool's queue),
+not by IO_WORKERS, and the I/O executor stays free for cheap routes.
+
+Every other route is passed to the Flask app through a small WSGI bridge,
+also on the I/O executor.
+
+Run:
+    uvicorn asgi:app --host 0.0.0.0 --port 8745
+    python loadtest.py --url http://127.0.0.1:8745 --path /mediate/free ...
+"""
+
+import asyncio, io, json, os, re, sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import api
+from json_provider import dumps_bytes
+
+CMP_WORKERS = int(os.environ.get("CMP_WORKERS", os.cpu_count() or 2))
+IO_WORKERS  = int(os.environ.get("IO_WORKERS", 32))
+MAX_BODY    = int(os.environ.get("ASGI_MAX_BODY", 10 * 1024 * 1024))   # bytes
+
+_io_pool  = ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="asgi-io")
+_cmp_pool = ThreadPoolExecutor(CMP_WORKERS, thread_name_prefix="asgi-cmp")
+
+
+def set_cmp_executor(executor):
+    """Run the CMP on another concurrent.futures executor (e.g. a process pool)."""
+    global _cmp_pool
+    _cmp_pool = executor
+
+
+async def _io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_io_pool, fn, *args)
+
+
+def _advance(steps, method, arg):
+    """(done, value) after steps.send(arg) / steps.throw(arg)."""
+    try:
+        return False, getattr(steps, method)(arg)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+async def _drive(steps):
+    """
+    api.run_steps() for the event loop; returns the handler's (body, status).
+    On the thread backend the whole handler is one CMP executor job (its
+    SQLite work is short next to the CMP, and a single hand-off is cheapest).
+    With mediate_pool the code between yields runs on the I/O executor and
+    the pool future is awaited, so no thread waits on a worker process.
+    """
+    if api.mediate_pool is None:
+        return await asyncio.get_running_loop().run_in_executor(_cmp_pool, api.run_steps, steps, api.mediate)
+    done, value = await _io(_advance, steps, "send", None)
+    while not done:
+        try:
+            result = await api.mediate_pool.run_async(value)   # bounded, with timeouts
+        except Exception as e:
+            done, value = await _io(_advance, steps, "throw", e)
+        else:
+            done, value = await _io(_advance, steps, "send", result)
+    return value
+
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need."""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.body = body
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+
+    def json(self, default=None):
+        if not self.body:
+            return default
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return default
+
+
+# ── Handlers ─────────────────────────────────────────────────────────────────
+
+async def _paid(view, req, steps):
+    """Drive a paid *_steps generator behind the view's PaymentGate."""
+    gate = view.payment_gate
+    header = req.headers.get("x-payment")
+    if not header:
+        return 402, gate.challenge(req.path)
+    ticket = None
+    try:
+        ticket, rejected = await _io(gate.begin, req.path, header)
+        if rejected:
+            body, status = rejected
+            return status, body
+        body, status = await _drive(steps)
+        body, status = await _io(gate.finish, ticket, body, status)
+        return status, body
+    except Exception as e:
+        if ticket:
+            await _io(gate.abort, ticket)
+        return 500, {"error": str(e)}
+
+
+async def mediate(req):
+    return await _paid(api.mediate_route, req, api.mediate_steps(req.json()))
+
+
+async def mediate_free(req):
+    body, status = await _drive(api.mediate_free_steps(req.json()))
+    return status, body
+
+
+async def mediate_batch(req):
+    items, error = await _io(api._batch.parse_body, req.body, req.headers.get("content-type"))
+    if error:
+        body, status = error
+        return status, body
+    records = api.handle_mediate_batch(items)
+    return 200, (dumps_bytes(r) + b"\n" for r in records)
+
+
+async def recall(req):
+    if req.method == "POST":
+        data = req.json({})
+    else:
+        data = {k: v[0] for k, v in req.query.items()}
+        data["claims"] = req.query.get("claims", [])
+    body, status = await _io(api.handle_recall, data)
+    return status, body
+
+
+async def a2a_initiate(req):
+    body, status = await _io(api.handle_a2a_initiate, req.json({}))
+    return status, body
+
+
+async def a2a_respond(req, dispute_id):
+    return await _paid(api.a2a_respond, req, api.a2a_respond_steps(dispute_id, req.json({})))
+
+
+async def canon_challenge(req):
+    return await _paid(api.canon_challenge, req, api.canon_challenge_steps(req.json({})))
+
+
+ROUTES = [
+    ("POST", re.compile(r"^/mediate$"),                    mediate),
+    ("POST", re.compile(r"^/mediate/free$"),               mediate_free),
+    ("POST", re.compile(r"^/mediate/batch$"),              mediate_batch),
+    ("GET",  re.compile(r"^/recall$"),                     recall),
+    ("POST", re.compile(r"^/recall$"),                     recall),
+    ("POST", re.compile(r"^/a2a/dispute$"),                a2a_initiate),
+    ("POST", re.compile(r"^/a2a/respond/(?P<dispute_id>[^/]+)$"), a2a_respond),
+    ("POST", re.compile(r"^/canon/challenge$"),            canon_challenge),
+]
+
+
+def _match(method, path):
+    for m, pattern, handler in ROUTES:
+        if m == method:
+            match = pattern.match(path)
+            if match:
+                return handler, match.groupdict()
+    return None, None
+
+
+# ── WSGI bridge for the remaining Flask routes ───────────────────────────────
+
+def _call_wsgi(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD":    scope["method"],
+        "SCRIPT_NAME":       scope.get("root_path", ""),
+        "PATH_INFO":         scope["path"],
+        "QUERY_STRING":      scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME":       server[0],
+        "SERVER_PORT":       str(server[1]),
+        "SERVER_PROTOCOL":   f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR":       (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH":    str(len(body)),
+        "wsgi.version":      (1, 0),
+        "wsgi.url_scheme":   scope.get("scheme", "http"),
+        "wsgi.input":        io.BytesIO(body),
+        "wsgi.errors":       sys.stderr,
+        "wsgi.multithread":  True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once":     False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif key != "CONTENT_LENGTH":
+            key = "HTTP_" + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    started = {}
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    result = api.app(environ, start_response)
+    try:
+        payload = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in started["headers"]]
+    return started["status"], headers, payload
+
+
+# ── ASGI application ─────────────────────────────────────────────────────────
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            raise ValueError("request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _stream(send, status, chunks):
+    """Send an NDJSON body as it is produced; the generator runs on the I/O executor."""
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/x-ndjson")]})
+    try:
+        while True:
+            chunk = await _io(next, chunks, None)
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    finally:
+        await _io(chunks.close)   # stops a batch: cancels its pending items
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _send(send, status, body, headers=None):
+    if not isinstance(body, (bytes, bytearray)):
+        body = dumps_bytes(body)
+        headers = [(b"content-type", b"application/json")]
+    await send({"type": "http.response.start", "status": status,
+                "headers": (headers or [(b"content-type", b"application/json")])
+                           + [(b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _io_pool.shutdown(wait=False)
+            _cmp_pool.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    try:
+        body = await _read_body(receive)
+    except ValueError as e:
+        return await _send(send, 413, {"error": str(e)})
+
+    handler, params = _match(scope["method"], scope["path"])
+    if handler is None:
+        status, headers, payload = await _io(_call_wsgi, scope, body)
+        return await _send(send, status, payload, headers=[h for h in headers if h[0] != b"content-length"])
+
+    status, result = await handler(Request(scope, body), **params)
+    if hasattr(result, "__next__"):
+        return await _stream(send, status, result)
+    await _send(send, status, result)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+bench_storage.py — Concurrency benchmark for the dispute store.
+
+Runs the same A2A-shaped workload (open dispute, read it back, resolve it,
+list open disputes every 10th op) from N threads against:
+
+  legacy   connect per call, rollback journal, commit per statement
+           (what dispute_store did before storage.py)
+  pooled   storage.Database: per-thread connections, WAL, tuned pragmas
+
+Each run uses a fresh temporary database; disputes.db is never touched.
+
+Usage:
+    python bench_storage.py [--threads 1,4,16] [--ops 500]
+"""
+
+import argparse, os, sqlite3, sys, tempfile, threading, time
+from contextlib import contextmanager
+
+_tmpdir = tempfile.mkdtemp(prefix="ttcd-bench-")
+os.environ["DISPUTES_DB"] = os.path.join(_tmpdir, "bootstrap.db")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import storage
+import dispute_store
+
+
+class LegacyDatabase:
+    """The pre-storage.py access pattern, for comparison."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def conn(self):
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.conn()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def query_one(self, sql, params=()):
+        conn = self.conn()
+        try:
+            return conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+
+    def query_all(self, sql, params=()):
+        conn = self.conn()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+def _use(mode, path):
+    dispute_store.DB_PATH = path
+    key = os.path.abspath(path)
+    storage._databases[key] = LegacyDatabase(key) if mode == "legacy" else storage.Database(key)
+    dispute_store.init_db()
+
+
+def _worker(tid, ops, latencies, errors):
+    for i in range(ops):
+        did = f"{tid}-{i}"
+        t0 = time.perf_counter()
+        try:
+            dispute_store.put(did, {
+                "created": time.time(), "domain": "bench domain",
+                "positions": [{"agent": f"agent-{tid}", "claims": ["a", "b"]}],
+                "status": "open",
+            })
+            d = dispute_store.get(did)
+            d["status"] = "resolved"
+            dispute_store.put(did, d)
+            if i % 10 == 0:
+                dispute_store.list_open()
+        except sqlite3.OperationalError:
+            errors.append(did)
+        latencies.append(time.perf_counter() - t0)
+
+
+def run(mode, threads, ops):
+    _use(mode, os.path.join(_tmpdir, f"{mode}-{threads}.db"))
+    latencies, errors = [], []
+    workers = [threading.Thread(target=_worker, args=(t, ops, latencies, errors))
+               for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "mode": mode,
+        "threads": threads,
+        "ops_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispute store concurrency benchmark")
+    parser.add_argument("--threads", default="1,4,16", help="comma-separated thread counts")
+    parser.add_argument("--ops", type=int, default=500, help="dispute lifecycles per thread")
+    args = parser.parse_args()
+
+    print(f"{'mode':8} {'threads':>7} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for threads in [int(t) for t in args.threads.split(",")]:
+        for mode in ("legacy", "pooled"):
+            r = run(mode, threads, args.ops)
+            print(f"{r['mode']:8} {r['threads']:>7} {r['ops_per_s']:>9} "
+                  f"{r['p50_ms']:>8} {r['p99_ms']:>8} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
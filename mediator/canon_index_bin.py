@@ -0,0 +1,238 @@
+"""
+canon_index_bin.py — Compact, memory-mappable on-disk citation index.
+
+canon_index.json stores every canon's tf dict as pretty-printed JSON, so each
+process start had to json.load() the whole file and rebuild postings. This
+format stores the inverted index itself:
+
+  header      magic, version, counts, (offset, length) of every section
+  term_off    u32[n_terms+1]  offsets into term_str; terms sorted by UTF-8
+  term_str    interned term dictionary (term id = position in sort order)
+  post_start  u32[n_terms+1]  postings range per term id
+  idf         f32[n_terms]    BM25 idf per term
+  max_impact  f32[n_terms]    best BM25 impact per term (search upper bound,
+                              rounded up so f32 never under-estimates it)
+  post_doc    u32[P]          doc ids, grouped by term
+  post_w      u16[P]          DOMAIN_TERMS-weighted tf, parallel to post_doc
+  decl_start  u32[n_terms+1]  declaration-postings range per term id
+  decl_doc    u32[D]          doc ids whose declarations contain the term
+  doc_norm    f64[n_docs]     BM25 length normalisation per doc
+  doc_off     u64[n_docs+1]   offsets into doc_blob
+  doc_blob    one JSON object per canon (entry without tf), decoded lazily
+
+MappedIndex mmaps the file and reads sections through memoryviews: opening an
+index costs a header parse, a term lookup is a binary search over term_str,
+and only the postings and canon records a query touches are decoded.
+
+All integers and floats are little-endian; sections are 8-byte aligned.
+"""
+
+import json, mmap, os, struct, sys, tempfile
+from array import array
+from collections import defaultdict
+
+MAGIC   = b"TTCIDX\x00\x01"
+VERSION = 1
+
+SECTIONS = [
+    ("term_off",   "I"),
+    ("term_str",   "B"),
+    ("post_start", "I"),
+    ("idf",        "f"),
+    ("max_impact", "f"),
+    ("post_doc",   "I"),
+    ("post_w",     "H"),
+    ("decl_start", "I"),
+    ("decl_doc",   "I"),
+    ("doc_norm",   "d"),
+    ("doc_off",    "Q"),
+    ("doc_blob",   "B"),
+]
+_HEADER = struct.Struct("<8sIII4x" + "QQ" * len(SECTIONS))
+_LITTLE = sys.byteorder == "little"
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _packed(typecode, values):
+    arr = array(typecode, values)
+    if not _LITTLE:
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def write_index(path, docs, doc_tf, decl_terms, doc_norm, idf, max_impact):
+    """
+    Serialize an index atomically.
+
+    docs:       list of canon records (entry dicts without "tf")
+    doc_tf:     list of {term: weighted tf}, parallel to docs
+    decl_terms: list of sets of declaration terms, parallel to docs
+    doc_norm:   list of BM25 normalisation factors, parallel to docs
+    idf, max_impact: {term: float}
+    """
+    vocab = set(idf)
+    for terms in decl_terms:
+        vocab.update(terms)
+    terms = sorted(vocab, key=lambda t: t.encode("utf-8"))
+
+    postings = defaultdict(list)
+    for doc_id, tf in enumerate(doc_tf):
+        for term, w in tf.items():
+            postings[term].append((doc_id, w))
+    decl = defaultdict(list)
+    for doc_id, dterms in enumerate(decl_terms):
+        for term in dterms:
+            decl[term].append(doc_id)
+
+    term_off, term_str = [0], bytearray()
+    post_start, post_doc, post_w = [0], [], []
+    if any(w > 0xFFFF for tf in doc_tf for w in tf.values()):
+        raise ValueError("term weight exceeds u16 postings range")
+    decl_start, decl_doc = [0], []
+    for term in terms:
+        term_str += term.encode("utf-8")
+        term_off.append(len(term_str))
+        for doc_id, w in postings.get(term, ()):
+            post_doc.append(doc_id)
+            post_w.append(w)
+        post_start.append(len(post_doc))
+        decl_doc.extend(sorted(decl.get(term, ())))
+        decl_start.append(len(decl_doc))
+
+    doc_off, doc_blob = [0], bytearray()
+    for d in docs:
+        doc_blob += json.dumps(d, separators=(",", ":")).encode("utf-8")
+        doc_off.append(len(doc_blob))
+
+    payload = {
+        "term_off":   _packed("I", term_off),
+        "term_str":   bytes(term_str),
+        "post_start": _packed("I", post_start),
+        "idf":        _packed("f", [idf.get(t, 0.0) for t in terms]),
+        "max_impact": _packed("f", [max_impact.get(t, 0.0) * (1 + 1e-6) for t in terms]),
+        "post_doc":   _packed("I", post_doc),
+        "post_w":     _packed("H", post_w),
+        "decl_start": _packed("I", decl_start),
+        "decl_doc":   _packed("I", decl_doc),
+        "doc_norm":   _packed("d", doc_norm),
+        "doc_off":    _packed("Q", doc_off),
+        "doc_blob":   bytes(doc_blob),
+    }
+
+    layout, pos = [], _align(_HEADER.size)
+    for name, _ in SECTIONS:
+        layout.extend((pos, len(payload[name])))
+        pos = _align(pos + len(payload[name]))
+    header = _HEADER.pack(MAGIC, VERSION, len(docs), len(terms), *layout)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix=".canon_index.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for i, (name, _) in enumerate(SECTIONS):
+                f.seek(layout[2 * i])
+                f.write(payload[name])
+            f.truncate(pos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class MappedIndex:
+    """Read-only view over a canon_index.bin file; nothing is decoded up front."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_docs, self.n_terms, *layout = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a canon index v{VERSION} file")
+
+        view = memoryview(self._mm)
+        self._sections = {}
+        for i, (name, code) in enumerate(SECTIONS):
+            off, length = layout[2 * i], layout[2 * i + 1]
+            sec = view[off:off + length]
+            if code != "B":
+                sec = sec.cast(code) if _LITTLE else _swapped(code, sec)
+            self._sections[name] = sec
+        self._term_off = self._sections["term_off"]
+        self._term_str = self._sections["term_str"]
+        self._term_base = layout[2]
+
+    def __len__(self):
+        return self.n_docs
+
+    def term(self, tid):
+        return bytes(self._term_str[self._term_off[tid]:self._term_off[tid + 1]]).decode("utf-8")
+
+    def term_id(self, term):
+        """Binary search of the term dictionary; -1 if absent."""
+        key = term.encode("utf-8")
+        offs, mm, base = self._term_off, self._mm, self._term_base
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cand = mm[base + offs[mid]:base + offs[mid + 1]]
+            if cand < key:
+                lo = mid + 1
+            elif cand > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def max_impact(self, tid):
+        return self._sections["max_impact"][tid]
+
+    def postings(self, tid, k1):
+        """[(doc_id, BM25 impact)] for a term id."""
+        s = self._sections
+        start, end = s["post_start"][tid], s["post_start"][tid + 1]
+        idf, norm = s["idf"][tid], s["doc_norm"]
+        scale = idf * (k1 + 1)
+        return [(d, scale * w / (w + norm[d]))
+                for d, w in zip(s["post_doc"][start:end], s["post_w"][start:end])]
+
+    def decl_docs(self, tid):
+        s = self._sections
+        return s["decl_doc"][s["decl_start"][tid]:s["decl_start"][tid + 1]].tolist()
+
+    def doc(self, doc_id):
+        off = self._sections["doc_off"]
+        return json.loads(bytes(self._sections["doc_blob"][off[doc_id]:off[doc_id + 1]]))
+
+    def entries(self):
+        """Full entries, tf included, reconstructed from the postings (export / re-index)."""
+        s = self._sections
+        tfs = [dict() for _ in range(self.n_docs)]
+        post_start, post_doc, post_w = s["post_start"], s["post_doc"], s["post_w"]
+        for tid in range(self.n_terms):
+            start, end = post_start[tid], post_start[tid + 1]
+            if start == end:
+                continue
+            term = self.term(tid)
+            for d, w in zip(post_doc[start:end], post_w[start:end]):
+                tfs[d][term] = w
+        out = []
+        for doc_id in range(self.n_docs):
+            entry = self.doc(doc_id)
+            entry["tf"] = tfs[doc_id]
+            out.append(entry)
+        return out
+
+
+def _swapped(code, sec):
+    arr = array(code)
+    arr.frombytes(sec.tobytes())
+    arr.byteswap()
+    return memoryview(arr)
@@ -7,16 +7,21 @@ DOI: 10.5281/zenodo.18732820
 """
 
 import json
+import logging
 import hashlib
 import datetime
 import argparse
 import sys
 from pathlib import Path
 import prov_writer as _prov
+import citation_recall as _recall
+import claim_matrix as _matrix
+import result_cache as _results
+from cmp_log import log, configure as configure_logging
+import cmp_metrics as _metrics
+from cmp_metrics import StepTimer
 import time as _time
 
-CITATION_RECALL_PATH = "/root/ttcd-pub/mediator/citation_recall.py"
-
 VERSION = "1.0.0"
 CMP_DOI = "10.5281/zenodo.18732820"
 
@@ -30,27 +35,47 @@ def intake(input_data: dict) -> dict:
     return {"step": "intake", "input_type": input_type, "domain": domain, "position_count": len(positions), "positions": positions}
 
 
+def count_support(positions: list) -> dict:
+    """
+    Number of positions asserting each claim, in one pass over all claims.
+    A claim repeated within a position counts once; keys keep first-seen order.
+    """
+    support = {}
+    get = support.get
+    for p in positions:
+        for c in dict.fromkeys(p.get("claims", [])):
+            support[c] = get(c, 0) + 1
+    return support
+
+
 def identify_overlap(positions: list) -> dict:
-    all_claims = [set(p.get("claims", [])) for p in positions]
-    shared = set.intersection(*all_claims) if len(all_claims) > 1 else all_claims[0]
-    all_union = set.union(*all_claims)
-    contested = all_union - shared
-    return {"step": "overlap", "shared_claims": list(shared), "contested_claims": list(contested), "overlap_ratio": round(len(shared) / max(len(all_union), 1), 3)}
+    if _matrix.enabled(positions):
+        m = _matrix.build(positions)
+        if m is not None:
+            shared, contested, ratio = m.overlap()
+            return {"step": "overlap", "shared_claims": shared, "contested_claims": contested, "overlap_ratio": ratio, "claim_matrix": m}
+    support = count_support(positions)
+    n = len(positions)
+    shared = [c for c, k in support.items() if k == n]
+    contested = [c for c, k in support.items() if k < n]
+    return {"step": "overlap", "shared_claims": shared, "contested_claims": contested, "overlap_ratio": round(len(shared) / max(len(support), 1), 3), "claim_support": support}
 
 
 def extract_candidates(positions: list, overlap: dict) -> dict:
     candidates = []
     for claim in overlap.get("shared_claims", []):
         candidates.append({"proposition": claim, "source": "shared", "confidence": 1.0})
-    claim_counts = {}
-    for p in positions:
-        for c in p.get("claims", []):
-            if c in overlap.get("contested_claims", []):
-                claim_counts[c] = claim_counts.get(c, 0) + 1
-    majority = len(positions) / 2
-    for claim, count in claim_counts.items():
-        if count > majority:
-            candidates.append({"proposition": claim, "source": "majority", "confidence": round(count / len(positions), 3)})
+    m = overlap.get("claim_matrix")
+    if m is not None:
+        majority = m.majority()
+    else:
+        support = overlap.get("claim_support")
+        if support is None:
+            support = count_support(positions)
+        n = len(positions)
+        majority = [(claim, round(count / n, 3)) for claim, count in support.items() if n / 2 < count < n]
+    for claim, confidence in majority:
+        candidates.append({"proposition": claim, "source": "majority", "confidence": confidence})
     return {"step": "candidates", "candidate_count": len(candidates), "candidates": candidates}
 
 
@@ -79,7 +104,8 @@ def produce_artifact(domain, candidates, gap_map, positions, metadata, scope="",
     invariants = [c["proposition"] for c in candidates if c["source"] == "shared"]
     timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat() + "Z"
     # Run semantic validation before freezing
-    semantic = semantic_validate(domain, invariants, name=domain, scope=scope, fiduciary=fiduciary, evidence=evidence)
+    with _metrics.span("validation"):
+        semantic = semantic_validate(domain, invariants, name=domain, scope=scope, fiduciary=fiduciary, evidence=evidence)
     freeze_approved = semantic.get("verdict") == "FREEZE_APPROVED" or semantic.get("verdict") == "VALIDATOR_UNAVAILABLE"
     has_invariants = len(invariants) > 0
     final_status = "FROZEN" if (gap_map["canon_ready"] and freeze_approved and has_invariants) else "DRAFT"
@@ -96,38 +122,76 @@ def publish(artifact: dict, output_path: str = None) -> dict:
     output = {"step": "publication", "canon": canon, "citation": citation}
     if output_path:
         Path(output_path).write_text(json.dumps(output, indent=2))
-        print(f"Written to: {output_path}")
+        log.info("publish.written", extra={"fields": {"path": output_path}})
     return output
 
 
-def mediate(input_data: dict, output_path: str = None) -> dict:
-    print(f"\n=== Mediator-Canonizer v{VERSION} ===")
-    print(f"CMP DOI: {CMP_DOI}\n")
+def mediate(input_data: dict, output_path: str = None, use_cache: bool = True) -> dict:
+    """Run the CMP; an exact repeat of an earlier input returns its cached result."""
+    timer = StepTimer()
+    try:
+        cache = _results.get_cache() if use_cache else None
+        key = _results.cache_key(input_data) if cache else None
+        result = cache.get(key) if cache else None
+        if cache:
+            timer.lap("cache")
+        cached = result is not None
+        if cached:
+            if log.isEnabledFor(logging.INFO):
+                log.info("mediation.cached", extra={"fields": {
+                    "key": key, "domain": result["canon"]["domain"],
+                    "status": result["canon"]["status"], "hash": result["canon"]["hash"]}})
+            if output_path:
+                publish({"artifact": result["canon"]}, output_path)
+        else:
+            result = _mediate(input_data, output_path, timer)
+            if cache:
+                cache.put(key, result)
+                timer.lap("cache_store")
+    except BaseException:
+        timer.finish(None)
+        raise
+    profile = timer.finish(result["canon"]["status"], cached=cached, label=result["canon"]["hash"])
+    if profile:
+        log.warning("mediation.slow", extra={"fields": {
+            "hash": result["canon"]["hash"], "total_ms": timer.total_ms(), "profile": profile}})
+    return result
+
+
+def _mediate(input_data: dict, output_path: str, timer: StepTimer) -> dict:
+    debug = log.isEnabledFor(logging.DEBUG)
     # Citation recall: surface prior frozen canons before processing
     prior_art = _citation_recall(input_data.get("domain", ""), input_data.get("positions", []))
+    timer.lap("recall")
     s1 = intake(input_data)
-    print(f"[1/7] Intake: {s1['position_count']} positions, type {s1['input_type']}")
+    timer.lap("intake")
     s2 = identify_overlap(s1["positions"])
-    print(f"[2/7] Overlap: {len(s2['shared_claims'])} shared, {len(s2['contested_claims'])} contested (ratio: {s2['overlap_ratio']})")
+    timer.lap("overlap")
     s3 = extract_candidates(s1["positions"], s2)
-    print(f"[3/7] Candidates: {s3['candidate_count']} extracted")
+    timer.lap("candidates")
     s4 = stress_test(s3["candidates"], s1["domain"])
-    print(f"[4/7] Stress Test: {s4['gap_count']} gaps, {len(s4['critical_gaps'])} critical")
+    timer.lap("stress_test")
     s5 = build_gap_map(s4)
-    print(f"[5/7] Gap Map: canon_ready={s5['canon_ready']}")
+    timer.lap("gap_map")
     scope     = input_data.get("scope_boundary", "")
     fiduciary = input_data.get("fiduciary_moment", "")
     evidence  = input_data.get("evidence_standard", "")
     s6 = produce_artifact(s1["domain"], s3["candidates"], s5, s1["positions"], input_data.get("metadata", {}), scope=scope, fiduciary=fiduciary, evidence=evidence)
-    print(f"[6/7] Artifact: status={s6['artifact']['status']}, hash={s6['artifact']['hash'][:16]}...")
+    timer.lap("artifact")
     result = publish(s6, output_path)
-    print(f"[7/7] Published")
-    print(f"\nCitation: {result['citation']['cite_as']}\n")
+    timer.lap("publish")
     if prior_art:
         result["prior_art"] = prior_art
+    if debug:
+        log.debug("cmp.steps", extra={"fields": {
+            "domain": s1["domain"], "positions": s1["position_count"], "input_type": s1["input_type"],
+            "shared": len(s2["shared_claims"]), "contested": len(s2["contested_claims"]),
+            "overlap_ratio": s2["overlap_ratio"], "candidates": s3["candidate_count"],
+            "gaps": s4["gap_count"], "critical_gaps": len(s4["critical_gaps"]),
+            "canon_ready": s5["canon_ready"], "steps_ms": dict(timer.steps),
+        }})
 
     # Write PROV-O provenance for FROZEN canons
-    _cmp_start = _time.time()
     canon = result.get("canon", {})
     if canon.get("status") == "FROZEN":
         agents = [p.get("agent", "unknown") for p in s1["positions"]]
@@ -136,29 +200,30 @@ def mediate(input_data: dict, output_path: str = None) -> dict:
             domain     = canon["domain"],
             status     = canon["status"],
             agents     = agents,
-            started_at = _cmp_start - 10,
+            started_at = timer.started,
             ended_at   = _time.time(),
             metadata   = input_data.get("metadata", {})
         )
         if prov_path:
             result["provenance"] = {"ttl": "/prov/" + canon["hash"], "written": True}
-            print("[PROV] Written: " + prov_path)
+        timer.lap("provenance")
+    if log.isEnabledFor(logging.INFO):
+        log.info("mediation", extra={"fields": {
+            "cmp_version": VERSION, "domain": canon["domain"], "status": canon["status"],
+            "hash": canon["hash"], "positions": s1["position_count"],
+            "invariants": len(canon["invariants"]), "gaps": s4["gap_count"],
+            "provenance": "provenance" in result, **timer.fields(),
+        }})
     return result
 
 
-
-
 def _citation_recall(domain: str, positions: list) -> dict:
     """Pull prior art for a domain before mediation starts."""
     try:
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("citation_recall", CITATION_RECALL_PATH)
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
         claims = []
         for p in positions:
             claims.extend(p.get("claims", []))
-        return mod.recall(domain, claims)
+        return _recall.recall(domain, claims)
     except Exception as e:
         return {"schema": "CitationRecall/1.0", "error": str(e)}
 
@@ -166,8 +231,14 @@ def main():
     parser = argparse.ArgumentParser(description="Mediator-Canonizer v1.0 — CMP seven-step process")
     parser.add_argument("command", choices=["mediate", "demo"], help="Command to run")
     parser.add_argument("--input", "-i", help="Input JSON file with positions")
+    parser.add_argument("--input-jsonl", help="JSONL file (or - for stdin) with one input per line; writes NDJSON results")
     parser.add_argument("--output", "-o", help="Output JSON file for canon artifact")
+    parser.add_argument("--workers", type=int, default=0, help="Run on a process pool of N workers (default: in-process)")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds before a pooled mediation is abandoned")
+    parser.add_argument("--log", choices=["text", "json", "quiet"], default=None, help="Pipeline log format on stderr (default: CMP_LOG or text)")
     args = parser.parse_args()
+    if args.log:
+        configure_logging(args.log)
 
     if args.command == "demo":
         demo_input = {
@@ -186,25 +257,59 @@ def main():
         if not args.output:
             print(json.dumps(result, indent=2))
 
+    elif args.command == "mediate" and args.input_jsonl:
+        mediate_jsonl(args.input_jsonl, args.output, args.workers, args.timeout)
+
     elif args.command == "mediate":
         if not args.input:
-            print("Error: --input required for mediate command")
+            print("Error: --input or --input-jsonl required for mediate command")
             sys.exit(1)
         try:
             input_data = json.loads(Path(args.input).read_text())
         except Exception as e:
             print(f"Error reading input: {e}")
             sys.exit(1)
-        result = mediate(input_data, args.output)
+        if args.workers:
+            from mediate_pool import start_pool, PoolError
+            try:
+                result = start_pool(workers=args.workers, timeout=args.timeout).run(input_data, args.output)
+            except PoolError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+        else:
+            result = mediate(input_data, args.output)
         if not args.output:
             print(json.dumps(result, indent=2))
 
 
+def mediate_jsonl(input_path: str, output_path: str = None, workers: int = 0, timeout: float = None):
+    """Batch mode: one NDJSON result record per input line, then a summary record."""
+    from mediate_batch import parse_jsonl, run_batch
+    out = open(output_path, "w") if output_path else sys.stdout   # logging goes to stderr
+    src = sys.stdin if input_path == "-" else open(input_path)
+    try:
+        pool = None
+        if workers:
+            from mediate_pool import start_pool
+            pool = start_pool(workers=workers, timeout=timeout)
+        for record in run_batch(parse_jsonl(src), pool=pool, **({"timeout": timeout} if timeout else {})):
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if src is not sys.stdin:
+            src.close()
+    if record["summary"]["failed"]:
+        sys.exit(1)
+
+
 def semantic_validate(domain: str, invariants: list, name: str = "", scope: str = "", fiduciary: str = "", evidence: str = "") -> dict:
     """Run semantic validation before freezing. Returns validation result."""
     try:
         import sys
-        sys.path.insert(0, "/root/ttcd-pub/mediator")
+        if "/root/ttcd-pub/mediator" not in sys.path:
+            sys.path.insert(0, "/root/ttcd-pub/mediator")
         from semantic_validator import validate_artifact
         artifact = {
             "name": name or domain,
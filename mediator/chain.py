@@ -1,49 +1,319 @@
-import os
-from web3 import Web3
+"""
+chain.py — Base mainnet access for the Mediator-Canonizer registry.
 
-CONTRACT_ADDRESS = "0xf2325531264CA4Fc2cEC5D661E2200eA8013b091"
-BASE_RPC = "https://mainnet.base.org"
+ChainClient is long-lived (one per RPC URL + contract, via get_client): it
+keeps a pooled HTTP session, the contract object, one NonceManager per
+account and a gas price sampled at most every GAS_PRICE_TTL seconds, and
+records latency for every JSON-RPC method it sends. Registrar signs and
+submits through a client without waiting for blocks. verify lookups go
+through verify_cache first.
+"""
+
+import os, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3, HTTPProvider
+import verify_cache
+
+# Overridable so the registry can be exercised against a local EVM (anvil / hardhat)
+CONTRACT_ADDRESS = os.environ.get("REGISTRY_ADDRESS", "0xf2325531264CA4Fc2cEC5D661E2200eA8013b091")
+BASE_RPC = os.environ.get("BASE_RPC", "https://mainnet.base.org")
+EXPLORER_TX = os.environ.get("EXPLORER_TX", "https://basescan.org/tx/")
+
+GAS_PRICE_TTL = float(os.environ.get("GAS_PRICE_TTL", 15))   # seconds
+RPC_POOL_SIZE = int(os.environ.get("RPC_POOL_SIZE", 10))     # pooled HTTP connections
+RPC_TIMEOUT   = 30
+TX_GAS        = 200000
 
 ABI = [
     {"inputs": [{"name": "domain", "type": "string"}, {"name": "status", "type": "string"}, {"name": "hash", "type": "bytes32"}, {"name": "cite_as", "type": "string"}], "name": "registerArtifact", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
     {"inputs": [{"name": "hash", "type": "bytes32"}], "name": "verify", "outputs": [{"name": "exists", "type": "bool"}, {"name": "domain", "type": "string"}, {"name": "status", "type": "string"}, {"name": "timestamp", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "totalArtifacts", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "root", "type": "bytes32"}, {"name": "leafCount", "type": "uint256"}, {"name": "batchId", "type": "string"}], "name": "anchorRoot", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
+    {"inputs": [{"name": "root", "type": "bytes32"}], "name": "anchors", "outputs": [{"name": "leafCount", "type": "uint256"}, {"name": "timestamp", "type": "uint256"}, {"name": "batchId", "type": "string"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "canonHash", "type": "bytes32"}, {"name": "proof", "type": "bytes32[]"}, {"name": "root", "type": "bytes32"}], "name": "verifyInclusion", "outputs": [{"name": "anchored", "type": "bool"}, {"name": "timestamp", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "totalAnchors", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "hash", "type": "bytes32"}, {"name": "domain", "type": "string"}, {"name": "status", "type": "string"}, {"name": "timestamp", "type": "uint256"}, {"name": "cite_as", "type": "string"}], "name": "ArtifactFrozen", "type": "event"},
 ]
 
+class RpcMetrics:
+    """Call count, errors and latency per JSON-RPC method."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def record(self, method, seconds, error=False):
+        ms = seconds * 1000
+        with self._lock:
+            m = self._methods.setdefault(method, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            m["calls"] += 1
+            m["errors"] += int(error)
+            m["total_ms"] += ms
+            m["max_ms"] = max(m["max_ms"], ms)
+
+    def snapshot(self):
+        with self._lock:
+            methods = {k: dict(v) for k, v in self._methods.items()}
+        for m in methods.values():
+            m["avg_ms"] = round(m["total_ms"] / m["calls"], 3)
+            m["total_ms"] = round(m["total_ms"], 3)
+            m["max_ms"] = round(m["max_ms"], 3)
+        return methods
+
+
+class _TimedHTTPProvider(HTTPProvider):
+    """HTTPProvider that reports each request's wall time to RpcMetrics."""
+
+    def __init__(self, endpoint_uri, metrics, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self._metrics = metrics
+
+    def make_request(self, method, params):
+        t0 = time.perf_counter()
+        try:
+            response = super().make_request(method, params)
+        except Exception:
+            self._metrics.record(method, time.perf_counter() - t0, error=True)
+            raise
+        self._metrics.record(method, time.perf_counter() - t0, error="error" in response)
+        return response
+
+
+class NonceManager:
+    """
+    Hands out consecutive nonces for one account across worker threads.
+    Seeded from the pending transaction count; reset() re-reads it after a
+    nonce error or a dropped transaction.
+    """
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._lock = threading.Lock()
+        self._next = None
+
+    def allocate(self):
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def reset(self):
+        with self._lock:
+            self._next = None
+
+
+class ChainClient:
+    """One RPC endpoint + registry contract, shared by every caller in the process."""
+
+    def __init__(self, rpc_url=None, contract_address=None):
+        self.rpc_url = rpc_url or BASE_RPC
+        self.contract_address = contract_address or CONTRACT_ADDRESS
+        self.metrics = RpcMetrics()
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RPC_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        provider = _TimedHTTPProvider(self.rpc_url, self.metrics, session=session,
+                                      request_kwargs={"timeout": RPC_TIMEOUT})
+        self.w3 = Web3(provider)
+        self.contract = self.w3.eth.contract(address=self.contract_address, abi=ABI)
+
+        self._lock = threading.Lock()
+        self._nonces = {}
+        self._gas_lock = threading.Lock()
+        self._gas_price = None
+        self._gas_sampled = 0.0
+
+    def nonces(self, address):
+        """The shared NonceManager for an account."""
+        with self._lock:
+            mgr = self._nonces.get(address)
+            if mgr is None:
+                mgr = self._nonces[address] = NonceManager(self.w3, address)
+            return mgr
+
+    def gas_price(self):
+        """eth_gasPrice, re-sampled at most every GAS_PRICE_TTL seconds."""
+        if self._gas_price is not None and time.monotonic() - self._gas_sampled < GAS_PRICE_TTL:
+            return self._gas_price
+        with self._gas_lock:
+            if self._gas_price is None or time.monotonic() - self._gas_sampled >= GAS_PRICE_TTL:
+                self._gas_price = self.w3.eth.gas_price
+                self._gas_sampled = time.monotonic()
+            return self._gas_price
+
+    def stats(self):
+        age = round(time.monotonic() - self._gas_sampled, 3) if self._gas_price is not None else None
+        return {
+            "rpc_url":       self.rpc_url,
+            "contract":      self.contract_address,
+            "gas_price":     self._gas_price,
+            "gas_price_age": age,
+            "accounts":      len(self._nonces),
+            "rpc":           self.metrics.snapshot(),
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(rpc_url=None, contract_address=None):
+    """Shared ChainClient for an RPC URL + contract (one per pair per process)."""
+    key = (rpc_url or BASE_RPC, contract_address or CONTRACT_ADDRESS)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = ChainClient(*key)
+    return client
+
+def chain_stats():
+    """RPC latency and gas sampling for every client in this process."""
+    return [c.stats() for c in list(_clients.values())]
+
+
+class Registrar:
+    """
+    Submits registerArtifact / anchorRoot transactions without waiting for a
+    block. Used by registration_queue and anchor_batcher workers; any object
+    with submit (or anchor_root) / receipt / tx_known can stand in for it.
+    """
+
+    def __init__(self, private_key, rpc_url=None, contract_address=None, client=None):
+        self.client = client or get_client(rpc_url, contract_address)
+        self.w3 = self.client.w3
+        self.account = self.w3.eth.account.from_key(private_key)
+        self.contract_address = self.client.contract_address
+        self.contract = self.client.contract
+        self.nonces = self.client.nonces(self.account.address)
+
+    def submit(self, domain, status, hash_hex, cite_as):
+        """Sign and send registerArtifact; returns (tx_hash_hex, nonce)."""
+        hash_bytes = bytes.fromhex(hash_hex.replace("0x", ""))
+        return self._send(self.contract.functions.registerArtifact(domain, status, hash_bytes, cite_as))
+
+    def anchor_root(self, root_hex, leaf_count, batch_id):
+        """Sign and send anchorRoot for a Merkle batch; returns (tx_hash_hex, nonce)."""
+        root_bytes = bytes.fromhex(root_hex.replace("0x", ""))
+        return self._send(self.contract.functions.anchorRoot(root_bytes, leaf_count, batch_id))
+
+    def registered(self, hash_hex):
+        """Whether registry.verify(hash) already reports the artifact (uncached)."""
+        return _verify_call(self.contract, hash_hex)["exists"]
+
+    def anchored(self, root_hex):
+        """Whether registry.anchors(root) already records the Merkle root."""
+        root_bytes = bytes.fromhex(root_hex.replace("0x", ""))
+        leaf_count, timestamp, batch_id = self.contract.functions.anchors(root_bytes).call()
+        return timestamp != 0
+
+    def _send(self, call):
+        nonce = self.nonces.allocate()
+        try:
+            tx = call.build_transaction({
+                "from": self.account.address,
+                "nonce": nonce,
+                "gas": TX_GAS,
+                "gasPrice": self.client.gas_price(),
+            })
+            signed = self.account.sign_transaction(tx)
+            tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        except Exception:
+            # The nonce may or may not have been consumed; re-read it next time
+            self.nonces.reset()
+            raise
+        return tx_hash.hex(), nonce
+
+    def receipt(self, tx_hash, timeout=120):
+        """Receipt dict once mined, or None if not mined within timeout."""
+        from web3.exceptions import TimeExhausted
+        try:
+            r = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        except TimeExhausted:
+            return None
+        return {"block": r.blockNumber, "success": r.status == 1}
+
+    def tx_known(self, tx_hash):
+        """False once a node no longer knows the transaction (dropped / replaced)."""
+        from web3.exceptions import TransactionNotFound
+        try:
+            self.w3.eth.get_transaction(tx_hash)
+            return True
+        except TransactionNotFound:
+            self.nonces.reset()
+            return False
+
+
 def register_on_chain(domain, status, hash_hex, cite_as, private_key):
+    """Blocking single registration (CLI / scripts); the API uses registration_queue."""
     try:
-        w3 = Web3(Web3.HTTPProvider(BASE_RPC))
-        if not w3.is_connected():
-            print("Chain registration skipped: not connected to Base")
+        registrar = Registrar(private_key)
+        tx_hash, _ = registrar.submit(domain, status, hash_hex, cite_as)
+        receipt = registrar.receipt(tx_hash)
+        if receipt is None:
+            print(f"Chain registration pending: {tx_hash} not mined yet")
             return None
-        account = w3.eth.account.from_key(private_key)
-        contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=ABI)
-        hash_bytes = bytes.fromhex(hash_hex.replace("0x", ""))
-        tx = contract.functions.registerArtifact(domain, status, hash_bytes, cite_as).build_transaction({
-            "from": account.address,
-            "nonce": w3.eth.get_transaction_count(account.address),
-            "gas": 200000,
-            "gasPrice": w3.eth.gas_price,
-        })
-        signed = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
         return {
-            "tx": tx_hash.hex(),
-            "block": receipt.blockNumber,
-            "contract": CONTRACT_ADDRESS,
-            "basescan": f"https://basescan.org/tx/{tx_hash.hex()}"
+            "tx": tx_hash,
+            "block": receipt["block"],
+            "contract": registrar.contract_address,
+            "basescan": f"{EXPLORER_TX}{tx_hash}"
         }
     except Exception as e:
         print(f"Chain registration error: {e}")
         return None
 
-def verify_on_chain(hash_hex):
+def _verify_call(contract, hash_hex):
+    hash_bytes = bytes.fromhex(hash_hex.replace("0x", ""))
+    exists, domain, status, timestamp = contract.functions.verify(hash_bytes).call()
+    return {"exists": exists, "domain": domain, "status": status, "timestamp": timestamp}
+
+def verify_on_chain(hash_hex, use_cache=True):
+    """registry.verify(hash), answered from verify_cache when possible."""
+    if use_cache:
+        hit = verify_cache.lookup(hash_hex)
+        if hit is not None:
+            return hit
     try:
-        w3 = Web3(Web3.HTTPProvider(BASE_RPC))
-        contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=ABI)
-        hash_bytes = bytes.fromhex(hash_hex.replace("0x", ""))
-        exists, domain, status, timestamp = contract.functions.verify(hash_bytes).call()
-        return {"exists": exists, "domain": domain, "status": status, "timestamp": timestamp}
+        result = _verify_call(get_client().contract, hash_hex)
+    except Exception as e:
+        return {"exists": False, "error": str(e)}
+    verify_cache.store(hash_hex, result)
+    return result
+
+def verify_many(hashes):
+    """{hash: verify result}; only hashes without a fresh cache entry hit the chain."""
+    results = verify_cache.lookup_many(hashes)
+    missing = [h for h in dict.fromkeys(hashes) if h not in results]
+    if missing:
+        contract, fetched = get_client().contract, []
+        for h in missing:
+            try:
+                results[h] = _verify_call(contract, h)
+                fetched.append((h, results[h]))
+            except Exception as e:
+                results[h] = {"exists": False, "error": str(e)}
+        verify_cache.store_many(fetched)
+    return results
+
+def sync_verify_cache(from_block, to_block="latest"):
+    """Populate verify_cache from ArtifactFrozen logs; returns the number of events."""
+    return verify_cache.ingest_logs(get_client().contract, from_block, to_block)
+
+def verify_inclusion_on_chain(hash_hex, proof, root_hex):
+    """Check a Merkle-anchored canon against the registry (see merkle.py for offline checks)."""
+    try:
+        contract = get_client().contract
+        to_bytes = lambda h: bytes.fromhex(h.replace("0x", ""))
+        anchored, timestamp = contract.functions.verifyInclusion(
+            to_bytes(hash_hex), [to_bytes(p) for p in proof], to_bytes(root_hex)
+        ).call()
+        return {"exists": anchored, "root": root_hex, "timestamp": timestamp}
     except Exception as e:
         return {"exists": False, "error": str(e)}
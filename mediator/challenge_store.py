@@ -5,9 +5,39 @@ Valid grounds: new evidence, scope misapplication, oracle error.
 Invalid grounds: positional arguments, re-litigation of same evidence.
 """
 
-import sqlite3, json, time, os, re
+import json, time, os, re
+from storage import get_database, decode_cursor, page
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "challenges.db")
+DB_PATH = os.environ.get("CHALLENGES_DB") or os.path.join(os.path.dirname(__file__), "challenges.db")
+
+_SQL_PUT = """
+    INSERT OR REPLACE INTO challenges
+    (id, created, challenger_id, canon_hash, canon_domain,
+     grounds, new_evidence, scope_argument, challenger_claims,
+     status, validity, validity_reason,
+     result_canon_hash, result_canon_status, outcome)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+_SQL_GET = "SELECT * FROM challenges WHERE id=?"
+_SQL_LIST_ALL = "SELECT * FROM challenges ORDER BY created DESC, id DESC"
+_SQL_PAGE = {
+    # (filtered by canon_hash, after a cursor) -> SQL
+    (False, False): "SELECT * FROM challenges ORDER BY created DESC, id DESC LIMIT ?",
+    (False, True):  """SELECT * FROM challenges WHERE (created, id) < (?, ?)
+                       ORDER BY created DESC, id DESC LIMIT ?""",
+    (True, False):  """SELECT * FROM challenges WHERE canon_hash = ?
+                       ORDER BY created DESC, id DESC LIMIT ?""",
+    (True, True):   """SELECT * FROM challenges WHERE canon_hash = ? AND (created, id) < (?, ?)
+                       ORDER BY created DESC, id DESC LIMIT ?""",
+}
+_SQL_SUMMARY = """
+    SELECT COUNT(*)                                     AS total,
+           COALESCE(SUM(outcome = 'UPHELD'), 0)         AS upheld,
+           COALESCE(SUM(outcome = 'FAILED'), 0)         AS failed,
+           COALESCE(SUM(outcome = 'BLOCKED'), 0)        AS blocked
+    FROM challenges
+"""
+_SQL_SUMMARY_CANON = _SQL_SUMMARY + " WHERE canon_hash = ?"
 
 # Words that signal positional argument (invalid grounds)
 POSITIONAL_SIGNALS = [
@@ -19,13 +49,11 @@ POSITIONAL_SIGNALS = [
     "my intention was", "i never meant"
 ]
 
-def _conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def _db():
+    return get_database(DB_PATH)
 
 def init_db():
-    with _conn() as conn:
+    with _db().transaction() as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS challenges (
                 id                  TEXT PRIMARY KEY,
@@ -45,7 +73,14 @@ def init_db():
                 outcome             TEXT DEFAULT NULL
             )
         """)
-        conn.commit()
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_challenges_created
+            ON challenges (created, id)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_challenges_canon_created
+            ON challenges (canon_hash, created, id)
+        """)
 
 def validate_grounds(grounds, challenger_claims):
     """
@@ -66,15 +101,8 @@ def validate_grounds(grounds, challenger_claims):
     return True, "Grounds accepted for CMP."
 
 def put(challenge_id, challenge):
-    with _conn() as conn:
-        conn.execute("""
-            INSERT OR REPLACE INTO challenges
-            (id, created, challenger_id, canon_hash, canon_domain,
-             grounds, new_evidence, scope_argument, challenger_claims,
-             status, validity, validity_reason,
-             result_canon_hash, result_canon_status, outcome)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """, (
+    with _db().transaction() as conn:
+        conn.execute(_SQL_PUT, (
             challenge_id,
             challenge.get("created", time.time()),
             challenge.get("challenger_id", ""),
@@ -91,22 +119,35 @@ def put(challenge_id, challenge):
             challenge.get("result_canon_status"),
             challenge.get("outcome")
         ))
-        conn.commit()
 
 def get(challenge_id):
-    with _conn() as conn:
-        row = conn.execute(
-            "SELECT * FROM challenges WHERE id=?", (challenge_id,)
-        ).fetchone()
+    row = _db().query_one(_SQL_GET, (challenge_id,))
     return _row_to_dict(row) if row else None
 
 def list_all():
-    with _conn() as conn:
-        rows = conn.execute(
-            "SELECT * FROM challenges ORDER BY created DESC"
-        ).fetchall()
+    rows = _db().query_all(_SQL_LIST_ALL)
     return [_row_to_dict(r) for r in rows]
 
+def list_page(limit=50, cursor=None, canon_hash=None):
+    """
+    One page of challenges, newest first, optionally for one canon.
+    Returns (challenges, next_cursor); next_cursor is None on the last page.
+    """
+    params = [canon_hash] if canon_hash else []
+    if cursor:
+        params.extend(decode_cursor(cursor))
+    params.append(limit + 1)
+    rows = _db().query_all(_SQL_PAGE[(bool(canon_hash), bool(cursor))], params)
+    return page(rows, limit, _row_to_dict)
+
+def summary(canon_hash=None):
+    """Outcome counts, aggregated in SQL."""
+    if canon_hash:
+        row = _db().query_one(_SQL_SUMMARY_CANON, (canon_hash,))
+    else:
+        row = _db().query_one(_SQL_SUMMARY)
+    return dict(row)
+
 def _row_to_dict(row):
     d = dict(row)
     d["challenger_claims"] = json.loads(d.get("challenger_claims") or "[]")
@@ -10,12 +10,14 @@ Called automatically in mediate() and exposed as GET /recall endpoint.
 DOI: 10.5281/zenodo.18765787
 """
 
-import os, re, json
-from collections import defaultdict
+import os, re, json, math, heapq, threading, time, hashlib, tempfile
+from collections import defaultdict, Counter
 from pathlib import Path
+import canon_index_bin as _bin
 
 CANON_DIR = "/root/ttcd-pub/canon"
-INDEX_PATH = "/root/ttcd-pub/mediator/canon_index.json"
+INDEX_PATH = "/root/ttcd-pub/mediator/canon_index.json"      # JSON export
+INDEX_BIN_PATH = "/root/ttcd-pub/mediator/canon_index.bin"   # mmap'd by recall
 
 # Stop words — too common to be meaningful index terms
 STOP_WORDS = {
@@ -43,15 +45,22 @@ DOMAIN_TERMS = {
     "propagation", "stare", "decisis", "naming", "protocol", "ontology"
 }
 
+# BM25 parameters and the per-term bonus for claim terms found in a canon's
+# declarations (invariants + scope + fiduciary moment)
+BM25_K1 = 1.2
+BM25_B = 0.75
+CLAIM_BOOST = 2.0
+
 def extract_terms(text: str) -> list:
     """Extract meaningful terms from text, lowercased, de-stopped."""
     words = re.findall(r"[a-z][a-z\-']*[a-z]", text.lower())
     return [w for w in words if w not in STOP_WORDS and len(w) > 3]
 
-def parse_canon_for_index(path: str) -> dict:
+def parse_canon_for_index(path: str, text: str = None) -> dict:
     """Extract indexable content from a canon markdown file."""
-    with open(path) as f:
-        text = f.read()
+    if text is None:
+        with open(path) as f:
+            text = f.read()
 
     filename = Path(path).stem  # e.g. FTJ_v1.0
 
@@ -121,85 +130,461 @@ def parse_canon_for_index(path: str) -> dict:
         "tf": dict(tf),
     }
 
-def build_index(force: bool = False) -> list:
-    """Build or load the citation index."""
-    if not force and os.path.exists(INDEX_PATH):
-        with open(INDEX_PATH) as f:
-            return json.load(f)
-
-    files = sorted([
-        f for f in os.listdir(CANON_DIR)
+def _canon_files(canon_dir: str) -> list:
+    return sorted([
+        f for f in os.listdir(canon_dir)
         if f.endswith(".md") and not f.startswith("Validation")
     ])
 
-    index = []
-    for fname in files:
-        entry = parse_canon_for_index(os.path.join(CANON_DIR, fname))
-        index.append(entry)
+def _index_entry(path: str, data: bytes = None, st: os.stat_result = None) -> dict:
+    """Parse one canon file and record the content hash / stat it was parsed from."""
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    st = st or os.stat(path)
+    entry = parse_canon_for_index(path, data.decode("utf-8"))
+    entry["source"] = {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+    }
+    return entry
+
+def _write_json_index(index: list, index_path: str):
+    """Write the JSON index atomically: temp file in the same directory, then rename."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)),
+                               prefix=".canon_index.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, index_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def _bm25_stats(entries: list):
+    """Per-doc BM25 length normalisation and per-term idf over the weighted tf."""
+    n = len(entries)
+    lengths = [sum(e["tf"].values()) for e in entries]
+    avgdl = (sum(lengths) / n) if n else 0.0
+    df = defaultdict(int)
+    for e in entries:
+        for term in e["tf"]:
+            df[term] += 1
+    norms = [BM25_K1 * (1 - BM25_B + BM25_B * l / avgdl) if avgdl else BM25_K1 for l in lengths]
+    idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+    return norms, idf
+
+def _declaration_terms(entry: dict) -> set:
+    return set(extract_terms(" ".join(entry["invariants"] + [entry["scope"], entry["fiduciary"]])))
+
+def _read_entries(index_path: str) -> list:
+    if index_path.endswith(".json"):
+        with open(index_path) as f:
+            return json.load(f)
+    return _bin.MappedIndex(index_path).entries()
+
+def _write_entries(index: list, index_path: str):
+    """Write entries as JSON or as the binary format, by file extension."""
+    if index_path.endswith(".json"):
+        return _write_json_index(index, index_path)
+    norms, idf = _bm25_stats(index)
+    max_impact = defaultdict(float)
+    for e, norm in zip(index, norms):
+        for term, w in e["tf"].items():
+            impact = idf[term] * w * (BM25_K1 + 1) / (w + norm)
+            if impact > max_impact[term]:
+                max_impact[term] = impact
+    _bin.write_index(
+        index_path,
+        docs=[{k: v for k, v in e.items() if k != "tf"} for e in index],
+        doc_tf=[e["tf"] for e in index],
+        decl_terms=[_declaration_terms(e) for e in index],
+        doc_norm=norms, idf=idf, max_impact=max_impact,
+    )
+
+def _legacy_json(index_path: str):
+    return not index_path.endswith(".json") and os.path.exists(INDEX_PATH)
+
+def _index_available(index_path: str) -> bool:
+    return os.path.exists(index_path) or _legacy_json(index_path)
+
+def _existing_entries(index_path: str):
+    """Entries from index_path, falling back to the legacy JSON index; None if neither exists."""
+    if os.path.exists(index_path):
+        return _read_entries(index_path)
+    if _legacy_json(index_path):
+        return _read_entries(INDEX_PATH)
+    return None
+
+def build_index(force: bool = False, canon_dir: str = None, index_path: str = None) -> list:
+    """Build or load the citation index (binary by default, JSON for a .json path)."""
+    canon_dir = canon_dir or CANON_DIR
+    index_path = index_path or INDEX_BIN_PATH
+    if not force:
+        existing = _existing_entries(index_path)
+        if existing is not None:
+            if not os.path.exists(index_path):
+                _write_entries(existing, index_path)
+            return existing
+
+    index = [_index_entry(os.path.join(canon_dir, fname)) for fname in _canon_files(canon_dir)]
+    _write_entries(index, index_path)
+    return index
 
-    with open(INDEX_PATH, "w") as f:
-        json.dump(index, f, indent=2)
+def export_json(json_path: str = None, index_path: str = None) -> int:
+    """Export the binary index as canon_index.json-shaped JSON. Returns canon count."""
+    index = _read_entries(index_path or INDEX_BIN_PATH)
+    _write_json_index(index, json_path or INDEX_PATH)
+    return len(index)
 
-    return index
+def update_index(canon_dir: str = None, index_path: str = None, paths: list = None) -> dict:
+    """
+    Incrementally bring the citation index in line with the canon directory.
 
-def score_recall(entry: dict, query_terms: list, query_claims: list) -> float:
-    """Score a canon entry against query terms and claims."""
-    tf = entry["tf"]
-    score = 0.0
+    Files whose mtime and size match the recorded source are kept as-is;
+    otherwise the content hash decides whether the file is re-parsed.
+    New files are added and files no longer present are dropped. The index
+    is rewritten atomically, and only if something changed.
 
-    # Term overlap with query
-    for term in query_terms:
-        if term in tf:
-            score += tf[term] * 0.1
+    paths: restrict the check to these canon files (e.g. one newly frozen
+           canon); other entries are kept without being stat()ed.
 
-    # Direct claim string overlap (high weight)
-    canon_text = " ".join(entry["invariants"] + [entry["scope"], entry["fiduciary"]]).lower()
-    for claim in query_claims:
-        claim_terms = extract_terms(claim)
-        for ct in claim_terms:
-            if ct in canon_text:
-                score += 2.0
+    Returns {"index", "added", "updated", "removed", "unchanged", "written"}.
+    """
+    canon_dir = canon_dir or CANON_DIR
+    index_path = index_path or INDEX_BIN_PATH
+    existing = _existing_entries(index_path) or []
+
+    checked = None if paths is None else {os.path.basename(p) for p in paths}
+    if checked is None:
+        names = _canon_files(canon_dir)
+    else:
+        names = sorted(checked | {e["file"] + ".md" for e in existing})
+    by_file = {e["file"]: e for e in existing}
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    dirty = False
 
-    return round(score, 2)
+    index = []
+    for fname in names:
+        path = os.path.join(canon_dir, fname)
+        prev = by_file.pop(Path(fname).stem, None)
+        if checked is not None and fname not in checked:
+            index.append(prev)
+            stats["unchanged"] += 1
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if prev is not None:
+                stats["removed"] += 1
+                dirty = True
+            continue
+        src = (prev or {}).get("source")
+        if src and src["mtime_ns"] == st.st_mtime_ns and src["size"] == st.st_size:
+            index.append(prev)
+            stats["unchanged"] += 1
+            continue
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if src and src["sha256"] == hashlib.sha256(data).hexdigest():
+            src["mtime_ns"], src["size"] = st.st_mtime_ns, st.st_size
+            index.append(prev)
+            stats["unchanged"] += 1
+        else:
+            index.append(_index_entry(path, data, st))
+            stats["updated" if prev is not None else "added"] += 1
+        dirty = True
+
+    # Entries whose file is no longer listed were deleted
+    if by_file:
+        stats["removed"] += len(by_file)
+        dirty = True
+
+    if dirty or not os.path.exists(index_path):
+        _write_entries(index, index_path)
+    stats["index"] = index
+    stats["written"] = dirty
+    return stats
+
+class _CanonSearch:
+    """
+    Top-n search shared by the in-memory and memory-mapped indexes.
+    Subclasses provide _term_postings(term) -> (upper bound, [(doc_id, impact)])
+    or None, _decl_docs(term) -> [doc_id] or None, and doc(doc_id) -> entry.
+    """
 
-def recall(domain: str, claims: list = None, top_n: int = 3) -> dict:
+    def search(self, query_terms: list, claim_terms: Counter, top_n: int = 3) -> list:
+        """
+        Top-n (doc_id, score) by BM25 over query_terms plus CLAIM_BOOST for every
+        claim-term occurrence present in a canon's declarations.
+
+        Term-at-a-time with MaxScore-style pruning: scorers run in decreasing
+        upper-bound order, and once the remaining upper bounds cannot lift an
+        unseen canon past the current n-th best score, only canons already
+        accumulated are updated.
+        """
+        scorers = []
+        for term in query_terms:
+            hit = self._term_postings(term)
+            if hit:
+                scorers.append((hit[0], hit[1], 1.0))
+        for term, count in claim_terms.items():
+            docs = self._decl_docs(term)
+            if docs:
+                boost = CLAIM_BOOST * count
+                scorers.append((boost, [(d, 1.0) for d in docs], boost))
+        if not scorers or top_n <= 0:
+            return []
+        scorers.sort(key=lambda s: s[0], reverse=True)
+
+        acc = {}
+        remaining = sum(s[0] for s in scorers)
+        for bound, postings, mult in scorers:
+            remaining -= bound
+            admit_new = True
+            if len(acc) >= top_n:
+                threshold = heapq.nlargest(top_n, acc.values())[-1]
+                admit_new = bound + remaining > threshold
+            for doc_id, impact in postings:
+                if doc_id in acc:
+                    acc[doc_id] += impact * mult
+                elif admit_new:
+                    acc[doc_id] = impact * mult
+
+        return heapq.nlargest(top_n, ((d, sc) for d, sc in acc.items() if sc > 0),
+                              key=lambda x: x[1])
+
+class InvertedIndex(_CanonSearch):
+    """
+    In-memory inverted index over citation index entries.
+
+    postings:      term -> [(doc_id, BM25 impact)], impacts precomputed from the
+                   DOMAIN_TERMS-weighted tf so queries only sum them
+    decl_postings: term -> [doc_id] for terms in a canon's declarations,
+                   used for the claim-overlap bonus
+    max_impact:    term -> best impact in its postings (upper bound for
+                   early termination in search())
+    """
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        norms, idf = _bm25_stats(entries)
+
+        self.postings = defaultdict(list)
+        self.decl_postings = defaultdict(list)
+        for doc_id, e in enumerate(entries):
+            norm = norms[doc_id]
+            for term, w in e["tf"].items():
+                self.postings[term].append((doc_id, idf[term] * w * (BM25_K1 + 1) / (w + norm)))
+            for term in _declaration_terms(e):
+                self.decl_postings[term].append(doc_id)
+
+        self.postings = dict(self.postings)
+        self.decl_postings = dict(self.decl_postings)
+        self.max_impact = {t: max(imp for _, imp in pl) for t, pl in self.postings.items()}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _term_postings(self, term):
+        if term in self.postings:
+            return self.max_impact[term], self.postings[term]
+        return None
+
+    def _decl_docs(self, term):
+        return self.decl_postings.get(term)
+
+    def doc(self, doc_id: int) -> dict:
+        return self.entries[doc_id]
+
+class MappedCanonIndex(_CanonSearch):
+    """Search over a memory-mapped canon_index.bin (see canon_index_bin)."""
+
+    def __init__(self, path: str):
+        self._m = _bin.MappedIndex(path)
+
+    def __len__(self):
+        return len(self._m)
+
+    def _term_postings(self, term):
+        tid = self._m.term_id(term)
+        if tid < 0:
+            return None
+        postings = self._m.postings(tid, BM25_K1)
+        return (self._m.max_impact(tid), postings) if postings else None
+
+    def _decl_docs(self, term):
+        tid = self._m.term_id(term)
+        return self._m.decl_docs(tid) if tid >= 0 else None
+
+    def doc(self, doc_id: int) -> dict:
+        return self._m.doc(doc_id)
+
+def open_index(index_path: str):
+    """Searchable index for a file: mapped for the binary format, in-memory for JSON."""
+    if index_path.endswith(".json"):
+        return InvertedIndex(_read_entries(index_path))
+    return MappedCanonIndex(index_path)
+
+def _mtime_ns(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _canon_state(canon_dir: str):
+    """(file, mtime_ns, size) per canon file: changes when one is added, removed or edited."""
+    try:
+        names = _canon_files(canon_dir)
+    except FileNotFoundError:
+        return None
+    state = []
+    for fname in names:
+        try:
+            st = os.stat(os.path.join(canon_dir, fname))
+        except FileNotFoundError:
+            continue
+        state.append((fname, st.st_mtime_ns, st.st_size))
+    return tuple(state)
+
+class RecallService:
     """
-    Surface existing canons relevant to a new mediation.
-    Returns matches ranked by relevance score.
+    Long-lived citation recall. Opens the index once (memory-mapped for the
+    binary format); per-request recall() only scores.
 
-    domain: the domain being submitted for mediation
-    claims: list of claim strings from agent positions
-    top_n: max number of matches to return
+    Hot reload: at most every check_interval seconds the service stats the
+    index file and every canon file. A canon added, removed or edited in
+    place (its mtime or size changed) triggers an incremental update_index();
+    a rewritten index file is simply re-loaded.
     """
-    index = build_index()
+
+    def __init__(self, canon_dir: str = None, index_path: str = None,
+                 check_interval: float = 2.0):
+        self.canon_dir = canon_dir or CANON_DIR
+        self.index_path = index_path or INDEX_BIN_PATH
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_mtime = None
+        self._canon_state = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.rebuilds = 0
+
+    def _load(self, rebuild: bool):
+        canon_state = _canon_state(self.canon_dir)
+        if rebuild:
+            update_index(canon_dir=self.canon_dir, index_path=self.index_path)
+        elif not os.path.exists(self.index_path):
+            build_index(canon_dir=self.canon_dir, index_path=self.index_path)
+        self._index = open_index(self.index_path)
+        self._index_mtime = _mtime_ns(self.index_path)
+        self._canon_state = canon_state
+        self.reloads += 1
+        self.rebuilds += int(rebuild)
+
+    def index(self):
+        """Current searchable index, reloaded if the index or a canon file changed."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.check_interval:
+            return self._index
+        with self._lock:
+            if self._index is None:
+                self._load(rebuild=not _index_available(self.index_path))
+            elif _canon_state(self.canon_dir) != self._canon_state:
+                self._load(rebuild=True)
+            elif _mtime_ns(self.index_path) != self._index_mtime:
+                self._load(rebuild=False)
+            self._checked_at = now
+            return self._index
+
+    def reload(self, rebuild: bool = False):
+        """Force a reload (or incremental re-index of the canon markdown)."""
+        with self._lock:
+            self._load(rebuild=rebuild)
+            self._checked_at = time.monotonic()
+
+    def add_canons(self, paths: list) -> dict:
+        """Index just these canon files (e.g. one freshly frozen) and swap them in."""
+        with self._lock:
+            result = update_index(canon_dir=self.canon_dir, index_path=self.index_path, paths=paths)
+            self._index = open_index(self.index_path)
+            self._index_mtime = _mtime_ns(self.index_path)
+            self._canon_state = _canon_state(self.canon_dir)
+            self._checked_at = time.monotonic()
+            self.reloads += 1
+        return {k: v for k, v in result.items() if k != "index"}
+
+    def stats(self) -> dict:
+        return {
+            "canons": len(self._index) if self._index is not None else 0,
+            "reloads": self.reloads,
+            "rebuilds": self.rebuilds,
+        }
+
+    def recall(self, domain: str, claims: list = None, top_n: int = 3) -> dict:
+        """
+        Surface existing canons relevant to a new mediation.
+        Returns matches ranked by relevance score.
+
+        domain: the domain being submitted for mediation
+        claims: list of claim strings from agent positions
+        top_n: max number of matches to return
+        """
+        return _recall(self.index(), domain, claims, top_n)
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service() -> RecallService:
+    """Process-wide RecallService over CANON_DIR / INDEX_PATH."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RecallService()
+    return _service
+
+def recall(domain: str, claims: list = None, top_n: int = 3) -> dict:
+    """Recall through the shared RecallService (see RecallService.recall)."""
+    return get_service().recall(domain, claims, top_n)
+
+def _recall(index: _CanonSearch, domain: str, claims: list, top_n: int) -> dict:
     claims = claims or []
 
     query_terms = extract_terms(domain)
+    claim_terms = Counter()
     for claim in claims:
-        query_terms.extend(extract_terms(claim))
+        terms = extract_terms(claim)
+        query_terms.extend(terms)
+        claim_terms.update(terms)
 
     # Dedupe query terms
     query_terms = list(set(query_terms))
 
     scored = []
-    for entry in index:
-        score = score_recall(entry, query_terms, claims)
-        if score > 0:
-            scored.append({
-                "canon": entry["name"],
-                "file": entry["file"],
-                "status": entry["status"],
-                "doi": entry["doi"],
-                "score": score,
-                "scope": entry["scope"],
-                "matched_invariants": [
-                    inv for inv in entry["invariants"]
-                    if any(t in inv.lower() for t in query_terms)
-                ][:2],
-            })
-
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    top = scored[:top_n]
+    for doc_id, score in index.search(query_terms, claim_terms, top_n):
+        entry = index.doc(doc_id)
+        scored.append({
+            "canon": entry["name"],
+            "file": entry["file"],
+            "status": entry["status"],
+            "doi": entry["doi"],
+            "score": round(score, 2),
+            "scope": entry["scope"],
+            "matched_invariants": [
+                inv for inv in entry["invariants"]
+                if any(t in inv.lower() for t in query_terms)
+            ][:2],
+        })
+
+    # search() already returns the ranked top_n
+    top = scored
 
     frozen_hits = [r for r in top if r["status"] in ("FROZEN", "frozen")]
     debt_risk = len(frozen_hits) > 0
@@ -219,10 +604,13 @@ def recall(domain: str, claims: list = None, top_n: int = 3) -> dict:
 if __name__ == "__main__":
     import sys
 
-    # Rebuild index
-    print("Building citation index...")
-    idx = build_index(force=True)
-    print(f"Indexed {len(idx)} canons\n")
+    # Bring the index up to date (re-parses only changed canon files)
+    print("Updating citation index...")
+    upd = update_index()
+    idx = upd["index"]
+    print(f"Indexed {len(idx)} canons "
+          f"(+{upd['added']} ~{upd['updated']} -{upd['removed']} ={upd['unchanged']})")
+    print(f"Exported JSON: {INDEX_PATH}\n" if export_json() else "")
 
     # Test recall
     domain = sys.argv[1] if len(sys.argv) > 1 else "regulatory jurisdiction over agent data flows"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+claim_matrix.py — Optional NumPy claim-support matrix for multi-party mediation.
+
+Coalition and DAO-vote mediations carry hundreds to hundreds of thousands
+of positions. canonizer.count_support() counts claim support with a dict
+loop; with NumPy installed, large mediations instead build
+
+  claims   every distinct claim, interned to a column id in first-seen order
+  matrix   bool[positions, claims]; matrix[i, j] = position i asserts claim j
+  support  int[claims], a column reduction of the matrix
+
+Shared claims (support == n), contested claims (support < n), the overlap
+ratio and majority candidates (n/2 < support < n, confidence support / n)
+are then computed as vectorized operations on `support`. Claims keep
+first-seen order, and each confidence is rounded with Python's round() rather than
+np.round. This makes the overlap and candidates identical to the dict path,
+so the canon hash does not depend on which path ran.
+
+CMP_CLAIM_MATRIX selects the path:
+
+  auto  (default) the matrix when NumPy is importable and there are at
+        least CLAIM_MATRIX_MIN_POSITIONS positions
+  1     the matrix whenever NumPy is importable
+  0     always the dict path
+
+A matrix larger than CLAIM_MATRIX_MAX_CELLS cells (one byte each) is
+not built. The dict path is used instead.
+
+Usage:
+    import claim_matrix
+    m = claim_matrix.build(positions)       # None: use the dict path
+    if m is not None:
+        shared, contested, ratio = m.overlap()
+        majority = m.majority()             # [(claim, confidence), ...]
+
+    python claim_matrix.py [--positions 10,1000,100000] [--claims 20] [--vocab 200]
+"""
+
+import argparse, os, random, sys, time
+from collections import defaultdict
+from itertools import chain, count
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MODE          = os.environ.get("CMP_CLAIM_MATRIX", "auto")
+MIN_POSITIONS = int(os.environ.get("CLAIM_MATRIX_MIN_POSITIONS", 128))
+MAX_CELLS     = int(os.environ.get("CLAIM_MATRIX_MAX_CELLS", 200_000_000))
+
+
+class ClaimMatrix:
+    """Positions × interned-claims boolean matrix with its per-claim support."""
+
+    def __init__(self, claims, matrix):
+        self.claims = claims
+        self.matrix = matrix
+        self.n = matrix.shape[0]
+        self.support = np.count_nonzero(matrix, axis=0)
+
+    def overlap(self):
+        """(shared claims, contested claims, overlap ratio)."""
+        held = self.support == self.n
+        shared = [self.claims[j] for j in np.flatnonzero(held)]
+        contested = [self.claims[j] for j in np.flatnonzero(~held)]
+        return shared, contested, round(len(shared) / max(len(self.claims), 1), 3)
+
+    def majority(self):
+        """[(claim, confidence)] for contested claims held by more than half the positions."""
+        n = self.n
+        idx = np.flatnonzero((self.support * 2 > n) & (self.support < n))
+        confidence = self.support[idx] / n
+        return [(self.claims[j], round(float(c), 3)) for j, c in zip(idx.tolist(), confidence.tolist())]
+
+
+def enabled(positions):
+    """Whether mediating these positions should use the matrix path."""
+    if np is None or MODE == "0":
+        return False
+    return MODE == "1" or len(positions) >= MIN_POSITIONS
+
+
+def build(positions, max_cells=MAX_CELLS):
+    """A ClaimMatrix for positions, or None when NumPy is missing or it would be too large."""
+    if np is None:
+        return None
+    per_position = [p.get("claims", []) for p in positions]
+    flat = list(chain.from_iterable(per_position))
+    ids = defaultdict(count().__next__)   # interns in first-seen order, in one C-level pass
+    cols = np.fromiter(map(ids.__getitem__, flat), dtype=np.intp, count=len(flat))
+    n = len(positions)
+    if n * len(ids) > max_cells:
+        return None
+    rows = np.repeat(np.arange(n, dtype=np.intp), np.fromiter(map(len, per_position), dtype=np.intp, count=n))
+    matrix = np.zeros((n, len(ids)), dtype=bool)
+    matrix[rows, cols] = True   # repeats within a position collapse
+    return ClaimMatrix(list(ids), matrix)
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def _positions(n, claims, vocab, seed=0):
+    """n positions of `claims` claims each; a core every position shares plus a skewed tail."""
+    rng = random.Random(seed)
+    core = [f"shared claim {i}" for i in range(max(claims // 4, 1))]
+    pool = [f"claim {i}" for i in range(vocab)]
+    weights = [1 / (i + 1) for i in range(vocab)]
+    return [{"agent": f"agent-{i}", "claims": core + rng.choices(pool, weights, k=claims - len(core))}
+            for i in range(n)]
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claim-support path benchmark: dict vs NumPy matrix")
+    parser.add_argument("--positions", default="10,1000,100000", help="comma-separated position counts")
+    parser.add_argument("--claims", type=int, default=20, help="claims per position")
+    parser.add_argument("--vocab", type=int, default=200, help="distinct non-shared claims")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (best is reported)")
+    args = parser.parse_args()
+    if np is None:
+        sys.exit("numpy is not installed; only the dict path is available")
+
+    import canonizer
+    import claim_matrix   # the module canonizer uses, not __main__
+
+    def steps(positions, mode):
+        claim_matrix.MODE = mode
+        overlap = canonizer.identify_overlap(positions)
+        return overlap, canonizer.extract_candidates(positions, overlap)
+
+    print(f"{'positions':>10} {'claims':>8} {'dict ms':>10} {'matrix ms':>10} {'speedup':>8}")
+    for n in (int(x) for x in args.positions.split(",")):
+        positions = _positions(n, args.claims, args.vocab)
+        dict_ms, (o1, c1) = _time(lambda: steps(positions, "0"), args.repeat)
+        matrix_ms, (o2, c2) = _time(lambda: steps(positions, "1"), args.repeat)
+        assert (o1["shared_claims"], o1["contested_claims"], o1["overlap_ratio"], c1) == \
+               (o2["shared_claims"], o2["contested_claims"], o2["overlap_ratio"], c2), "paths disagree"
+        print(f"{n:>10} {n * args.claims:>8} {dict_ms:>10.2f} {matrix_ms:>10.2f} {dict_ms / matrix_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
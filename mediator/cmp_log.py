@@ -0,0 +1,103 @@
+"""
+cmp_log.py — Queue-backed structured logging for the CMP pipeline.
+
+mediate() used to print nine or more formatted lines per mediation,
+synchronously, to stdout. Under load that blocks worker threads behind
+the terminal or log pipe. Pipeline code now logs through the "cmp" logger:
+
+  - a record is a short event name plus a dict of fields (extra={"fields": ...})
+  - the logger's only handler is a QueueHandler, so the calling thread just
+    enqueues; a QueueListener thread formats and writes to stderr
+  - one INFO "mediation" record per mediation carries the step counts,
+    status, hash and per-step timings (steps_ms, total_ms); DEBUG adds one
+    record per step
+  - callers check log.isEnabledFor() before building fields, so a disabled
+    level costs nothing
+
+Modes (CMP_LOG env, or configure(mode)):
+
+  text   event key=value ... (CLI default)
+  json   one JSON object per line, for log shippers
+  quiet  WARNING and above only: nothing is emitted on the mediation hot
+         path (api.py default)
+
+CMP_LOG_LEVEL overrides the level for text / json (DEBUG, INFO, ...).
+
+Step timings come from cmp_metrics.StepTimer.
+
+Usage:
+    from cmp_log import log
+    if log.isEnabledFor(logging.INFO):
+        log.info("mediation", extra={"fields": {"domain": d, **timer.fields()}})
+"""
+
+import atexit, json, logging, logging.handlers, os, queue, sys, threading, time
+
+log = logging.getLogger("cmp")
+log.propagate = False
+
+MODE = None
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        doc = {"ts": round(record.created, 3), "level": record.levelname.lower(),
+               "logger": record.name, "event": record.getMessage()}
+        doc.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        ts = time.strftime("%H:%M:%S", time.localtime(record.created))
+        parts = [f"{ts} {record.levelname:<7} {record.getMessage()}"]
+        for k, v in getattr(record, "fields", {}).items():
+            parts.append(f"{k}={json.dumps(v, default=str, ensure_ascii=False) if isinstance(v, (dict, list)) else v}")
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure(mode=None, level=None, stream=None):
+    """(Re)route the cmp logger through a queue to a listener thread; returns the mode."""
+    global MODE, _listener
+    mode = mode or os.environ.get("CMP_LOG", "text")
+    if mode not in ("text", "json", "quiet"):
+        raise ValueError(f"CMP_LOG must be text, json or quiet, not {mode!r}")
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(JsonFormatter() if mode == "json" else TextFormatter())
+        q = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(q, handler)
+        _listener.start()
+        log.handlers = [logging.handlers.QueueHandler(q)]
+        if mode == "quiet":
+            log.setLevel(logging.WARNING)
+        else:
+            log.setLevel(level or os.environ.get("CMP_LOG_LEVEL", "INFO").upper())
+        MODE = mode
+    return mode
+
+
+def flush():
+    """Write out everything queued so far (listener restarts)."""
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+
+
+@atexit.register
+def _stop():
+    if _listener is not None:
+        _listener.stop()
+
+
+configure()
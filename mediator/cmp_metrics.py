@@ -0,0 +1,294 @@
+"""
+cmp_metrics.py — Per-step timing, hooks, Prometheus metrics and slow-mediation profiling.
+
+mediate() runs its steps under a StepTimer. Every step (cache lookup,
+recall, the seven CMP steps, semantic validation, the PROV write) is
+recorded with:
+
+  wall_s        time.perf_counter() delta
+  cpu_s         time.thread_time() delta (this thread only)
+  alloc_blocks  sys.getallocatedblocks() delta: net blocks still allocated
+                after the step. CPython only counts blocks process-wide, so
+                the delta includes whatever other threads allocated; a step
+                is marked isolated only if no other mediation was running in
+                this process from its start to its end. Only isolated samples
+                measure the step itself (mediate_pool workers run one
+                mediation at a time, so theirs always are)
+
+Records go to
+
+  - hooks registered with add_hook(fn); fn(step, wall_s, cpu_s, alloc_blocks)
+    runs in the mediating thread, so it must be cheap and must not raise
+  - process-wide histograms, rendered by render() in the Prometheus text
+    format for GET /metrics:
+        cmp_step_wall_seconds{step}      histogram
+        cmp_step_cpu_seconds{step}       histogram
+        cmp_step_alloc_blocks{step,isolated}  summary (sum / count)
+        cmp_mediation_seconds{cached}    histogram
+        cmp_mediations_total{status,cached}
+
+mediate_pool workers send their samples back with each result and the
+parent replays them, so /metrics covers the process backend too.
+
+Profiling (opt-in): with CMP_PROFILE_SLOW_MS set, a CMP_PROFILE_RATE share of
+mediations (default all) runs under cProfile, and the stats of any that take
+longer than the threshold are written to CMP_PROFILE_DIR as
+<time>-<pid>-<hash>.prof (view with `python -m pstats` or snakeviz). Only
+one profiler can be active per process (Python 3.12+ raises otherwise), so
+a mediation that starts while another is being profiled is not profiled.
+
+Usage:
+    import cmp_metrics
+    cmp_metrics.add_hook(lambda step, wall, cpu, blocks: ...)
+    timer = cmp_metrics.StepTimer()
+    ...; timer.lap("intake")
+    with cmp_metrics.span("validation"): ...
+    timer.finish("FROZEN")
+    print(cmp_metrics.render())
+"""
+
+import bisect, cProfile, os, random, sys, tempfile, threading, time
+from contextlib import contextmanager
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_SLOW_MS = float(os.environ.get("CMP_PROFILE_SLOW_MS", 0))   # 0: profiling off
+PROFILE_RATE    = float(os.environ.get("CMP_PROFILE_RATE", 1.0))
+PROFILE_DIR     = os.environ.get("CMP_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "cmp-profiles")
+
+_lock = threading.Lock()
+_hooks = []
+_local = threading.local()
+_profile_slot = threading.Lock()   # held by the one mediation being profiled
+_active = 0        # StepTimers running in this process
+_transitions = 0   # StepTimer starts + finishes; unchanged across a step => nothing overlapped it
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.series = {}   # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        row = self.series.get(labels)
+        if row is None:
+            row = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self, name, label_names):
+        lines = []
+        for labels, row in sorted(self.series.items()):
+            base = ",".join(f'{k}="{v}"' for k, v in zip(label_names, labels))
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{base}}} {row[-1]:.6f}")
+            lines.append(f"{name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+_step_wall = Histogram()
+_step_cpu = Histogram()
+_step_alloc = {}          # (step, isolated) -> [sum, count]
+_mediation_wall = Histogram()
+_mediations = {}          # (status, cached) -> count
+
+
+# ── Hooks ────────────────────────────────────────────────────────────────────
+
+def add_hook(fn):
+    """Call fn(step, wall_s, cpu_s, alloc_blocks) after every recorded step."""
+    with _lock:
+        _hooks.append(fn)
+    return fn
+
+
+def remove_hook(fn):
+    with _lock:
+        if fn in _hooks:
+            _hooks.remove(fn)
+
+
+def record_step(step, wall_s, cpu_s, alloc_blocks, isolated=True):
+    with _lock:
+        _step_wall.observe((step,), wall_s)
+        _step_cpu.observe((step,), cpu_s)
+        acc = _step_alloc.setdefault((step, "true" if isolated else "false"), [0, 0])
+        acc[0] += alloc_blocks
+        acc[1] += 1
+        hooks = list(_hooks)
+    for fn in hooks:
+        fn(step, wall_s, cpu_s, alloc_blocks)
+
+
+def record_mediation(status, cached, wall_s):
+    key = (status or "ERROR", "true" if cached else "false")
+    with _lock:
+        _mediation_wall.observe((key[1],), wall_s)
+        _mediations[key] = _mediations.get(key, 0) + 1
+
+
+def replay(samples):
+    """Record samples taken in another process (see StepTimer.samples())."""
+    if not samples:
+        return
+    for step, wall_s, cpu_s, alloc_blocks, isolated in samples["steps"]:
+        record_step(step, wall_s, cpu_s, alloc_blocks, isolated)
+    record_mediation(samples["status"], samples["cached"], samples["wall_s"])
+
+
+# ── Timing ───────────────────────────────────────────────────────────────────
+
+class StepTimer:
+    """Per-step wall / CPU / allocation measurements for one mediation."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.ended = None
+        self.steps = {}          # step -> wall ms, for log records
+        self._steps = []         # (step, wall_s, cpu_s, alloc_blocks, isolated)
+        self._result = None
+        self._running = True
+        global _active, _transitions
+        with _lock:
+            _active += 1
+            _transitions += 1
+        self._t0 = self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._blocks = sys.getallocatedblocks()
+        self._alone = _alone()
+        self._profile = None
+        if PROFILE_SLOW_MS and random.random() < PROFILE_RATE and _profile_slot.acquire(blocking=False):
+            try:
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            except ValueError:   # another profiling tool is active
+                self._profile = None
+                _profile_slot.release()
+        _local.timer = self
+
+    def _record(self, step, wall_s, cpu_s, alloc_blocks, alone):
+        isolated = alone is not None and alone == _alone()
+        self.steps[step] = round(wall_s * 1000, 3)
+        self._steps.append((step, wall_s, cpu_s, alloc_blocks, isolated))
+        record_step(step, wall_s, cpu_s, alloc_blocks, isolated)
+
+    def lap(self, step):
+        """Record everything since the previous lap as `step`; returns its wall time in ms."""
+        wall, cpu, blocks = time.perf_counter(), time.thread_time(), sys.getallocatedblocks()
+        self._record(step, wall - self._wall, cpu - self._cpu, blocks - self._blocks, self._alone)
+        self._wall, self._cpu, self._blocks = wall, cpu, blocks
+        self._alone = _alone()
+        return self.steps[step]
+
+    @contextmanager
+    def span(self, step):
+        """Record a block nested inside a lap (it stays included in that lap)."""
+        wall, cpu, blocks, alone = time.perf_counter(), time.thread_time(), sys.getallocatedblocks(), _alone()
+        try:
+            yield
+        finally:
+            self._record(step, time.perf_counter() - wall, time.thread_time() - cpu,
+                         sys.getallocatedblocks() - blocks, alone)
+
+    def total_ms(self):
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def fields(self):
+        return {"steps_ms": dict(self.steps), "total_ms": self.total_ms()}
+
+    def finish(self, status, cached=False, label=""):
+        """Record the whole mediation; returns the saved profile path, if any."""
+        self.ended = time.time()
+        wall_s = time.perf_counter() - self._t0
+        if self._running:
+            global _active, _transitions
+            self._running = False
+            with _lock:
+                _active -= 1
+                _transitions += 1
+        record_mediation(status, cached, wall_s)
+        self._result = {"status": status, "cached": cached, "wall_s": wall_s}
+        if getattr(_local, "timer", None) is self:
+            _local.timer = None
+        _local.last = self
+        if self._profile is None:
+            return None
+        self._profile.disable()
+        _profile_slot.release()
+        if wall_s * 1000 < PROFILE_SLOW_MS:
+            return None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(self.ended)) + f".{int(self.ended * 1000) % 1000:03d}"
+        path = os.path.join(PROFILE_DIR, f"{stamp}-{os.getpid()}-{label[:16] or 'cmp'}.prof")
+        self._profile.dump_stats(path)
+        return path
+
+    def samples(self):
+        """Picklable record of this mediation for replay() in another process."""
+        return dict(self._result or {}, steps=list(self._steps))
+
+
+def _alone():
+    """A token that stays equal while this is the only running mediation; None if it is not."""
+    return _transitions if _active == 1 else None
+
+
+def current():
+    """The StepTimer of the mediation running in this thread, if any."""
+    return getattr(_local, "timer", None)
+
+
+@contextmanager
+def span(step):
+    """StepTimer.span on the current mediation; a no-op outside one."""
+    timer = current()
+    if timer is None:
+        yield
+    else:
+        with timer.span(step):
+            yield
+
+
+def take_last():
+    """Samples of the last mediation finished in this thread (then forgotten)."""
+    timer = getattr(_local, "last", None)
+    _local.last = None
+    return timer.samples() if timer is not None else None
+
+
+# ── Exposition ───────────────────────────────────────────────────────────────
+
+def render(extra=None):
+    """
+    Prometheus text exposition of the CMP metrics. extra maps metric name to
+    (type, help, value) for gauges / counters owned by the caller.
+    """
+    out = []
+    with _lock:
+        out += ["# HELP cmp_step_wall_seconds Wall time per CMP step",
+                "# TYPE cmp_step_wall_seconds histogram"]
+        out += _step_wall.render("cmp_step_wall_seconds", ("step",))
+        out += ["# HELP cmp_step_cpu_seconds CPU time (mediating thread) per CMP step",
+                "# TYPE cmp_step_cpu_seconds histogram"]
+        out += _step_cpu.render("cmp_step_cpu_seconds", ("step",))
+        out += ["# HELP cmp_step_alloc_blocks Net allocated memory blocks per CMP step, process-wide: "
+                "only isolated=\"true\" samples (no concurrent mediation) measure the step alone",
+                "# TYPE cmp_step_alloc_blocks summary"]
+        for (step, isolated), (total, count) in sorted(_step_alloc.items()):
+            out.append(f'cmp_step_alloc_blocks_sum{{step="{step}",isolated="{isolated}"}} {total}')
+            out.append(f'cmp_step_alloc_blocks_count{{step="{step}",isolated="{isolated}"}} {count}')
+        out += ["# HELP cmp_mediation_seconds Wall time per mediation",
+                "# TYPE cmp_mediation_seconds histogram"]
+        out += _mediation_wall.render("cmp_mediation_seconds", ("cached",))
+        out += ["# HELP cmp_mediations_total Mediations by canon status",
+                "# TYPE cmp_mediations_total counter"]
+        for (status, cached), n in sorted(_mediations.items()):
+            out.append(f'cmp_mediations_total{{status="{status}",cached="{cached}"}} {n}')
+    for name, (kind, help_text, value) in (extra or {}).items():
+        out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(out) + "\n"
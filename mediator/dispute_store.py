@@ -1,18 +1,54 @@
 """
 dispute_store.py — SQLite-backed A2A dispute persistence
 Replaces in-memory _disputes dict. Survives restarts.
+Connections are pooled per thread by storage.Database (WAL mode).
+
+Expiry runs off the request path: DisputeReaper (start_reaper) periodically
+deletes expired unresolved disputes and moves resolved ones to
+disputes_archive, in small batches so each write transaction stays short.
+"""
+import json, time, os, threading
+from storage import get_database, decode_cursor, page
+
+DB_PATH = os.environ.get("DISPUTES_DB") or os.path.join(os.path.dirname(__file__), "disputes.db")
+
+_SQL_PUT = """
+    INSERT OR REPLACE INTO disputes
+    (id, created, domain, scope_boundary, fiduciary_moment,
+     evidence_standard, metadata, positions, status, result)
+    VALUES (?,?,?,?,?,?,?,?,?,?)
+"""
+_SQL_GET = "SELECT * FROM disputes WHERE id=?"
+_SQL_GET_ARCHIVED = "SELECT * FROM disputes_archive WHERE id=?"
+_SQL_LIST_OPEN = "SELECT * FROM disputes WHERE status='open' ORDER BY created DESC, id DESC"
+_SQL_PAGE_OPEN = """
+    SELECT * FROM disputes WHERE status='open' AND created >= ?
+    ORDER BY created DESC, id DESC LIMIT ?
+"""
+_SQL_PAGE_OPEN_AFTER = """
+    SELECT * FROM disputes WHERE status='open' AND created >= ? AND (created, id) < (?, ?)
+    ORDER BY created DESC, id DESC LIMIT ?
 """
-import sqlite3, json, time, os
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "disputes.db")
+# Reaper batches: the same ordered subset is selected by both statements of a
+# batch, inside one transaction
+_REAP_RESOLVED = """
+    SELECT id FROM disputes WHERE status = 'resolved' AND created < ?
+    ORDER BY created, id LIMIT ?
+"""
+_REAP_EXPIRED = """
+    SELECT id FROM disputes WHERE status != 'resolved' AND created < ?
+    ORDER BY created, id LIMIT ?
+"""
+_SQL_ARCHIVE = f"INSERT OR REPLACE INTO disputes_archive SELECT *, ? FROM disputes WHERE id IN ({_REAP_RESOLVED})"
+_SQL_DELETE_RESOLVED = f"DELETE FROM disputes WHERE id IN ({_REAP_RESOLVED})"
+_SQL_DELETE_EXPIRED = f"DELETE FROM disputes WHERE id IN ({_REAP_EXPIRED})"
 
-def _conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def _db():
+    return get_database(DB_PATH)
 
 def init_db():
-    with _conn() as conn:
+    with _db().transaction() as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS disputes (
                 id              TEXT PRIMARY KEY,
@@ -27,16 +63,31 @@ def init_db():
                 result          TEXT DEFAULT NULL
             )
         """)
-        conn.commit()
+        # Listing open disputes newest-first walks this index instead of the table
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_disputes_status_created
+            ON disputes (status, created, id)
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_disputes_created ON disputes (created, id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS disputes_archive (
+                id              TEXT PRIMARY KEY,
+                created         REAL NOT NULL,
+                domain          TEXT NOT NULL,
+                scope_boundary  TEXT DEFAULT '',
+                fiduciary_moment TEXT DEFAULT '',
+                evidence_standard TEXT DEFAULT '',
+                metadata        TEXT DEFAULT '{}',
+                positions       TEXT DEFAULT '[]',
+                status          TEXT DEFAULT 'open',
+                result          TEXT DEFAULT NULL,
+                archived        REAL NOT NULL
+            )
+        """)
 
 def put(dispute_id, dispute):
-    with _conn() as conn:
-        conn.execute("""
-            INSERT OR REPLACE INTO disputes
-            (id, created, domain, scope_boundary, fiduciary_moment,
-             evidence_standard, metadata, positions, status, result)
-            VALUES (?,?,?,?,?,?,?,?,?,?)
-        """, (
+    with _db().transaction() as conn:
+        conn.execute(_SQL_PUT, (
             dispute_id,
             dispute.get("created", time.time()),
             dispute.get("domain", ""),
@@ -48,27 +99,108 @@ def put(dispute_id, dispute):
             dispute.get("status", "open"),
             json.dumps(dispute["result"]) if dispute.get("result") else None
         ))
-        conn.commit()
 
 def get(dispute_id):
-    with _conn() as conn:
-        row = conn.execute("SELECT * FROM disputes WHERE id=?", (dispute_id,)).fetchone()
+    """A live dispute, or an archived (resolved) one; None if unknown or expired."""
+    row = _db().query_one(_SQL_GET, (dispute_id,)) or \
+          _db().query_one(_SQL_GET_ARCHIVED, (dispute_id,))
     if not row:
         return None
     return _row_to_dict(row)
 
 def list_open():
-    with _conn() as conn:
-        rows = conn.execute(
-            "SELECT * FROM disputes WHERE status='open' ORDER BY created DESC"
-        ).fetchall()
+    rows = _db().query_all(_SQL_LIST_OPEN)
     return [_row_to_dict(r) for r in rows]
 
-def prune(ttl=3600):
-    cutoff = time.time() - ttl
-    with _conn() as conn:
-        conn.execute("DELETE FROM disputes WHERE created < ?", (cutoff,))
-        conn.commit()
+def list_open_page(limit=50, cursor=None, min_created=0.0):
+    """
+    One page of open disputes, newest first, by keyset pagination.
+    min_created hides disputes that have expired but not been reaped yet.
+    Returns (disputes, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        created, did = decode_cursor(cursor)
+        rows = _db().query_all(_SQL_PAGE_OPEN_AFTER, (min_created, created, did, limit + 1))
+    else:
+        rows = _db().query_all(_SQL_PAGE_OPEN, (min_created, limit + 1))
+    return page(rows, limit, _row_to_dict)
+
+def reap(ttl=3600, batch_size=500):
+    """
+    Remove disputes older than ttl: resolved ones are archived, the rest
+    (open, mediating, error) are deleted. Works in batches of batch_size,
+    one short transaction each. Returns {"archived": n, "expired": n}.
+    """
+    now = time.time()
+    cutoff = now - ttl
+    counts = {"archived": 0, "expired": 0}
+    while True:
+        with _db().transaction() as conn:
+            conn.execute(_SQL_ARCHIVE, (now, cutoff, batch_size))
+            n = conn.execute(_SQL_DELETE_RESOLVED, (cutoff, batch_size)).rowcount
+        counts["archived"] += n
+        if n < batch_size:
+            break
+    while True:
+        with _db().transaction() as conn:
+            n = conn.execute(_SQL_DELETE_EXPIRED, (cutoff, batch_size)).rowcount
+        counts["expired"] += n
+        if n < batch_size:
+            break
+    return counts
+
+class DisputeReaper(threading.Thread):
+    """Daemon thread that runs reap() every interval seconds."""
+
+    def __init__(self, ttl=3600, interval=60.0, batch_size=500):
+        super().__init__(name="dispute-reaper", daemon=True)
+        self.ttl = ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self._halt = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "archived": 0, "expired": 0,
+                       "last_run": None, "last_removed": 0, "last_error": None}
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        try:
+            counts = reap(self.ttl, self.batch_size)
+        except Exception as e:
+            with self._lock:
+                self._stats["last_error"] = str(e)
+            return None
+        with self._lock:
+            s = self._stats
+            s["runs"] += 1
+            s["archived"] += counts["archived"]
+            s["expired"] += counts["expired"]
+            s["last_run"] = time.time()
+            s["last_removed"] = counts["archived"] + counts["expired"]
+            s["last_error"] = None
+        return counts
+
+    def stop(self):
+        self._halt.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, interval=self.interval, batch_size=self.batch_size)
+
+_reaper = None
+_reaper_lock = threading.Lock()
+
+def start_reaper(ttl=3600, interval=60.0, batch_size=500):
+    """Start the process-wide reaper (once); returns it."""
+    global _reaper
+    with _reaper_lock:
+        if _reaper is None:
+            _reaper = DisputeReaper(ttl, interval, batch_size)
+            _reaper.start()
+    return _reaper
 
 def _row_to_dict(row):
     d = dict(row)
@@ -0,0 +1,295 @@
+"""
+event_indexer.py — Local index of the registry's ArtifactFrozen events.
+
+The registry only exposes verify(hash) and totalArtifacts(), so any question
+about registered canons ("all FROZEN canons in a domain this month") meant
+one RPC per hash. The indexer follows ArtifactFrozen logs into SQLite
+(CHAIN_DB) and answers domain / status / time-range queries locally.
+
+Sync is incremental:
+
+  - the checkpoint is the last block fully indexed; each run fetches logs
+    for [checkpoint+1, head] in ranges of at most BATCH_BLOCKS blocks
+  - every committed range records its end block's hash (and the hash of
+    each block that emitted an event) in sync_blocks, for the last
+    REORG_DEPTH blocks
+  - before syncing, the checkpoint block's hash is compared with the
+    chain's; on a mismatch the indexer walks back through sync_blocks to
+    the newest block that still matches, deletes everything indexed after
+    it and re-syncs from there
+  - every indexed event is also recorded in verify_cache, so verify_on_chain
+    answers registered canons without a contract call; reorged events are
+    removed from it again, and on start-up any artifacts indexed before
+    this feed existed are copied over (backfill_verify_cache)
+
+Usage:
+    import event_indexer
+    indexer = event_indexer.start_indexer(interval=30)    # background thread
+    items, cursor = event_indexer.query(domain="...", status="FROZEN", since=ts)
+"""
+
+import os, threading, time
+from storage import get_database, decode_cursor, page
+import verify_cache
+
+DB_PATH = os.environ.get("CHAIN_DB") or os.path.join(os.path.dirname(__file__), "chain.db")
+
+START_BLOCK  = int(os.environ.get("EVENT_START_BLOCK", 0))   # registry deployment block
+BATCH_BLOCKS = int(os.environ.get("EVENT_BATCH_BLOCKS", 2000))
+REORG_DEPTH  = 64
+
+_SQL_INSERT = """
+    INSERT OR REPLACE INTO artifacts
+    (canon_hash, domain, status, timestamp, cite_as, block_number, block_hash, tx_hash, log_index)
+    VALUES (?,?,?,?,?,?,?,?,?)
+"""
+_SQL_BLOCK = "INSERT OR REPLACE INTO sync_blocks (block_number, block_hash) VALUES (?,?)"
+_SQL_BLOCK_GET = "SELECT block_hash FROM sync_blocks WHERE block_number=?"
+_SQL_BLOCKS_RECENT = "SELECT block_number, block_hash FROM sync_blocks ORDER BY block_number DESC LIMIT ?"
+_SQL_BLOCKS_PRUNE = "DELETE FROM sync_blocks WHERE block_number < ?"
+_SQL_CHECKPOINT_GET = "SELECT block_number FROM sync_checkpoint WHERE name='ArtifactFrozen'"
+_SQL_CHECKPOINT_SET = "INSERT OR REPLACE INTO sync_checkpoint (name, block_number) VALUES ('ArtifactFrozen', ?)"
+_SQL_GET = "SELECT * FROM artifacts WHERE canon_hash=?"
+_SQL_SUMMARY = """
+    SELECT status, COUNT(*) AS n, MIN(timestamp) AS first, MAX(timestamp) AS last
+    FROM artifacts GROUP BY status
+"""
+_SQL_VERIFY_ROWS = "SELECT canon_hash, domain, status, timestamp FROM artifacts"
+_SQL_AFTER_BLOCK = "SELECT canon_hash FROM artifacts WHERE block_number > ?"
+_SQL_DOMAINS = """
+    SELECT domain, COUNT(*) AS n FROM artifacts
+    GROUP BY domain ORDER BY n DESC, domain LIMIT ?
+"""
+
+
+def _db():
+    return get_database(DB_PATH)
+
+
+def init_db():
+    with _db().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                canon_hash    TEXT PRIMARY KEY,
+                domain        TEXT NOT NULL,
+                status        TEXT NOT NULL,
+                timestamp     INTEGER NOT NULL,
+                cite_as       TEXT,
+                block_number  INTEGER NOT NULL,
+                block_hash    TEXT NOT NULL,
+                tx_hash       TEXT NOT NULL,
+                log_index     INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_time ON artifacts (timestamp, canon_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_domain ON artifacts (domain, timestamp, canon_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_status ON artifacts (status, timestamp, canon_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_block ON artifacts (block_number)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_blocks (
+                block_number  INTEGER PRIMARY KEY,
+                block_hash    TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_checkpoint (
+                name          TEXT PRIMARY KEY,
+                block_number  INTEGER NOT NULL
+            )
+        """)
+
+
+def _hex(value):
+    if isinstance(value, str):
+        value = value.lower()
+        return value if value.startswith("0x") else "0x" + value
+    return "0x" + bytes(value).hex()
+
+
+def checkpoint():
+    """Last fully indexed block (START_BLOCK - 1 before the first sync)."""
+    row = _db().query_one(_SQL_CHECKPOINT_GET)
+    return row[0] if row else START_BLOCK - 1
+
+
+# ── Queries ──────────────────────────────────────────────────────────────────
+
+def _to_dict(row):
+    d = dict(row)
+    d.pop("created", None)
+    d.pop("id", None)
+    return d
+
+
+def get(canon_hash):
+    row = _db().query_one(_SQL_GET, (_hex(canon_hash),))
+    return _to_dict(row) if row else None
+
+
+def query(domain=None, status=None, since=None, until=None, limit=100, cursor=None):
+    """
+    Registered canons, newest first, filtered by exact domain / status and
+    a [since, until] block-timestamp range. Returns (items, next_cursor).
+    """
+    where, params = [], []
+    for clause, value in (("domain = ?", domain), ("status = ?", status),
+                          ("timestamp >= ?", since), ("timestamp <= ?", until)):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    if cursor:
+        where.append("(timestamp, canon_hash) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    sql = "SELECT *, timestamp AS created, canon_hash AS id FROM artifacts"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY timestamp DESC, canon_hash DESC LIMIT ?"
+    rows = _db().query_all(sql, (*params, limit + 1))
+    return page(rows, limit, _to_dict)
+
+
+def backfill_verify_cache():
+    """Copy every indexed artifact into verify_cache; returns the count."""
+    rows = [tuple(r) for r in _db().query_all(_SQL_VERIFY_ROWS)]
+    verify_cache.store_events(rows)
+    return len(rows)
+
+
+def summary(top_domains=20):
+    by_status = {r["status"]: {"count": r["n"], "first": r["first"], "last": r["last"]}
+                 for r in _db().query_all(_SQL_SUMMARY)}
+    return {
+        "total":      sum(s["count"] for s in by_status.values()),
+        "by_status":  by_status,
+        "top_domains": {r["domain"]: r["n"] for r in _db().query_all(_SQL_DOMAINS, (top_domains,))},
+        "checkpoint": checkpoint(),
+    }
+
+
+# ── Sync ─────────────────────────────────────────────────────────────────────
+
+class ArtifactIndexer(threading.Thread):
+    """Daemon thread that runs sync_once() every interval seconds."""
+
+    def __init__(self, client=None, interval=30.0, batch_blocks=None):
+        super().__init__(name="artifact-indexer", daemon=True)
+        self._client = client
+        self.interval = interval
+        self.batch_blocks = batch_blocks or BATCH_BLOCKS
+        self._halt = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "events": 0, "reorgs": 0, "head": None,
+                       "last_run": None, "last_error": None}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from chain import get_client
+            self._client = get_client()
+        return self._client
+
+    def run(self):
+        try:
+            backfill_verify_cache()
+        except Exception as e:
+            with self._lock:
+                self._stats["last_error"] = str(e)
+        while not self._halt.is_set():
+            try:
+                result = self.sync_once()
+            except Exception as e:
+                with self._lock:
+                    self._stats["last_error"] = str(e)
+                result = None
+            # Catching up: go again immediately instead of waiting a full interval
+            if not (result and result["behind"]):
+                self._halt.wait(self.interval)
+
+    def stop(self):
+        self._halt.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, checkpoint=checkpoint(), interval=self.interval)
+
+    def _block_hash(self, number):
+        try:
+            return _hex(self.client.w3.eth.get_block(number)["hash"])
+        except Exception:
+            return None   # beyond the (reorged) head
+
+    def _check_reorg(self):
+        """Roll back past any reorged blocks; returns the rewind depth (0 if none)."""
+        cp = checkpoint()
+        row = _db().query_one(_SQL_BLOCK_GET, (cp,))
+        if row is None or self._block_hash(cp) == row[0]:
+            return 0
+        ancestor = max(START_BLOCK - 1, cp - REORG_DEPTH)
+        for r in _db().query_all(_SQL_BLOCKS_RECENT, (REORG_DEPTH,)):
+            if r["block_number"] < cp and self._block_hash(r["block_number"]) == r["block_hash"]:
+                ancestor = r["block_number"]
+                break
+        # Forget first, so a crash before the delete cannot leave a positive entry for a reorged canon
+        verify_cache.forget_events([r[0] for r in _db().query_all(_SQL_AFTER_BLOCK, (ancestor,))])
+        with _db().transaction() as conn:
+            conn.execute("DELETE FROM artifacts WHERE block_number > ?", (ancestor,))
+            conn.execute("DELETE FROM sync_blocks WHERE block_number > ?", (ancestor,))
+            conn.execute(_SQL_CHECKPOINT_SET, (ancestor,))
+        return cp - ancestor
+
+    def sync_once(self, max_ranges=50):
+        """Index up to max_ranges block ranges; returns progress counts."""
+        events = self.client.contract.events.ArtifactFrozen
+        head = self.client.w3.eth.block_number
+        rewound = self._check_reorg()
+        cp = checkpoint()
+        n_events = ranges = 0
+        while cp < head and ranges < max_ranges:
+            lo, hi = cp + 1, min(head, cp + self.batch_blocks)
+            logs = events.get_logs(from_block=lo, to_block=hi)
+            hi_hash = self._block_hash(hi)
+            if hi_hash is None:
+                break   # head moved backwards mid-sync; the next run re-checks
+            rows, blocks = [], {hi: hi_hash}
+            for log in logs:
+                a = log["args"]
+                block_hash = _hex(log["blockHash"])
+                blocks[log["blockNumber"]] = block_hash
+                rows.append((_hex(a["hash"]), a["domain"], a["status"], a["timestamp"], a["cite_as"],
+                             log["blockNumber"], block_hash, _hex(log["transactionHash"]), log["logIndex"]))
+            with _db().transaction() as conn:
+                conn.executemany(_SQL_INSERT, rows)
+                conn.executemany(_SQL_BLOCK, blocks.items())
+                conn.execute(_SQL_BLOCKS_PRUNE, (hi - REORG_DEPTH,))
+                conn.execute(_SQL_CHECKPOINT_SET, (hi,))
+            verify_cache.store_events(r[:4] for r in rows)
+            cp = hi
+            n_events += len(logs)
+            ranges += 1
+
+        with self._lock:
+            s = self._stats
+            s["runs"] += 1
+            s["events"] += n_events
+            s["reorgs"] += int(rewound > 0)
+            s["head"] = head
+            s["last_run"] = time.time()
+            s["last_error"] = None
+        return {"events": n_events, "ranges": ranges, "rewound": rewound,
+                "checkpoint": cp, "head": head, "behind": cp < head}
+
+
+_indexer = None
+_indexer_lock = threading.Lock()
+
+def start_indexer(client=None, interval=30.0, batch_blocks=None):
+    """Start the process-wide indexer (once); returns it."""
+    global _indexer
+    with _indexer_lock:
+        if _indexer is None:
+            _indexer = ArtifactIndexer(client, interval, batch_blocks)
+            _indexer.start()
+    return _indexer
+
+# Initialize on import
+init_db()
@@ -0,0 +1,88 @@
+"""
+json_provider.py — Pluggable JSON encoding for every Flask response.
+
+Flask serializes jsonify() calls and dict return values through app.json.
+FastJSONProvider keeps DefaultJSONProvider's behaviour (sorted keys, compact
+output unless debugging, the same default() for dates / UUIDs / dataclasses)
+but encodes with orjson when it is installed, writing the response body as
+bytes with no intermediate str.
+
+Selection (JSON_PROVIDER env):
+  auto    orjson if importable, else the stdlib encoder (default)
+  orjson  require orjson
+  std     always the stdlib encoder
+
+Objects orjson cannot encode (e.g. integers beyond 64 bits) fall back to the
+stdlib encoder for that response only.
+
+Usage:
+    from json_provider import install
+    install(app)
+"""
+
+import json, os
+from flask.json.provider import DefaultJSONProvider, _default as _std_default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson encoding/decoding."""
+
+    def _options(self, indent=False):
+        opts = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opts |= orjson.OPT_SORT_KEYS
+        if indent:
+            opts |= orjson.OPT_INDENT_2
+        return opts
+
+    def _encode(self, obj, indent=False):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(indent))
+        except TypeError:
+            return None   # orjson.JSONEncodeError; caller falls back to the stdlib
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        data = self._encode(obj)
+        return super().dumps(obj) if data is None else data.decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is None and self._app.debug or self.compact is False
+        data = self._encode(obj, indent=indent)
+        if data is None:
+            return super().response(obj)
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
+
+
+def dumps_bytes(obj):
+    """Compact, key-sorted JSON bytes for servers outside Flask (asgi.py)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_std_default,
+                                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=_std_default, sort_keys=True, separators=(",", ":")).encode()
+
+
+def install(app, name=None):
+    """Set app.json per JSON_PROVIDER; returns the provider name in use."""
+    name = name or os.environ.get("JSON_PROVIDER", "auto")
+    if name == "orjson" and orjson is None:
+        raise RuntimeError("JSON_PROVIDER=orjson but orjson is not installed")
+    if name in ("auto", "orjson") and orjson is not None:
+        app.json = FastJSONProvider(app)
+        return "orjson"
+    return "std"
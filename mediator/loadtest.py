@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+loadtest.py — HTTP load harness for comparing the WSGI and ASGI servers.
+
+Opens one keep-alive connection per client thread and sends the same
+request in a loop for a fixed duration, at each concurrency level in turn.
+Reports throughput, latency percentiles and errors (non-2xx or transport
+failures; 402 counts as an error unless --accept 402).
+
+Usage:
+    python api.py                                   # WSGI (Flask), port 8745
+    uvicorn asgi:app --port 8746                    # ASGI
+    python loadtest.py --url http://127.0.0.1:8745 --path /mediate/free \\
+        --body-file request.json --concurrency 1,8,32,128 --duration 10
+"""
+
+import argparse, http.client, threading, time
+from urllib.parse import urlsplit
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def _client(url, method, path, body, headers, accept, deadline, latencies, errors, lock):
+    parts = urlsplit(url)
+    conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    conn = conn_cls(parts.hostname, parts.port, timeout=60)
+    mine, failed = [], 0
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = 200 <= resp.status < 300 or resp.status in accept
+            if resp.getheader("connection", "").lower() == "close":
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+        if ok:
+            mine.append(time.perf_counter() - t0)
+        else:
+            failed += 1
+    conn.close()
+    with lock:
+        latencies.extend(mine)
+        errors[0] += failed
+
+
+def run(url, method, path, body, concurrency, duration, headers=None, accept=()):
+    """One load level; returns throughput and latency stats."""
+    headers = dict(headers or {})
+    if body is not None:
+        headers.setdefault("Content-Type", "application/json")
+    latencies, errors, lock = [], [0], threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=_client, args=(url, method, path, body, headers, accept,
+                                                      deadline, latencies, errors, lock))
+               for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests":    len(latencies),
+        "rps":         round(len(latencies) / elapsed, 1),
+        "p50_ms":      round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms":      round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms":      round(_percentile(latencies, 0.99) * 1000, 2),
+        "errors":      errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load harness (WSGI vs ASGI)")
+    parser.add_argument("--url", default="http://127.0.0.1:8745", help="server base URL")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--method", default=None, help="default: POST with --body-file, else GET")
+    parser.add_argument("--body-file", default=None, help="JSON request body")
+    parser.add_argument("--header", action="append", default=[], help="'Name: value', repeatable")
+    parser.add_argument("--accept", default="", help="comma-separated non-2xx statuses to count as success")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    args = parser.parse_args()
+
+    body = None
+    if args.body_file:
+        with open(args.body_file, "rb") as f:
+            body = f.read()
+    method = args.method or ("POST" if body is not None else "GET")
+    headers = dict(h.split(":", 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+    accept = {int(s) for s in args.accept.split(",") if s}
+
+    print(f"{method} {args.url}{args.path}")
+    print(f"{'clients':>7} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for n in [int(c) for c in args.concurrency.split(",")]:
+        r = run(args.url, method, args.path, body, n, args.duration, headers, accept)
+        print(f"{r['concurrency']:>7} {r['requests']:>9} {r['rps']:>9} {r['p50_ms']:>8} "
+              f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+mediate_batch.py — Batch mediation with per-item results streamed as NDJSON.
+
+Nightly queues hold thousands of disputes; sending them one /mediate/free
+call (or one canonizer.py run) at a time pays the HTTP round trip, process
+start-up and ontology / recall-index load per item. A batch runs in one
+process that has all of that loaded already, so per item only the CMP
+itself remains:
+
+  - items are read lazily (a JSONL file is never loaded whole) and at most
+    `window` of them are in flight at once
+  - they run on the mediate_pool workers when a pool is given, otherwise on
+    a thread pool of BATCH_WORKERS
+  - one record is yielded per item as it completes, tagged with its input
+    index, then a summary record; an item that fails validation or
+    submission gets an error record and the rest of the batch continues:
+
+        {"index": 3, "status": 200, "result": {...}}
+        {"index": 4, "status": 400, "error": "At least two positions required"}
+        {"summary": {"items": 5, "ok": 4, "failed": 1, "elapsed_ms": 812.4}}
+
+Used by POST /mediate/batch (api.py, asgi.py) and
+`canonizer.py mediate --input-jsonl`.
+
+Usage:
+    from mediate_batch import parse_jsonl, run_batch
+    with open("queue.jsonl") as f:
+        for record in run_batch(parse_jsonl(f)):
+            print(json.dumps(record))
+"""
+
+import json, os, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import canonizer
+
+BATCH_MAX     = int(os.environ.get("MEDIATE_BATCH_MAX", 1000))    # items per HTTP request
+BATCH_WORKERS = int(os.environ.get("MEDIATE_BATCH_WORKERS", 4))   # threads without a pool
+ITEM_TIMEOUT  = float(os.environ.get("MEDIATE_TIMEOUT", 30))
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+
+def parse_jsonl(lines):
+    """Decode JSONL lazily; a line that is not JSON yields its ValueError instead."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+def parse_body(body, content_type):
+    """
+    Items from a /mediate/batch request body: NDJSON, a JSON array or
+    {"items": [...]}. Returns (items, None) or (None, (error body, status)).
+    """
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    if mimetype in NDJSON_TYPES:
+        items = list(parse_jsonl(body.decode("utf-8", "replace").splitlines()))
+    else:
+        try:
+            data = json.loads(body or b"null")
+        except ValueError as e:
+            return None, ({"error": f"invalid JSON: {e}"}, 400)
+        items = data.get("items") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return None, ({"error": "expected a JSON array, {\"items\": [...]} or NDJSON"}, 400)
+    if not items:
+        return None, ({"error": "empty batch"}, 400)
+    if len(items) > BATCH_MAX:
+        return None, ({"error": f"batch too large ({len(items)} items, max {BATCH_MAX})"}, 413)
+    return items, None
+
+
+def check_item(item):
+    """None if item can be mediated, else the reason it cannot."""
+    if isinstance(item, ValueError):
+        return f"invalid JSON: {item}"
+    if not isinstance(item, dict):
+        return "item must be a JSON object"
+    positions = item.get("positions")
+    if positions is not None and not isinstance(positions, list):
+        return "positions must be a JSON array"
+    if len(positions or []) < 2:
+        return "At least two positions required"
+    return None
+
+
+def _collect(pending, counts, timeout):
+    """Yield records for finished (or timed-out) futures, waiting for at least one."""
+    done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+    now = time.perf_counter()
+    if timeout:
+        done |= {f for f in pending if now - f.started > timeout}
+    for future in done:
+        index = pending.pop(future)
+        if not future.done():
+            future.cancel()   # a running pool job keeps its slot until it ends
+            counts["failed"] += 1
+            yield {"index": index, "status": 504, "error": f"mediation exceeded {timeout:g}s"}
+            continue
+        try:
+            result = future.result()
+        except Exception as e:
+            counts["failed"] += 1
+            yield {"index": index, "status": getattr(e, "status", 500), "error": str(e)}
+        else:
+            counts["ok"] += 1
+            yield {"index": index, "status": 200, "result": result}
+
+
+def run_batch(items, pool=None, workers=BATCH_WORKERS, window=None, timeout=ITEM_TIMEOUT):
+    """
+    Mediate items in parallel, yielding one record per item in completion
+    order and a summary record last. pool is a mediate_pool.MediatePool;
+    without one, items run on `workers` threads.
+    """
+    executor = None
+    if pool is not None:
+        window = window or pool.workers
+        submit = lambda d: pool.submit(d, block=True)
+    else:
+        executor = ThreadPoolExecutor(workers, thread_name_prefix="mediate-batch")
+        window = window or workers
+        def submit(d):
+            future = executor.submit(canonizer.mediate, d)
+            future.started = time.perf_counter()
+            return future
+
+    t0 = time.perf_counter()
+    counts = {"items": 0, "ok": 0, "failed": 0}
+    pending = {}
+    try:
+        for index, item in enumerate(items):
+            counts["items"] += 1
+            try:
+                reason = check_item(item)
+            except Exception as e:   # one bad item must not end the stream
+                reason = f"invalid item: {e}"
+            if reason:
+                counts["failed"] += 1
+                yield {"index": index, "status": 400, "error": reason}
+                continue
+            while len(pending) >= window:
+                yield from _collect(pending, counts, timeout)
+            try:
+                pending[submit(item)] = index
+            except Exception as e:
+                counts["failed"] += 1
+                yield {"index": index, "status": getattr(e, "status", 500), "error": str(e)}
+        while pending:
+            yield from _collect(pending, counts, timeout)
+    finally:
+        for future in pending:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    yield {"summary": dict(counts, elapsed_ms=round((time.perf_counter() - t0) * 1000, 1))}
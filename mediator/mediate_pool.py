@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+mediate_pool.py — Process-pool backend for canonizer.mediate.
+
+mediate() runs the seven CMP steps, semantic validation and PROV writing in
+the calling thread, so concurrent mediations in one process serialize on the
+GIL. MediatePool runs them in worker processes instead:
+
+  pre-warmed   every worker imports the CMP and loads the ontology graph and
+               the recall index in its initializer; start() spawns all
+               workers up front so the first requests do not pay for it
+  bounded      at most workers + queue_depth jobs are in flight; submit()
+               raises PoolSaturated (HTTP 429) instead of queueing more
+  timeouts     run() waits at most timeout seconds (MediationTimeout, 504).
+               A queued job is cancelled; a running one cannot be
+               interrupted, so it keeps its slot until it finishes
+  recovery     a crashed worker breaks a ProcessPoolExecutor for good; the
+               pool replaces the executor and fails only the affected jobs
+
+Configuration (env):
+  MEDIATE_WORKERS       worker processes (default: CPU count)
+  MEDIATE_QUEUE         jobs allowed to wait beyond the workers (default: 2 x workers)
+  MEDIATE_TIMEOUT       seconds per job (default 30)
+  MEDIATE_START_METHOD  forkserver (default) | spawn | fork
+
+With forkserver or spawn, multiprocessing re-imports the parent's __main__
+script in each worker, so serve api.py through uvicorn / gunicorn rather
+than `python api.py` when the process backend is enabled. fork starts
+fastest but copies the parent's threads' locks.
+
+Usage:
+    from mediate_pool import start_pool
+    pool = start_pool(workers=4)
+    result = pool.run(input_data)
+    result = await pool.run_async(input_data)   # from an event loop (asgi.py)
+    print(pool.stats())
+
+Benchmark (in-process vs pool, per worker count):
+    python mediate_pool.py --workers 1,2,4,8 --jobs 400
+"""
+
+import argparse, asyncio, multiprocessing, os, threading, time
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, TimeoutError as _FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import canonizer
+import cmp_log
+import cmp_metrics
+
+WORKERS      = int(os.environ.get("MEDIATE_WORKERS", os.cpu_count() or 2))
+QUEUE_DEPTH  = int(os.environ.get("MEDIATE_QUEUE", 2 * WORKERS))
+TIMEOUT      = float(os.environ.get("MEDIATE_TIMEOUT", 30))
+START_METHOD = os.environ.get("MEDIATE_START_METHOD", "forkserver")
+
+
+class PoolError(RuntimeError):
+    """Mediation could not run on the pool; status is the HTTP code to report."""
+    status = 503
+
+class PoolSaturated(PoolError):
+    status = 429
+
+class MediationTimeout(PoolError):
+    status = 504
+
+
+# ── Worker side ──────────────────────────────────────────────────────────────
+
+def _warm(log_mode=None):
+    """Worker initializer: load the ontology and the recall index before the first job."""
+    cmp_log.configure(log_mode)
+    try:
+        import semantic_validator
+        semantic_validator.load_ontology()
+    except Exception:
+        pass   # mediate() reports VALIDATOR_UNAVAILABLE per job, as in-process
+    try:
+        import citation_recall
+        citation_recall.get_service().index()
+    except Exception:
+        pass   # recall errors are reported in prior_art, as in-process
+
+
+def _ping():
+    return os.getpid()
+
+
+def _mediate(input_data, output_path=None):
+    result = canonizer.mediate(input_data, output_path)
+    return result, cmp_metrics.take_last()   # the parent replays the step timings
+
+
+# ── Pool ─────────────────────────────────────────────────────────────────────
+
+class MediatePool:
+    """Bounded process pool running canonizer.mediate."""
+
+    def __init__(self, workers=WORKERS, queue_depth=QUEUE_DEPTH, timeout=TIMEOUT,
+                 start_method=START_METHOD):
+        self.workers = workers
+        self.capacity = workers + queue_depth
+        self.timeout = timeout
+        self.start_method = start_method
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            self._ctx.set_forkserver_preload(["mediate_pool"])
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+                       "timed_out": 0, "restarts": 0, "in_flight": 0,
+                       "total_ms": 0.0, "warm_ms": None}
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(self.workers, mp_context=self._ctx,
+                                   initializer=_warm, initargs=(cmp_log.MODE,))
+
+    def start(self):
+        """Spawn and warm every worker now; returns self."""
+        t0 = time.perf_counter()
+        for f in [self._executor.submit(_ping) for _ in range(self.workers)]:
+            f.result()
+        with self._lock:
+            self._stats["warm_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return self
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _restart(self, broken):
+        with self._lock:
+            if self._executor is not broken:
+                return   # another thread already replaced it
+            self._executor = self._new_executor()
+            self._stats["restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, input_data, output_path=None, block=False):
+        """
+        Queue one mediation; a Future of its result. Raises PoolSaturated when
+        full, or with block=True when no slot frees up within the timeout.
+        """
+        acquired = self._slots.acquire(timeout=self.timeout) if block else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise PoolSaturated(f"mediation pool saturated ({self.capacity} jobs in flight); retry later")
+        executor = self._executor
+        try:
+            job = executor.submit(_mediate, input_data, output_path)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._restart(executor)
+            raise PoolError("mediation worker crashed; pool restarted")
+        except Exception:
+            self._slots.release()
+            raise
+        # The caller's future carries the result only; metrics samples stay here
+        future = Future()
+        future.started = time.perf_counter()
+        future.executor = executor
+        future.add_done_callback(lambda f: f.cancelled() and job.cancel())
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["in_flight"] += 1
+        job.add_done_callback(lambda j: self._done(j, future))
+        return future
+
+    def _done(self, job, future):
+        self._slots.release()
+        ok = not job.cancelled() and job.exception() is None
+        with self._lock:
+            s = self._stats
+            s["in_flight"] -= 1
+            if ok:
+                s["completed"] += 1
+                s["total_ms"] += (time.perf_counter() - future.started) * 1000
+            elif not job.cancelled():
+                s["failed"] += 1
+        try:
+            if job.cancelled():
+                future.cancel()
+            elif not ok:
+                future.set_exception(job.exception())
+            else:
+                result, samples = job.result()
+                cmp_metrics.replay(samples)
+                future.set_result(result)
+        except InvalidStateError:
+            pass   # the caller cancelled (timed out) while the job was running
+
+    def run(self, input_data, output_path=None, timeout=None):
+        """mediate(input_data) on a worker; blocks until done or the timeout expires."""
+        future = self.submit(input_data, output_path)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except _FutureTimeout:
+            future.cancel()
+            raise self._timed_out(timeout)
+        except BrokenProcessPool:
+            raise self._broken(future)
+
+    async def run_async(self, input_data, output_path=None, timeout=None):
+        """run() for an event loop: awaits the job without holding a thread."""
+        future = self.submit(input_data, output_path)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            # Cancelling the wrapper (on timeout) cancels the job's future too
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(timeout)
+        except BrokenProcessPool:
+            raise self._broken(future)
+
+    def _timed_out(self, timeout):
+        with self._lock:
+            self._stats["timed_out"] += 1
+        return MediationTimeout(f"mediation exceeded {timeout:g}s")
+
+    def _broken(self, future):
+        self._restart(future.executor)
+        return PoolError("mediation worker crashed; pool restarted")
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        done = s.pop("total_ms")
+        s["avg_ms"] = round(done / s["completed"], 2) if s["completed"] else None
+        return dict(s, workers=self.workers, capacity=self.capacity,
+                    timeout=self.timeout, start_method=self.start_method)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def start_pool(workers=None, queue_depth=None, timeout=None):
+    """Start the process-wide pool (once, pre-warmed); returns it."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MediatePool(
+                workers or WORKERS,
+                QUEUE_DEPTH if queue_depth is None else queue_depth,
+                timeout or TIMEOUT,
+            ).start()
+    return _pool
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def _bench_input(i, positions, claims):
+    shared = [f"shared invariant {k}" for k in range(claims // 2)]
+    return {
+        "type": "A",
+        "domain": f"bench-domain-{i % 50}",
+        "positions": [
+            {"agent": f"agent-{p}",
+             "claims": shared + [f"agent {p} claim {k}" for k in range(claims - len(shared))]}
+            for p in range(positions)
+        ],
+        "metadata": {"bench": i},
+    }
+
+
+def _bench_job(input_data, prov_dir):
+    canonizer._prov.PROV_DIR = prov_dir   # keep benchmark provenance out of the repo
+    return canonizer.mediate(input_data, use_cache=False)["canon"]["hash"]
+
+
+def main():
+    import tempfile
+    parser = argparse.ArgumentParser(description="mediate() throughput: in-process vs process pool")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--positions", type=int, default=8, help="positions per mediation")
+    parser.add_argument("--claims", type=int, default=200, help="claims per position")
+    args = parser.parse_args()
+
+    prov_dir = tempfile.mkdtemp(prefix="ttcd-bench-prov-")
+    cmp_log.configure("quiet")
+    inputs = [_bench_input(i, args.positions, args.claims) for i in range(args.jobs)]
+
+    t0 = time.perf_counter()
+    for d in inputs:
+        _bench_job(d, prov_dir)
+    base = args.jobs / (time.perf_counter() - t0)
+
+    print(f"cpus={os.cpu_count()} jobs={args.jobs} positions={args.positions} claims={args.claims}")
+    print(f"{'backend':10} {'workers':>7} {'jobs/s':>9} {'speedup':>8} {'warm ms':>8}")
+    print(f"{'inline':10} {1:>7} {base:>9.1f} {1.0:>8.2f} {'-':>8}")
+    for n in [int(w) for w in args.workers.split(",")]:
+        pool = MediatePool(n, queue_depth=args.jobs).start()
+        t0 = time.perf_counter()
+        futures = [pool._executor.submit(_bench_job, d, prov_dir) for d in inputs]
+        for f in futures:
+            f.result()
+        rate = args.jobs / (time.perf_counter() - t0)
+        print(f"{'process':10} {n:>7} {rate:>9.1f} {rate / base:>8.2f} {pool.stats()['warm_ms']:>8}")
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+merkle.py — Merkle trees over canon hashes for batched on-chain anchoring.
+
+Matches MediatorCanonizerRegistry.verifyInclusion:
+
+  leaf = sha256(0x00 || canon_hash)
+  node = sha256(0x01 || min(a, b) || max(a, b))
+
+Pairs are sorted before hashing, so a proof is just the list of sibling
+hashes, leaf to root. A node without a sibling (odd level) is carried up
+unchanged rather than duplicated. The 0x00/0x01 prefixes keep a leaf from
+ever being reinterpreted as an inner node.
+
+Everything here is stdlib-only: a proof can be checked offline against the
+root recorded on chain, without an RPC endpoint.
+
+Usage:
+    from merkle import MerkleTree, verify_proof
+    tree = MerkleTree(canon_hashes)
+    root, proof = tree.root_hex, tree.proof_hex(0)
+    assert verify_proof(canon_hashes[0], proof, root)
+
+    python merkle.py verify proof.json     # {"canon_hash", "proof", "root"}
+"""
+
+import hashlib, json
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def _bytes32(hex_str):
+    raw = bytes.fromhex(hex_str.replace("0x", ""))
+    if len(raw) != 32:
+        raise ValueError(f"expected a 32-byte hash, got {len(raw)} bytes")
+    return raw
+
+
+def leaf_hash(canon_hash):
+    return hashlib.sha256(LEAF_PREFIX + _bytes32(canon_hash)).digest()
+
+
+def node_hash(a, b):
+    if b < a:
+        a, b = b, a
+    return hashlib.sha256(NODE_PREFIX + a + b).digest()
+
+
+class MerkleTree:
+    """All levels of a tree over canon hashes (hex), in the order given."""
+
+    def __init__(self, canon_hashes):
+        if not canon_hashes:
+            raise ValueError("cannot build a Merkle tree with no leaves")
+        level = [leaf_hash(h) for h in canon_hashes]
+        self.levels = [level]
+        while len(level) > 1:
+            nxt = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                nxt.append(level[-1])
+            self.levels.append(nxt)
+            level = nxt
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    @property
+    def root_hex(self):
+        return "0x" + self.root.hex()
+
+    def proof(self, index):
+        """Sibling hashes from leaf index up to the root."""
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                path.append(level[sibling])
+            index //= 2
+        return path
+
+    def proof_hex(self, index):
+        return ["0x" + p.hex() for p in self.proof(index)]
+
+
+def compute_root(canon_hash, proof):
+    node = leaf_hash(canon_hash)
+    for sibling in proof:
+        node = node_hash(node, _bytes32(sibling) if isinstance(sibling, str) else sibling)
+    return node
+
+
+def verify_proof(canon_hash, proof, root):
+    """True if proof links canon_hash to root (hex or bytes siblings)."""
+    try:
+        expected = _bytes32(root) if isinstance(root, str) else root
+        return compute_root(canon_hash, proof) == expected
+    except ValueError:
+        return False
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] != "verify":
+        print("usage: python merkle.py verify proof.json")
+        sys.exit(2)
+    with open(sys.argv[2]) as f:
+        doc = json.load(f)
+    ok = verify_proof(doc["canon_hash"], doc["proof"], doc["root"])
+    print(f"{'VALID' if ok else 'INVALID'}: {doc['canon_hash']} under root {doc['root']}")
+    sys.exit(0 if ok else 1)
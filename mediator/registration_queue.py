@@ -0,0 +1,384 @@
+"""
+registration_queue.py — Durable, asynchronous on-chain registration for /mediate.
+
+/mediate used to call chain.register_on_chain inline, which blocks on
+wait_for_transaction_receipt until a Base block confirms. Now the API
+enqueues the canon and returns a registration id at once; a small worker
+pool submits the transaction, waits for the receipt and records the outcome.
+
+Lifecycle (registrations.state):
+
+  pending     queued, or waiting for a retry (next_attempt)
+  submitting  claimed by a worker, transaction being signed and sent
+  submitted   tx_hash known, waiting for a receipt
+  confirmed   mined successfully (block recorded)
+  failed      reverted, or out of attempts
+
+Jobs live in SQLite (storage.Database), so they survive restarts: on start,
+jobs left in 'submitting' go back to 'pending' and 'submitted' jobs are
+re-polled. Nonces come from the registrar's NonceManager, so concurrent
+workers never reuse one. Retries back off exponentially up to MAX_ATTEMPTS.
+
+A canon has at most one live (non-failed) job: a partial unique index on
+canon_hash backs enqueue's INSERT ... ON CONFLICT DO NOTHING, so concurrent
+identical submits share one record. A job resubmitted after a crash or a
+dropped transaction may already be on chain (the earlier tx was mined after
+all), so workers ask registry.verify before sending and treat a revert on
+an already-registered canon as confirmed.
+
+Clients poll GET /chain/registration/<id>, or pass a callback_url that is
+POSTed the final record. Only http(s) URLs whose host resolves to public
+addresses are accepted (checked again at delivery, redirects not followed);
+CALLBACK_ALLOW_PRIVATE=1 lifts the address check for local development.
+
+The chain side is any object with submit / receipt / tx_known, and
+optionally registered (see chain.Registrar); point BASE_RPC /
+REGISTRY_ADDRESS at anvil or hardhat to run the whole path against a local EVM.
+"""
+
+import ipaddress, json, os, socket, threading, time, uuid
+import urllib.request
+from urllib.parse import urlsplit
+from storage import get_database
+
+DB_PATH = os.environ.get("REGISTRATIONS_DB") or os.path.join(os.path.dirname(__file__), "registrations.db")
+
+MAX_ATTEMPTS    = 5
+BACKOFF_BASE    = 2.0     # seconds; doubles per attempt
+BACKOFF_MAX     = 300.0
+RECEIPT_TIMEOUT = 120     # seconds a worker waits per receipt poll
+IDLE_POLL       = 1.0     # seconds between queue polls when idle
+
+CALLBACK_ALLOW_PRIVATE = os.environ.get("CALLBACK_ALLOW_PRIVATE") == "1"
+
+_SQL_INSERT = """
+    INSERT INTO registrations
+    (id, created, updated, canon_hash, domain, canon_status, cite_as,
+     state, attempts, next_attempt, callback_url)
+    VALUES (?,?,?,?,?,?,?,'pending',0,?,?)
+    ON CONFLICT (canon_hash) WHERE state != 'failed' DO NOTHING
+"""
+_SQL_GET = "SELECT * FROM registrations WHERE id=?"
+_SQL_BY_HASH = "SELECT * FROM registrations WHERE canon_hash=? ORDER BY created DESC LIMIT 1"
+_SQL_LIVE_BY_HASH = "SELECT * FROM registrations WHERE canon_hash=? AND state != 'failed'"
+_SQL_DUE = """
+    SELECT id, state FROM registrations
+    WHERE state IN ('pending', 'submitted') AND next_attempt <= ?
+    ORDER BY next_attempt LIMIT ?
+"""
+_SQL_CLAIM = """
+    UPDATE registrations SET state=?, updated=?, next_attempt=?
+    WHERE id=? AND state=? AND next_attempt <= ?
+"""
+_SQL_RECOVER = "UPDATE registrations SET state='pending', updated=? WHERE state='submitting'"
+_SQL_COUNTS = "SELECT state, COUNT(*) AS n FROM registrations GROUP BY state"
+# Tables from before the unique index may hold several live jobs per canon:
+# keep the most advanced (then oldest) one and fail the rest.
+_SQL_FAIL_DUPLICATES = """
+    UPDATE registrations SET state='failed', error='duplicate registration', updated=?
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY canon_hash
+                ORDER BY CASE state WHEN 'confirmed' THEN 0 WHEN 'submitted' THEN 1
+                                    WHEN 'submitting' THEN 2 ELSE 3 END, created
+            ) AS rank
+            FROM registrations WHERE state != 'failed'
+        ) WHERE rank > 1
+    )
+"""
+
+
+def _db():
+    return get_database(DB_PATH)
+
+
+def init_db():
+    with _db().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS registrations (
+                id            TEXT PRIMARY KEY,
+                created       REAL NOT NULL,
+                updated       REAL NOT NULL,
+                canon_hash    TEXT NOT NULL,
+                domain        TEXT NOT NULL,
+                canon_status  TEXT NOT NULL,
+                cite_as       TEXT NOT NULL,
+                state         TEXT NOT NULL,
+                attempts      INTEGER DEFAULT 0,
+                next_attempt  REAL NOT NULL,
+                nonce         INTEGER DEFAULT NULL,
+                tx_hash       TEXT DEFAULT NULL,
+                block         INTEGER DEFAULT NULL,
+                error         TEXT DEFAULT NULL,
+                callback_url  TEXT DEFAULT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_registrations_due
+            ON registrations (state, next_attempt)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_registrations_hash
+            ON registrations (canon_hash, created)
+        """)
+        conn.execute(_SQL_FAIL_DUPLICATES, (time.time(),))
+        conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_registrations_live
+            ON registrations (canon_hash) WHERE state != 'failed'
+        """)
+
+
+def enqueue(canon, citation, callback_url=None):
+    """
+    Queue a canon for registration; returns the registration record. A canon
+    already queued or registered (e.g. a cached result resubmitted to
+    /mediate) gets its existing record rather than a second transaction.
+    """
+    now = time.time()
+    reg_id = str(uuid.uuid4())[:12]
+    with _db().transaction() as conn:
+        inserted = conn.execute(_SQL_INSERT, (
+            reg_id, now, now, canon["hash"], canon["domain"], canon["status"],
+            citation["cite_as"], now, callback_url,
+        )).rowcount
+        if not inserted:
+            return dict(conn.execute(_SQL_LIVE_BY_HASH, (canon["hash"],)).fetchone())
+    return get(reg_id)
+
+
+def get(reg_id):
+    row = _db().query_one(_SQL_GET, (reg_id,))
+    return dict(row) if row else None
+
+
+def get_by_hash(canon_hash):
+    row = _db().query_one(_SQL_BY_HASH, (canon_hash,))
+    return dict(row) if row else None
+
+
+def check_callback_url(url, resolve=True):
+    """
+    None if url may receive registration callbacks, else why not: it must be
+    http(s) and (unless CALLBACK_ALLOW_PRIVATE) every address its host
+    resolves to must be public, so callbacks cannot reach loopback, private,
+    link-local (cloud metadata) or other internal services.
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except (TypeError, ValueError, AttributeError):
+        return "callback_url is not a valid URL"
+    if parts.scheme not in ("http", "https"):
+        return "callback_url must be an http(s) URL"
+    if not parts.hostname:
+        return "callback_url has no host"
+    if CALLBACK_ALLOW_PRIVATE:
+        return None
+    try:
+        addrs = [ipaddress.ip_address(parts.hostname)]
+    except ValueError:
+        if not resolve:
+            return None
+        try:
+            infos = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        except (OSError, UnicodeError):
+            return "callback_url host does not resolve"
+        addrs = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    for addr in addrs:
+        if not _public(addr):
+            return f"callback_url resolves to a non-public address ({addr})"
+    return None
+
+
+def _public(addr):
+    if addr.version == 6 and addr.ipv4_mapped:
+        addr = addr.ipv4_mapped
+    return addr.is_global and not addr.is_multicast
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """A 3xx is reported as an HTTPError rather than followed to an unchecked host."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def counts():
+    return {r["state"]: r["n"] for r in _db().query_all(_SQL_COUNTS)}
+
+
+def _update(reg_id, **fields):
+    fields["updated"] = time.time()
+    cols = ", ".join(f"{k}=?" for k in fields)
+    with _db().transaction() as conn:
+        conn.execute(f"UPDATE registrations SET {cols} WHERE id=?", (*fields.values(), reg_id))
+
+
+def _backoff(attempts):
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+def public_view(reg):
+    """The fields a client sees when polling a registration."""
+    return {
+        "registration_id": reg["id"],
+        "state":           reg["state"],
+        "canon_hash":      reg["canon_hash"],
+        "attempts":        reg["attempts"],
+        "tx":              reg["tx_hash"],
+        "block":           reg["block"],
+        "error":           reg["error"],
+        "poll_url":        f"/chain/registration/{reg['id']}",
+    }
+
+
+class RegistrationQueue:
+    """Worker pool draining the registrations table through a registrar."""
+
+    def __init__(self, registrar, workers=2, explorer_tx=None, contract=None):
+        self.registrar = registrar
+        self.workers = workers
+        self.explorer_tx = explorer_tx
+        self.contract = contract
+        self._halt = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+        self._claim_lock = threading.Lock()
+
+    def start(self):
+        with _db().transaction() as conn:
+            conn.execute(_SQL_RECOVER, (time.time(),))
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"chain-registrar-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=5.0):
+        self._halt.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def enqueue(self, canon, citation, callback_url=None):
+        reg = enqueue(canon, citation, callback_url)
+        self._wake.set()
+        return reg
+
+    # ── Worker loop ─────────────────────────────────────────────────────────
+
+    def _claim(self):
+        """Atomically move one due job to its in-progress state; None if idle."""
+        now = time.time()
+        with self._claim_lock:
+            for row in _db().query_all(_SQL_DUE, (now, 8)):
+                if row["state"] == "pending":
+                    new_state, hold = "submitting", now + BACKOFF_MAX
+                else:
+                    # Re-poll a submitted tx; hold it so no other worker polls it too
+                    new_state, hold = "submitted", now + RECEIPT_TIMEOUT + 30
+                with _db().transaction() as conn:
+                    claimed = conn.execute(_SQL_CLAIM, (
+                        new_state, now, hold, row["id"], row["state"], now,
+                    )).rowcount
+                if claimed:
+                    return get(row["id"])
+        return None
+
+    def _run(self):
+        while not self._halt.is_set():
+            job = self._claim()
+            if job is None:
+                self._wake.wait(IDLE_POLL)
+                self._wake.clear()
+                continue
+            try:
+                self._process(job)
+            except Exception as e:
+                self._retry(job, f"worker error: {e}")
+
+    def _process(self, job):
+        if job["state"] == "submitting":
+            # An earlier attempt (before a crash, or a tx reported dropped)
+            # may have been mined after all; registering again would revert.
+            if self._registered(job):
+                _update(job["id"], state="confirmed", error=None)
+                return self._notify(get(job["id"]))
+            try:
+                tx_hash, nonce = self.registrar.submit(
+                    job["domain"], job["canon_status"], job["canon_hash"], job["cite_as"],
+                )
+            except Exception as e:
+                return self._retry(job, f"submit failed: {e}")
+            _update(job["id"], state="submitted", tx_hash=tx_hash, nonce=nonce,
+                    attempts=job["attempts"] + 1, error=None,
+                    next_attempt=time.time() + RECEIPT_TIMEOUT + 30)
+            job = get(job["id"])
+
+        receipt = self.registrar.receipt(job["tx_hash"], timeout=RECEIPT_TIMEOUT)
+        if receipt is None:
+            if not self.registrar.tx_known(job["tx_hash"]):
+                # Dropped from the mempool: resubmit with a fresh nonce
+                return self._retry(job, "transaction dropped")
+            _update(job["id"], state="submitted", next_attempt=time.time())
+            return
+        if receipt["success"]:
+            _update(job["id"], state="confirmed", block=receipt["block"], error=None)
+        elif self._registered(job):
+            # Reverted because an earlier submission of this canon got there first
+            _update(job["id"], state="confirmed", error=None)
+        else:
+            _update(job["id"], state="failed", block=receipt["block"], error="transaction reverted")
+        self._notify(get(job["id"]))
+
+    def _registered(self, job):
+        """Whether the canon is already on chain; False if unknown."""
+        check = getattr(self.registrar, "registered", None)
+        if check is None:
+            return False
+        try:
+            return bool(check(job["canon_hash"]))
+        except Exception:
+            return False
+
+    def _retry(self, job, error):
+        attempts = job["attempts"] + (0 if job["state"] == "submitted" else 1)
+        if attempts >= MAX_ATTEMPTS:
+            _update(job["id"], state="failed", attempts=attempts, error=error)
+            self._notify(get(job["id"]))
+            return
+        _update(job["id"], state="pending", attempts=attempts, error=error,
+                next_attempt=time.time() + _backoff(max(attempts, 1)))
+
+    def _notify(self, reg):
+        url = reg.get("callback_url")
+        if not url:
+            return
+        # Re-checked at delivery: the host's DNS may have changed since enqueue
+        refused = check_callback_url(url)
+        if refused:
+            _update(reg["id"], error=(reg.get("error") or "") + f" (callback refused: {refused})")
+            return
+        body = json.dumps({"schema": "ChainRegistration/1.0", **self.describe(reg)}).encode()
+        req = urllib.request.Request(url, data=body, method="POST",
+                                     headers={"Content-Type": "application/json"})
+        try:
+            _callback_opener.open(req, timeout=10).close()
+        except Exception as e:
+            _update(reg["id"], error=(reg.get("error") or "") + f" (callback failed: {e})")
+
+    def describe(self, reg):
+        view = public_view(reg)
+        if reg["tx_hash"]:
+            view["contract"] = self.contract
+            if self.explorer_tx:
+                view["basescan"] = f"{self.explorer_tx}{reg['tx_hash']}"
+        return view
+
+
+# Initialize on import
+init_db()
@@ -0,0 +1,178 @@
+"""
+result_cache.py — Content-addressed cache of mediation results.
+
+TTCDAgent retries and replayed A2A disputes resubmit identical inputs, and
+each one reran all seven CMP steps, recall, semantic validation and hashing
+to produce a canon that differs only in its timestamp. mediate() now looks
+the input up first and, on an exact repeat, returns the canon produced the
+first time (same hash, same timestamp, same citation).
+
+The key is the SHA-256 of the normalized input: only the fields the CMP
+reads (type, domain, agent + claims per position, the three declarations,
+metadata), with defaults applied and dict keys sorted, plus the canonizer
+VERSION. Field order and extra fields (e.g. callback_url) therefore do not
+create new entries. Position and claim order do: shared and contested
+claims, and so the invariants and canon hash, follow first-seen order.
+
+Two tiers:
+
+  memory      LRU of RESULT_CACHE_MAX entries per process
+  persistent  SQLite (RESULT_CACHE_DB), shared by api.py, the CLI and the
+              mediate_pool workers; survives restarts
+
+Entries expire after RESULT_CACHE_TTL seconds in both tiers, which also
+bounds how stale prior_art and ontology-dependent validation can get.
+RESULT_CACHE=0 disables the cache.
+
+Usage:
+    import result_cache
+    cache = result_cache.get_cache()
+    key = result_cache.cache_key(input_data)
+    result = cache.get(key)          # None on a miss
+    cache.put(key, result)
+    print(cache.stats())
+"""
+
+import hashlib, json, os, threading, time
+from collections import OrderedDict
+from storage import get_database
+
+DB_PATH = os.environ.get("RESULT_CACHE_DB") or os.path.join(os.path.dirname(__file__), "results.db")
+
+ENABLED     = os.environ.get("RESULT_CACHE", "1") != "0"
+TTL         = float(os.environ.get("RESULT_CACHE_TTL", 86400))
+MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX", 2048))
+PURGE_EVERY = 500   # puts between deletions of expired rows
+KEY_VERSION = 2     # bump when normalize() changes, so older keys stop matching
+
+_SQL_GET = "SELECT body, expires FROM results WHERE key=? AND expires > ?"
+_SQL_PUT = "INSERT OR REPLACE INTO results (key, created, expires, canon_hash, body) VALUES (?,?,?,?,?)"
+_SQL_PURGE = "DELETE FROM results WHERE expires <= ?"
+_SQL_COUNT = "SELECT COUNT(*) FROM results WHERE expires > ?"
+
+
+def _db():
+    return get_database(DB_PATH)
+
+
+def init_db():
+    with _db().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key         TEXT PRIMARY KEY,
+                created     REAL NOT NULL,
+                expires     REAL NOT NULL,
+                canon_hash  TEXT,
+                body        TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_results_expires ON results (expires)")
+
+
+def normalize(input_data):
+    """The parts of a mediation input that determine its result, in canonical form."""
+    from canonizer import VERSION
+    return {
+        "cmp_version":       VERSION,
+        "key_version":       KEY_VERSION,
+        "type":              input_data.get("type", "B"),
+        "domain":            input_data.get("domain", "unspecified"),
+        "positions":         [{"agent": p.get("agent", "unknown"), "claims": list(p.get("claims", []))}
+                              for p in input_data.get("positions", [])],
+        "scope_boundary":    input_data.get("scope_boundary", ""),
+        "fiduciary_moment":  input_data.get("fiduciary_moment", ""),
+        "evidence_standard": input_data.get("evidence_standard", ""),
+        "metadata":          input_data.get("metadata", {}),
+    }
+
+
+def cache_key(input_data):
+    raw = json.dumps(normalize(input_data), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResultCache:
+    """LRU + TTL memory tier over a persistent SQLite tier. Results are stored as JSON."""
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires, body)
+        self._stats = {"hits_memory": 0, "hits_persistent": 0, "misses": 0, "puts": 0, "errors": 0}
+
+    def _remember(self, key, expires, body):
+        with self._lock:
+            self._entries[key] = (expires, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """A fresh copy of the cached result, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return json.loads(entry[1])
+            self._entries.pop(key, None)
+        try:
+            row = _db().query_one(_SQL_GET, (key, now))
+        except Exception:
+            row = None
+            with self._lock:
+                self._stats["errors"] += 1
+        with self._lock:
+            self._stats["hits_persistent" if row else "misses"] += 1
+        if row is None:
+            return None
+        self._remember(key, row["expires"], row["body"])
+        return json.loads(row["body"])
+
+    def put(self, key, result):
+        now = time.time()
+        body = json.dumps(result)
+        self._remember(key, now + self.ttl, body)
+        with self._lock:
+            self._stats["puts"] += 1
+            purge = self._stats["puts"] % PURGE_EVERY == 0
+        try:
+            with _db().transaction() as conn:
+                conn.execute(_SQL_PUT, (key, now, now + self.ttl,
+                                        result.get("canon", {}).get("hash"), body))
+                if purge:
+                    conn.execute(_SQL_PURGE, (now,))
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats, memory_entries=len(self._entries))
+        lookups = s["hits_memory"] + s["hits_persistent"] + s["misses"]
+        s["hit_rate"] = round((s["hits_memory"] + s["hits_persistent"]) / lookups, 4) if lookups else None
+        try:
+            s["persistent_entries"] = _db().query_one(_SQL_COUNT, (time.time(),))[0]
+        except Exception as e:
+            s["persistent_entries"] = {"error": str(e)}
+        return dict(s, ttl=self.ttl, max_entries=self.max_entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide ResultCache; None when RESULT_CACHE=0."""
+    global _cache
+    if not ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+# Initialize on import
+init_db()
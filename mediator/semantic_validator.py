@@ -8,15 +8,64 @@ DOI: 10.5281/zenodo.18748449
 
 from rdflib import Graph, Namespace, RDF, OWL, XSD, Literal, URIRef
 from rdflib.namespace import RDFS
-import re
+import re, time
+from ontology_cache import get_cache
+import cmp_metrics as _metrics
 
 ONTOLOGY_PATH = "/root/ttcd-pub/ontology/doctrine_ontology_v1.0.ttl"
 CMP = Namespace("https://github.com/dalaun/transport-triggered-compliance/ontology/cmp#")
 
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9\-']*")
+
+def _tokens(text: str) -> set:
+    return set(_TOKEN_RE.findall(text.lower()))
+
+class DomainIndex:
+    """
+    Inverted index over cmp:hasDomain literals: domain token -> canons.
+    Built once per ontology version so each invariant lookup is one dict
+    probe per invariant token instead of a scan of every hasDomain triple.
+    """
+
+    def __init__(self, g: Graph):
+        self.domains = set()
+        self.postings = {}   # token -> (first triple ordinal, [canon, ...])
+        for ordinal, (s, p, o) in enumerate(g.triples((None, CMP.hasDomain, None))):
+            domain = str(o).lower()
+            canon = str(s).split("#")[-1]
+            self.domains.add(domain)
+            for tok in _tokens(domain):
+                entry = self.postings.get(tok)
+                if entry is None:
+                    self.postings[tok] = (ordinal, [canon])
+                elif canon not in entry[1]:
+                    entry[1].append(canon)
+
+    def canons_for(self, token: str) -> list:
+        entry = self.postings.get(token)
+        return list(entry[1]) if entry else []
+
+    def related_canon(self, invariant: str):
+        """First canon (in ontology order) whose domain shares a token with the invariant."""
+        best = None
+        for tok in _tokens(invariant):
+            entry = self.postings.get(tok)
+            if entry and (best is None or entry[0] < best[0]):
+                best = entry
+        return best[1][0] if best else None
+
+def _ontology_cache():
+    cache = get_cache(ONTOLOGY_PATH)
+    cache.register_index("domains", DomainIndex)
+    return cache
+
 def load_ontology():
-    g = Graph()
-    g.parse(ONTOLOGY_PATH, format="turtle")
-    return g
+    """Read-only ontology graph, parsed once per process and reloaded on change."""
+    return _ontology_cache().graph()
+
+def ontology_stats() -> dict:
+    """Ontology parse and validation timings for the current process."""
+    return _ontology_cache().stats()
 
 def test_function(name: str) -> bool:
     """Can the function be derived from the name alone?"""
@@ -89,23 +138,18 @@ def validate_jurisdictional_declarations(artifact: dict) -> dict:
         "verdict": "DECLARATIONS_COMPLETE" if passed else "DECLARATIONS_INCOMPLETE"
     }
 
-def validate_invariants_against_ontology(invariants: list, domain: str, g: Graph) -> dict:
+def validate_invariants_against_ontology(invariants: list, domain: str, g: Graph,
+                                        domain_index: DomainIndex = None) -> dict:
     """Check candidate invariants against the loaded ontology."""
     results = []
     # Check each invariant against existing frozen canons in ontology
-    existing_domains = set()
-    for s, p, o in g.triples((None, CMP.hasDomain, None)):
-        existing_domains.add(str(o).lower())
+    if domain_index is None:
+        domain_index = DomainIndex(g)
 
     for inv in invariants:
-        inv_lower = inv.lower()
         # Check for semantic conflict with existing canons
         conflict = False
-        related_canon = None
-        for s, p, o in g.triples((None, CMP.hasDomain, None)):
-            if any(word in inv_lower for word in str(o).lower().split()):
-                related_canon = str(s).split("#")[-1]
-                break
+        related_canon = domain_index.related_canon(inv)
         results.append({
             "invariant": inv,
             "conflict": conflict,
@@ -125,15 +169,24 @@ def validate_artifact(artifact: dict) -> dict:
     artifact = {
         name, domain, invariants, scope_boundary, fiduciary_moment, evidence_standard
     }
+
+    The result is embedded in the canon artifact and hashed, so it carries
+    no timings: the ontology lookup is a cmp_metrics span (/metrics), and
+    parse / validation times are in ontology_stats().
     """
-    g = load_ontology()
+    t0 = time.perf_counter()
+    with _metrics.span("ontology_lookup"):
+        cache = _ontology_cache()
+        snap = cache.snapshot()
+    g = snap.graph
 
     name_result = validate_name(artifact.get("name", ""))
     declaration_result = validate_jurisdictional_declarations(artifact)
     ontology_result = validate_invariants_against_ontology(
         artifact.get("invariants", []),
         artifact.get("domain", ""),
-        g
+        g,
+        cache.index("domains", snap)
     )
 
     all_passed = (
@@ -141,6 +194,8 @@ def validate_artifact(artifact: dict) -> dict:
         declaration_result["passed"] and
         ontology_result["passed"]
     )
+    validation_ms = round((time.perf_counter() - t0) * 1000, 3)
+    cache.record_validation(validation_ms)
 
     return {
         "schema": "SemanticValidator/1.0",
@@ -149,7 +204,7 @@ def validate_artifact(artifact: dict) -> dict:
         "ontology_validation": ontology_result,
         "canon_ready": all_passed,
         "verdict": "FREEZE_APPROVED" if all_passed else "FREEZE_BLOCKED",
-        "ontology_triples": len(g)
+        "ontology_triples": snap.triples
     }
 
 if __name__ == "__main__":
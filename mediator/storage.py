@@ -0,0 +1,152 @@
+"""
+storage.py — Shared SQLite access layer for the mediator stores.
+
+dispute_store and challenge_store used to sqlite3.connect() on every call,
+with the default rollback journal, and commit after each statement. Under
+concurrent A2A traffic that meant connection setup per request and writers
+blocking readers.
+
+Database gives each thread one connection per file (re-opened after fork,
+closed when the thread exits), configured with:
+
+  journal_mode=WAL      readers no longer block on the writer
+  synchronous=NORMAL    fsync at checkpoints, not on every commit (WAL-safe)
+  cache_size / mmap     page cache and mmap'd reads
+  busy_timeout          writers wait for the lock instead of failing
+
+Statements are prepared once per connection: sqlite3 keeps a per-connection
+cache keyed on SQL text, so stores pass module-level SQL constants.
+
+Usage:
+    from storage import get_database
+    db = get_database(DB_PATH)
+    with db.transaction() as conn:
+        conn.execute(INSERT_SQL, params)
+    row = db.query_one(SELECT_SQL, (key,))
+"""
+
+import base64, json, os, sqlite3, threading, weakref
+from contextlib import contextmanager
+
+PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous",  "NORMAL"),
+    ("cache_size",   "-16000"),     # KiB (16 MB page cache)
+    ("mmap_size",    "67108864"),   # 64 MB
+    ("temp_store",   "MEMORY"),
+    ("busy_timeout", "5000"),       # ms
+]
+STATEMENT_CACHE = 128
+
+
+class _Held:
+    """A thread's connection; closing it is tied to the holder's lifetime."""
+    __slots__ = ("conn", "pid", "close", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pid = os.getpid()
+        self.close = weakref.finalize(self, _close, conn)
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+class Database:
+    """
+    One SQLite file; each thread gets its own pre-configured connection,
+    closed when that thread exits (its thread-local holder is collected),
+    so per-request threads do not accumulate connections and WAL fds.
+    """
+
+    def __init__(self, path, pragmas=None):
+        self.path = path
+        self.pragmas = PRAGMAS if pragmas is None else pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = weakref.WeakSet()
+
+    def _connect(self):
+        # Only the owning thread uses a connection; check_same_thread is off so
+        # the holder's finalizer may close it from whichever thread collects it.
+        conn = sqlite3.connect(self.path, timeout=5.0, cached_statements=STATEMENT_CACHE,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        held = _Held(conn)
+        with self._lock:
+            self._conns.add(held)
+        return held
+
+    def conn(self):
+        """This thread's connection (opened on first use, and again after a fork)."""
+        held = getattr(self._local, "held", None)
+        if held is None or held.pid != os.getpid():
+            held = self._local.held = self._connect()
+        return held.conn
+
+    @contextmanager
+    def transaction(self):
+        """Commit on success, roll back on error."""
+        conn = self.conn()
+        with conn:
+            yield conn
+
+    def query_one(self, sql, params=()):
+        return self.conn().execute(sql, params).fetchone()
+
+    def query_all(self, sql, params=()):
+        return self.conn().execute(sql, params).fetchall()
+
+    def open_connections(self):
+        """Connections currently held by live threads."""
+        with self._lock:
+            return len(self._conns)
+
+    def close_all(self):
+        """Close every open connection (tests, shutdown)."""
+        with self._lock:
+            held, self._conns = list(self._conns), weakref.WeakSet()
+        self._local = threading.local()
+        for h in held:
+            h.close()
+
+
+def encode_cursor(created, row_id):
+    """Opaque keyset-pagination cursor for the last row of a page."""
+    raw = json.dumps([created, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """(created, id) from encode_cursor(); ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created, row_id = json.loads(raw)
+        return float(created), str(row_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+def page(rows, limit, to_dict):
+    """Split a LIMIT limit+1 result into (items, next_cursor)."""
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["created"], rows[-1]["id"]) if more else None
+    return [to_dict(r) for r in rows], next_cursor
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+def get_database(path):
+    """Shared Database for a file path (one per path per process)."""
+    path = os.path.abspath(path)
+    db = _databases.get(path)
+    if db is None:
+        with _databases_lock:
+            db = _databases.setdefault(path, Database(path))
+    return db
@@ -0,0 +1,156 @@
+"""
+verify_cache.py — Persistent cache of registry verify() results.
+
+A registered artifact can never be removed or changed by the contract, so a
+positive verify(hash) is cached forever. A negative result can flip (the
+canon may be registered later), so it is trusted for NEGATIVE_TTL seconds.
+
+Entries come from two places:
+
+  call   chain.verify_on_chain / verify_many after a live contract call
+  event  ArtifactFrozen logs, so canons registered by anyone are known
+         without calling verify() at all. event_indexer feeds every range
+         it indexes through store_events() (and drops reorged ones with
+         forget_events()); ingest_logs() backfills a block range directly,
+         in pages of BATCH_BLOCKS to stay within RPC log-range limits
+
+Usage:
+    import verify_cache
+    hit = verify_cache.lookup(hash_hex)           # dict, or None if unknown/stale
+    found = verify_cache.lookup_many(hashes)      # {hash: result} for fresh hits
+"""
+
+import os, time
+from storage import get_database
+
+DB_PATH = os.environ.get("CHAIN_DB") or os.path.join(os.path.dirname(__file__), "chain.db")
+
+NEGATIVE_TTL = float(os.environ.get("VERIFY_NEGATIVE_TTL", 300))   # seconds
+BATCH_BLOCKS = int(os.environ.get("EVENT_BATCH_BLOCKS", 2000))      # blocks per get_logs call
+_LOOKUP_CHUNK = 500   # stay well below SQLite's bound-parameter limit
+
+_SQL_UPSERT = """
+    INSERT INTO verified (canon_hash, found, domain, status, timestamp, checked, source)
+    VALUES (?,?,?,?,?,?,?)
+    ON CONFLICT(canon_hash) DO UPDATE SET
+        found=excluded.found, domain=excluded.domain, status=excluded.status,
+        timestamp=excluded.timestamp, checked=excluded.checked, source=excluded.source
+    WHERE verified.found = 0
+"""
+_SQL_GET = "SELECT * FROM verified WHERE canon_hash=?"
+_SQL_FORGET_EVENT = "DELETE FROM verified WHERE canon_hash=? AND source='event'"
+_SQL_STATS = "SELECT found, source, COUNT(*) AS n FROM verified GROUP BY found, source"
+
+
+def _db():
+    return get_database(DB_PATH)
+
+
+def init_db():
+    with _db().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS verified (
+                canon_hash  TEXT PRIMARY KEY,
+                found       INTEGER NOT NULL,
+                domain      TEXT,
+                status      TEXT,
+                timestamp   INTEGER,
+                checked     REAL NOT NULL,
+                source      TEXT NOT NULL
+            )
+        """)
+
+
+def normalize(hash_hex):
+    return hash_hex.lower().replace("0x", "")
+
+
+def _fresh(row, now):
+    return row["found"] or now - row["checked"] < NEGATIVE_TTL
+
+
+def _to_result(row):
+    return {
+        "exists":    bool(row["found"]),
+        "domain":    row["domain"],
+        "status":    row["status"],
+        "timestamp": row["timestamp"],
+        "cached":    row["source"],
+    }
+
+
+def lookup(hash_hex):
+    """Cached verify() result, or None if unknown or a stale negative."""
+    row = _db().query_one(_SQL_GET, (normalize(hash_hex),))
+    if row is None or not _fresh(row, time.time()):
+        return None
+    return _to_result(row)
+
+
+def lookup_many(hashes):
+    """{hash: result} for every hash with a fresh cache entry (keys as given)."""
+    keys = {normalize(h): h for h in hashes}
+    now, found = time.time(), {}
+    norm = list(keys)
+    for i in range(0, len(norm), _LOOKUP_CHUNK):
+        chunk = norm[i:i + _LOOKUP_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for row in _db().query_all(f"SELECT * FROM verified WHERE canon_hash IN ({marks})", chunk):
+            if _fresh(row, now):
+                found[keys[row["canon_hash"]]] = _to_result(row)
+    return found
+
+
+def store(hash_hex, result, source="call"):
+    """Record a verify() result. A positive entry is never overwritten."""
+    store_many([(hash_hex, result)], source)
+
+
+def store_many(items, source="call"):
+    """Record [(hash, result)] in one transaction."""
+    now = time.time()
+    with _db().transaction() as conn:
+        conn.executemany(_SQL_UPSERT, (
+            (normalize(h), int(bool(r["exists"])), r.get("domain"), r.get("status"),
+             r.get("timestamp"), now, source)
+            for h, r in items
+        ))
+
+
+def store_events(events):
+    """Record [(hash, domain, status, timestamp)] from ArtifactFrozen logs."""
+    store_many(((h, {"exists": True, "domain": d, "status": st, "timestamp": ts})
+                for h, d, st, ts in events), source="event")
+
+
+def forget_events(hashes):
+    """Drop event-sourced entries whose ArtifactFrozen log was reorged out."""
+    with _db().transaction() as conn:
+        conn.executemany(_SQL_FORGET_EVENT, ((normalize(h),) for h in hashes))
+
+
+def ingest_logs(contract, from_block, to_block="latest", batch_blocks=None):
+    """Cache every ArtifactFrozen event in [from_block, to_block]; returns the count."""
+    batch_blocks = batch_blocks or BATCH_BLOCKS
+    if to_block == "latest":
+        to_block = contract.w3.eth.block_number
+    total = 0
+    for lo in range(from_block, to_block + 1, batch_blocks):
+        logs = contract.events.ArtifactFrozen.get_logs(
+            from_block=lo, to_block=min(to_block, lo + batch_blocks - 1))
+        store_events((log["args"]["hash"].hex(), log["args"]["domain"], log["args"]["status"],
+                      log["args"]["timestamp"]) for log in logs)
+        total += len(logs)
+    return total
+
+
+def stats():
+    out = {"positive": 0, "negative": 0, "by_source": {}}
+    for r in _db().query_all(_SQL_STATS):
+        out["positive" if r["found"] else "negative"] += r["n"]
+        out["by_source"][r["source"]] = out["by_source"].get(r["source"], 0) + r["n"]
+    return out
+
+
+# Initialize on import
+init_db()
@@ -8,22 +8,34 @@ Usage:
     @require_payment(PRICE_MEDIATE, "Canonical mediation via CMP v1.0")
     def mediate_route():
         ...
-        return jsonify(result), 200
+        return result, 200       # a dict: serialized once, after the receipt is attached
 
 The decorator:
-  1. Checks X-PAYMENT header — returns 402 with requirements if absent
-  2. Verifies payment via x402 facilitator
-  3. Runs the handler
-  4. Settles payment on success (200)
-  5. Injects payment receipt into response body
+  1. Checks X-PAYMENT header — returns the route's cached 402 challenge if absent
+  2. Reserves the payload (replay guard) — 402 if it was already used
+  3. Verifies payment via x402 facilitator (skipped if recently verified)
+  4. Runs the handler
+  5. Queues settlement on success (200); releases the payload otherwise
+  6. Adds the payment receipt to the handler's result dict; Flask then
+     serializes the response once, through app.json (see json_provider.py)
+
+The flow itself lives in PaymentGate, so async servers (asgi.py) reuse the
+same replay guard, verify cache and settlement queue.
+
+Requirements are built once per route and path (RouteRequirements), so
+neither the unpaid nor the paid path rebuilds or re-validates static data.
+Settlement runs in x402_settlement.SettlementWorker, off the request path.
+Set X402_SETTLEMENT=sync to settle inline as before, and
+X402_FACILITATOR_URL to point at a local facilitator stand-in.
 """
 
-import base64, functools
-from flask import request, jsonify
+import functools, json, os, threading
+from flask import request, jsonify, current_app
 from x402.server import x402ResourceServerSync
 from x402.http import HTTPFacilitatorClientSync
 from x402.mechanisms.evm.exact import ExactEvmServerScheme
 from x402 import PaymentRequirements
+import x402_settlement as _settlement
 
 # ── Price tiers (USDC, 6 decimals) ───────────────────────────────────────────
 PRICE_MEDIATE   =  50000   # $0.05  — run CMP
@@ -38,82 +50,196 @@ HOST      = "http://76.13.107.248:8745"
 CMP_DOI   = "10.5281/zenodo.18732820"
 
 # ── x402 server (shared instance) ─────────────────────────────────────────────
-_facilitator = HTTPFacilitatorClientSync({"url": "https://x402.org/facilitator"})
+FACILITATOR_URL = os.environ.get("X402_FACILITATOR_URL", "https://x402.org/facilitator")
+SETTLEMENT_MODE = os.environ.get("X402_SETTLEMENT", "deferred")   # "deferred" | "sync"
+
+_facilitator = HTTPFacilitatorClientSync({"url": FACILITATOR_URL})
 x402_server  = x402ResourceServerSync(_facilitator)
 x402_server.register(NETWORK, ExactEvmServerScheme())
 x402_server.initialize()
 
 
-def _build_requirements(price_usdc, description):
-    """Build payment requirements dict for the current request path."""
+def _settle(payload_json, requirements):
+    """Settle one stored payment with the facilitator; (ok, detail)."""
+    from x402 import PaymentPayload
+    payload = PaymentPayload.model_validate_json(payload_json)
+    settle  = x402_server.settle_payment(payload, PaymentRequirements(**requirements))
+    return settle.success, str(settle)
+
+_verify_cache     = _settlement.VerifyCache()
+settlement_worker = _settlement.SettlementWorker(_settle)
+if SETTLEMENT_MODE == "deferred":
+    settlement_worker.start()
+
+
+def payment_stats():
+    """Verify-cache and settlement pipeline counters for /health."""
     return {
-        "scheme":             "exact",
-        "network":            NETWORK,
-        "maxAmountRequired":  str(price_usdc),
-        "resource":           f"{HOST}{request.path}",
-        "description":        description,
-        "mimeType":           "application/json",
-        "payTo":              OPERATOR,
-        "maxTimeoutSeconds":  300,
-        "asset":              USDC_BASE,
-        "outputSchema":       None,
-        "extra":              {"cmp_doi": CMP_DOI}
+        "mode":         SETTLEMENT_MODE,
+        "verify_cache": _verify_cache.stats(),
+        "settlement":   settlement_worker.stats(),
+        "payments":     _settlement.counts(),
     }
 
 
+class RouteRequirements:
+    """
+    Payment requirements for one priced route. The template is built when the
+    route is decorated; the per-path dict, PaymentRequirements object and
+    serialized 402 body are built on the first request to a path and reused.
+    """
+
+    MAX_PATHS = 4096   # parameterized routes (/a2a/respond/<id>) vary by path
+
+    def __init__(self, price_usdc, description):
+        self.price_usdc = price_usdc
+        self.template = {
+            "scheme":             "exact",
+            "network":            NETWORK,
+            "maxAmountRequired":  str(price_usdc),
+            "resource":           None,
+            "description":        description,
+            "mimeType":           "application/json",
+            "payTo":              OPERATOR,
+            "maxTimeoutSeconds":  300,
+            "asset":              USDC_BASE,
+            "outputSchema":       None,
+            "extra":              {"cmp_doi": CMP_DOI}
+        }
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def for_path(self, path):
+        """
+        (requirements dict, PaymentRequirements, canonical requirements JSON,
+        402 body bytes) for a request path.
+        """
+        entry = self._paths.get(path)
+        if entry is None:
+            reqs = dict(self.template, resource=f"{HOST}{path}")
+            challenge = json.dumps({
+                "error":       "Payment required",
+                "x402Version": 1,
+                "accepts":     [reqs]
+            }).encode()
+            entry = (reqs, PaymentRequirements(**reqs), json.dumps(reqs, sort_keys=True), challenge)
+            with self._lock:
+                if len(self._paths) >= self.MAX_PATHS:
+                    self._paths.clear()
+                self._paths[path] = entry
+        return entry
+
+
+class PaymentGate:
+    """
+    The x402 flow for one priced route, independent of the web framework:
+    require_payment wraps it for Flask, asgi.py awaits it from async handlers.
+    """
+
+    def __init__(self, price_usdc, description):
+        self.price_usdc = price_usdc
+        self.requirements = RouteRequirements(price_usdc, description)
+
+    def challenge(self, path):
+        """Serialized 402 body for a request without X-PAYMENT."""
+        return self.requirements.for_path(path)[3]
+
+    def begin(self, path, payment_header):
+        """
+        Reserve and verify a payment. Returns (ticket, None) when the handler
+        may run, or (None, (body, 402)) when the payment is rejected.
+        """
+        reqs, reqs_obj, reqs_json, _ = self.requirements.for_path(path)
+
+        # ── Replay guard ──────────────────────────────────────────────────────
+        try:
+            payload, payload_json = _settlement.decode_payment(payment_header)
+        except ValueError as e:
+            return None, ({"error": "Invalid payment", "detail": str(e)}, 402)
+        pid = _settlement.payment_id(payload)
+        ticket = _settlement.reserve(pid, reqs["resource"], self.price_usdc, payload_json, reqs_json)
+        if ticket is None:
+            return None, ({"error": "Payment already used", "payment_id": pid}, 402)
+
+        # ── Verify payment (cached; payload parsed only on a miss) ────────────
+        try:
+            vkey = _verify_cache.key(pid, reqs_json)
+            if not _verify_cache.get(vkey):
+                from x402 import PaymentPayload
+                payload = PaymentPayload.model_validate_json(payload_json)
+                verify  = x402_server.verify_payment(payload, reqs_obj)
+                if not verify.is_valid:
+                    _settlement.release(pid)
+                    return None, ({"error": "Invalid payment", "detail": str(verify)}, 402)
+                _verify_cache.put(vkey)
+        except Exception:
+            _settlement.release(pid)
+            raise
+        return ticket, None
+
+    def finish(self, ticket, body, status):
+        """Queue (or run) settlement for a 200 and attach the receipt; release otherwise."""
+        if status != 200:
+            _settlement.release(ticket.pid)
+            return body, status
+
+        data = body if isinstance(body, dict) else body.get_json()
+        _settlement.commit(ticket)
+        if SETTLEMENT_MODE == "deferred":
+            settlement_worker.notify()
+            settled = False
+        else:
+            settled = settlement_worker.settle_now(ticket.pid)
+        data["payment"] = {
+            "settled":     settled,
+            "settlement":  "settled" if settled else "pending",
+            "payment_id":  ticket.pid,
+            "network":     NETWORK,
+            "amount_usdc": self.price_usdc / 1_000_000
+        }
+        return data, 200
+
+    def abort(self, ticket):
+        """The handler raised: free the payload for a retry."""
+        _settlement.release(ticket.pid)
+
+
 def require_payment(price_usdc, description):
     """
     Decorator that gates a Flask endpoint behind x402 payment.
-    Applies to endpoints that return (jsonify(...), status_code).
+    Handlers should return (dict, status_code); a jsonify() response is
+    still accepted but is re-parsed to attach the receipt. The gate is
+    exposed as the view's payment_gate attribute.
     """
+    gate = PaymentGate(price_usdc, description)
+
     def decorator(f):
         @functools.wraps(f)
         def wrapper(*args, **kwargs):
             payment_header = request.headers.get("X-PAYMENT")
-            reqs = _build_requirements(price_usdc, description)
 
-            # ── No payment header — return 402 with requirements ──────────────
+            # ── No payment header — return the cached 402 challenge ───────────
             if not payment_header:
-                return jsonify({
-                    "error":       "Payment required",
-                    "x402Version": 1,
-                    "accepts":     [reqs]
-                }), 402
-
-            # ── Verify payment ────────────────────────────────────────────────
-            try:
-                from x402 import PaymentPayload
-                payload  = PaymentPayload.model_validate_json(
-                    base64.b64decode(payment_header).decode()
+                return current_app.response_class(
+                    gate.challenge(request.path), status=402, mimetype="application/json"
                 )
-                reqs_obj = PaymentRequirements(**reqs)
-                verify   = x402_server.verify_payment(payload, reqs_obj)
 
-                if not verify.is_valid:
-                    return jsonify({
-                        "error":  "Invalid payment",
-                        "detail": str(verify)
-                    }), 402
+            ticket = None
+            try:
+                ticket, rejected = gate.begin(request.path, payment_header)
+                if rejected:
+                    return rejected
 
-                # ── Run handler ───────────────────────────────────────────────
+                # ── Run handler, then settle and attach the receipt ───────────
                 rv = f(*args, **kwargs)
-                response, status = rv if isinstance(rv, tuple) else (rv, 200)
-
-                # ── Settle and inject receipt on success ──────────────────────
-                if status == 200:
-                    settle = x402_server.settle_payment(payload, reqs_obj)
-                    data   = response.get_json()
-                    data["payment"] = {
-                        "settled":     settle.success,
-                        "network":     NETWORK,
-                        "amount_usdc": price_usdc / 1_000_000
-                    }
-                    return jsonify(data), 200
-
-                return response, status
+                body, status = rv if isinstance(rv, tuple) else (rv, 200)
+                return gate.finish(ticket, body, status)
 
             except Exception as e:
+                if ticket:
+                    gate.abort(ticket)
                 return jsonify({"error": str(e)}), 500
 
+        wrapper.payment_gate = gate
         return wrapper
     return decorator
@@ -0,0 +1,363 @@
+"""
+x402_settlement.py — Payment verification cache, replay guard and deferred settlement.
+
+require_payment used to make two facilitator round trips per paid request:
+verify before the handler and settle after it, both on the request path.
+This module moves the second one off it and avoids repeating the first:
+
+  VerifyCache     a facilitator-verified payload is trusted for VERIFY_TTL
+                  seconds, so a client retrying the same X-PAYMENT after a
+                  failed handler is not verified again
+  reserve()       replay guard: a payment id can be reserved once. It is
+                  released if the handler fails, and becomes a 'pending'
+                  settlement if it succeeds; a second use is rejected.
+                  A reservation is only reaped as abandoned after
+                  RESERVED_TIMEOUT, the handler's own bound (MEDIATE_TIMEOUT)
+                  plus a margin; a handler that outlives it is still settled
+                  Ids come from the strictly decoded payload (payment_id),
+                  not the header string, so re-encoding a header does not
+                  make a used authorization look new
+  SettlementWorker  background thread that drains pending settlements in
+                  batches of SETTLE_BATCH, retries failures with exponential
+                  backoff and reconciles rows stuck in 'settling'
+
+Settlement states (payments.state):
+
+  reserved   handler running
+  pending    handler succeeded, settlement queued (or waiting for a retry)
+  settling   claimed by the worker
+  settled    facilitator confirmed settlement
+  failed     out of attempts
+
+The worker only needs a settle(payload_json, requirements) -> (ok, detail)
+callable, so it can run against a local facilitator stand-in
+(X402_FACILITATOR_URL) or a plain function.
+"""
+
+import base64, hashlib, json, os, threading, time
+from collections import OrderedDict, namedtuple
+from storage import get_database
+from cmp_log import log
+
+DB_PATH = os.environ.get("PAYMENTS_DB") or os.path.join(os.path.dirname(__file__), "payments.db")
+
+VERIFY_TTL     = 60.0     # seconds a verified payload is trusted
+VERIFY_MAX     = 10000    # cached verifications kept in memory
+SETTLE_BATCH   = 50
+SETTLE_WORKERS = 4        # concurrent facilitator calls per batch
+MAX_ATTEMPTS   = 8
+BACKOFF_BASE   = 2.0
+BACKOFF_MAX    = 600.0
+STUCK_AFTER    = 300.0    # seconds before an abandoned 'settling' row is repaired
+# A 'reserved' row is abandoned only once its handler must have ended: the
+# per-mediation bound plus room for verification and registration.
+RESERVED_TIMEOUT = (float(os.environ.get("MEDIATE_TIMEOUT", 30))
+                    + float(os.environ.get("X402_RESERVED_MARGIN", 60)))
+
+_SQL_RESERVE = """
+    INSERT OR IGNORE INTO payments
+    (id, created, updated, state, resource, amount, payload, requirements, attempts, next_attempt)
+    VALUES (?,?,?,'reserved',?,?,?,?,0,0)
+"""
+_SQL_RELEASE = "DELETE FROM payments WHERE id=? AND state='reserved'"
+_SQL_COMMIT = "UPDATE payments SET state='pending', updated=?, next_attempt=? WHERE id=? AND state='reserved'"
+_SQL_COMMIT_REAPED = """
+    INSERT OR IGNORE INTO payments
+    (id, created, updated, state, resource, amount, payload, requirements, attempts, next_attempt)
+    VALUES (?,?,?,'pending',?,?,?,?,0,?)
+"""
+_SQL_STATE = "SELECT state FROM payments WHERE id=?"
+_SQL_GET = "SELECT id, created, updated, state, resource, amount, attempts, error, settle_detail FROM payments WHERE id=?"
+_SQL_DUE = """
+    SELECT id FROM payments WHERE state='pending' AND next_attempt <= ?
+    ORDER BY next_attempt LIMIT ?
+"""
+_SQL_CLAIM = "UPDATE payments SET state='settling', updated=? WHERE id=? AND state='pending'"
+_SQL_LOAD = "SELECT * FROM payments WHERE id=?"
+_SQL_RECONCILE_SETTLING = """
+    UPDATE payments SET state='pending', updated=?, next_attempt=?
+    WHERE state='settling' AND updated < ?
+"""
+_SQL_RECONCILE_RESERVED = "DELETE FROM payments WHERE state='reserved' AND updated < ?"
+_SQL_COUNTS = "SELECT state, COUNT(*) AS n, SUM(amount) AS amount FROM payments GROUP BY state"
+
+
+def _db():
+    return get_database(DB_PATH)
+
+
+def init_db():
+    with _db().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS payments (
+                id             TEXT PRIMARY KEY,
+                created        REAL NOT NULL,
+                updated        REAL NOT NULL,
+                state          TEXT NOT NULL,
+                resource       TEXT NOT NULL,
+                amount         INTEGER NOT NULL,
+                payload        TEXT NOT NULL,
+                requirements   TEXT NOT NULL,
+                attempts       INTEGER DEFAULT 0,
+                next_attempt   REAL NOT NULL,
+                error          TEXT DEFAULT NULL,
+                settle_detail  TEXT DEFAULT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_payments_due
+            ON payments (state, next_attempt)
+        """)
+
+
+def decode_payment(payment_header):
+    """
+    Strictly decode an X-PAYMENT header to (payload dict, payload JSON).
+    Raises ValueError for anything but canonical base64 of a JSON object:
+    a lenient decode ignores junk characters, so many header strings would
+    carry the same payment.
+    """
+    try:
+        raw = base64.b64decode(payment_header.strip(), validate=True)
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"malformed X-PAYMENT header: {e}") from None
+    if not isinstance(payload, dict):
+        raise ValueError("malformed X-PAYMENT header: not a JSON object")
+    return payload, raw.decode()
+
+
+def payment_id(payload):
+    """
+    Replay-guard key for a decoded payment: the same authorization always
+    maps to the same id, however the header was encoded. For EIP-3009
+    authorizations that is (network, from, nonce), which is what the token
+    contract itself makes single-use; the signature is left out because an
+    ECDSA signature can be re-encoded (high-s) without changing what it
+    authorizes. Other payloads are keyed on their canonical JSON.
+    """
+    inner = payload.get("payload") if isinstance(payload.get("payload"), dict) else {}
+    auth = inner.get("authorization") if isinstance(inner.get("authorization"), dict) else {}
+    if auth.get("from") and auth.get("nonce"):
+        key = ["eip3009", str(payload.get("network", "")).lower(),
+               str(auth["from"]).lower(), str(auth["nonce"]).lower()]
+    else:
+        key = ["payload", payload]
+    raw = json.dumps(key, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class VerifyCache:
+    """TTL + LRU cache of (payment id, requirements) pairs that verified."""
+
+    def __init__(self, ttl=VERIFY_TTL, max_entries=VERIFY_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(pid, requirements_json):
+        raw = pid + "\0" + requirements_json
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None or expires < now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def put(self, key):
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# ── Replay guard ─────────────────────────────────────────────────────────────
+
+Reservation = namedtuple("Reservation", "pid resource amount payload requirements")
+
+
+def reserve(pid, resource, amount, payload_json, requirements_json):
+    """Claim a payload for one request; its Reservation, or None if already used or in use."""
+    now = time.time()
+    with _db().transaction() as conn:
+        claimed = conn.execute(_SQL_RESERVE, (
+            pid, now, now, resource, amount, payload_json, requirements_json,
+        )).rowcount == 1
+    return Reservation(pid, resource, amount, payload_json, requirements_json) if claimed else None
+
+
+def release(pid):
+    """Handler failed: free the payload so the client may retry with it."""
+    with _db().transaction() as conn:
+        conn.execute(_SQL_RELEASE, (pid,))
+
+
+def commit(reservation):
+    """
+    Handler succeeded: queue the payload for settlement. If the reservation
+    was reaped meanwhile (the handler outlived RESERVED_TIMEOUT) it is
+    re-inserted as 'pending', so a served request is always settled.
+    Returns False, and logs, if the id had already been re-used by a replay.
+    """
+    r, now = reservation, time.time()
+    with _db().transaction() as conn:
+        if conn.execute(_SQL_COMMIT, (now, now, r.pid)).rowcount:
+            return True
+        if conn.execute(_SQL_COMMIT_REAPED, (
+            r.pid, now, now, r.resource, r.amount, r.payload, r.requirements, now,
+        )).rowcount:
+            log.warning("payment.reaped", extra={"fields": {"payment_id": r.pid}})
+            return True
+        row = conn.execute(_SQL_STATE, (r.pid,)).fetchone()
+    log.warning("payment.replayed", extra={"fields": {
+        "payment_id": r.pid, "state": row["state"] if row else None}})
+    return False
+
+
+def get(pid):
+    row = _db().query_one(_SQL_GET, (pid,))
+    return dict(row) if row else None
+
+
+def counts():
+    return {r["state"]: {"count": r["n"], "amount": r["amount"]} for r in _db().query_all(_SQL_COUNTS)}
+
+
+def _update(pid, **fields):
+    fields["updated"] = time.time()
+    cols = ", ".join(f"{k}=?" for k in fields)
+    with _db().transaction() as conn:
+        conn.execute(f"UPDATE payments SET {cols} WHERE id=?", (*fields.values(), pid))
+
+
+# ── Settlement worker ────────────────────────────────────────────────────────
+
+class SettlementWorker(threading.Thread):
+    """Daemon thread that settles pending payments in batches."""
+
+    def __init__(self, settle, interval=1.0, batch_size=SETTLE_BATCH, concurrency=SETTLE_WORKERS):
+        super().__init__(name="x402-settlement", daemon=True)
+        self.settle = settle
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._halt = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "settled": 0, "retried": 0, "failed": 0,
+                       "reconciled": 0, "last_run": None, "last_error": None}
+
+    def notify(self):
+        self._wake.set()
+
+    def run(self):
+        self.reconcile()
+        last_reconcile = time.monotonic()
+        while not self._halt.is_set():
+            try:
+                n = self.run_once()
+                if time.monotonic() - last_reconcile > min(STUCK_AFTER, RESERVED_TIMEOUT):
+                    self.reconcile()
+                    last_reconcile = time.monotonic()
+            except Exception as e:
+                with self._lock:
+                    self._stats["last_error"] = str(e)
+                n = 0
+            if n < self.batch_size:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+    def stop(self):
+        self._halt.set()
+        self._wake.set()
+
+    def reconcile(self, stuck_after=STUCK_AFTER, reserved_after=RESERVED_TIMEOUT):
+        """
+        Repair rows abandoned by a crashed process: 'settling' goes back to
+        'pending' after stuck_after, 'reserved' (handler never finished) is
+        released after reserved_after. Returns count.
+        """
+        now = time.time()
+        with _db().transaction() as conn:
+            n = conn.execute(_SQL_RECONCILE_SETTLING, (now, now, now - stuck_after)).rowcount
+            n += conn.execute(_SQL_RECONCILE_RESERVED, (now - reserved_after,)).rowcount
+        with self._lock:
+            self._stats["reconciled"] += n
+        return n
+
+    def _claim(self):
+        now, claimed = time.time(), []
+        for row in _db().query_all(_SQL_DUE, (now, self.batch_size)):
+            with _db().transaction() as conn:
+                if conn.execute(_SQL_CLAIM, (now, row["id"])).rowcount:
+                    claimed.append(row["id"])
+        return claimed
+
+    def run_once(self):
+        """Settle one batch; returns how many payments were attempted."""
+        ids = self._claim()
+        if not ids:
+            return 0
+        outcomes = []
+        if self.concurrency > 1 and len(ids) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(min(self.concurrency, len(ids))) as pool:
+                outcomes = list(pool.map(self._settle_one, ids))
+        else:
+            outcomes = [self._settle_one(pid) for pid in ids]
+        with self._lock:
+            s = self._stats
+            s["batches"] += 1
+            for o in outcomes:
+                s[o] += 1
+            s["last_run"] = time.time()
+            s["last_error"] = None
+        return len(ids)
+
+    def settle_now(self, pid):
+        """Settle one committed payment inline (X402_SETTLEMENT=sync); True if settled."""
+        with _db().transaction() as conn:
+            if not conn.execute(_SQL_CLAIM, (time.time(), pid)).rowcount:
+                return False
+        return self._settle_one(pid) == "settled"
+
+    def _settle_one(self, pid):
+        row = _db().query_one(_SQL_LOAD, (pid,))
+        attempts = row["attempts"] + 1
+        try:
+            ok, detail = self.settle(row["payload"], json.loads(row["requirements"]))
+        except Exception as e:
+            ok, detail = False, f"settle error: {e}"
+        if ok:
+            _update(pid, state="settled", attempts=attempts, error=None, settle_detail=str(detail))
+            return "settled"
+        if attempts >= MAX_ATTEMPTS:
+            _update(pid, state="failed", attempts=attempts, error=str(detail))
+            return "failed"
+        backoff = min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+        _update(pid, state="pending", attempts=attempts, error=str(detail),
+                next_attempt=time.time() + backoff)
+        return "retried"
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, batch_size=self.batch_size)
+
+
+# Initialize on import
+init_db()